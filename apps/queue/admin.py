@@ -1,5 +1,5 @@
 from django.contrib import admin
-from apps.queue.models import Region, Office, Counter, Officer, QueueTicket
+from apps.queue.models import Region, Office, Counter, Officer, QueueTicket, TicketSequence, OfficeDailyStats, TicketHistory, OfficeHourlyRollup
 
 
 @admin.register(Region)
@@ -41,4 +41,29 @@ class QueueTicketAdmin(admin.ModelAdmin):
     list_display = ('id', 'ticket_number', 'office', 'counter', 'status', 'created_at', 'called_at', 'served_at')
     list_filter = ('status', 'office', 'region', 'created_at')
     search_fields = ('ticket_number',)
-    readonly_fields = ('created_at', 'called_at', 'served_at')
+    readonly_fields = ('created_at', 'called_at', 'served_at', 'updated_at')
+
+
+@admin.register(TicketSequence)
+class TicketSequenceAdmin(admin.ModelAdmin):
+    list_display = ('id', 'office', 'date', 'last_value')
+    list_filter = ('office', 'date')
+
+
+@admin.register(OfficeDailyStats)
+class OfficeDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ('id', 'office', 'date', 'called_count', 'served_count')
+    list_filter = ('office', 'date')
+
+
+@admin.register(TicketHistory)
+class TicketHistoryAdmin(admin.ModelAdmin):
+    list_display = ('ticket_id', 'ticket_number', 'office', 'counter', 'created_at', 'called_at', 'served_at')
+    list_filter = ('office',)
+    search_fields = ('ticket_number',)
+
+
+@admin.register(OfficeHourlyRollup)
+class OfficeHourlyRollupAdmin(admin.ModelAdmin):
+    list_display = ('id', 'office', 'hour', 'created_count', 'served_count', 'max_waiting')
+    list_filter = ('region', 'office')
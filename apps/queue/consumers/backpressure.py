@@ -0,0 +1,174 @@
+"""
+Bounded per-connection send buffers for display sockets.
+
+Consumers hand outgoing frames to an OutboundBuffer instead of awaiting the
+socket, so a stalled client cannot hold up its consumer's message loop (and
+let its channel overflow in the channel layer). A writer task per connection
+drains the buffer. When a client falls QUEUE_WS_SEND_BUFFER frames behind,
+QUEUE_WS_SLOW_CLIENT_POLICY decides what happens to it:
+
+* ``coalesce`` (default) - drop the backlog and send the current state instead
+* ``disconnect`` - close the socket; the display reconnects with resume_from
+
+``stats`` counts connections, lagging clients and overflows in this process;
+connects, disconnects and frames in each direction per consumer class go to the queue
+metrics registry.
+"""
+import asyncio
+import logging
+from collections import deque
+from django.conf import settings
+from apps.queue.services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Close code sent to clients dropped for not keeping up
+CLOSE_TOO_SLOW = 4008
+
+
+class BackpressureStats:
+    """Process-wide counters for display sockets (updated from the event loop only)"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.connections = 0
+        self.lagging = 0
+        self.coalesced = 0
+        self.disconnected = 0
+        self.dropped_frames = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+stats = BackpressureStats()
+metrics.register_process_gauges(lambda: [
+    ('queue_ws_open_connections', {}, stats.connections),
+    ('queue_ws_lagging_connections', {}, stats.lagging),
+    ('queue_ws_coalesced_total', {}, stats.coalesced),
+    ('queue_ws_slow_disconnects_total', {}, stats.disconnected),
+    ('queue_ws_dropped_frames_total', {}, stats.dropped_frames),
+])
+
+
+class OutboundBuffer:
+    """Bounded FIFO of text frames drained to the socket by a writer task"""
+
+    def __init__(self, write, capacity, on_overflow):
+        self.write = write
+        self.capacity = max(capacity, 1)
+        self.lag_threshold = max(self.capacity // 2, 1)
+        self.on_overflow = on_overflow
+        self.lagging = False
+        self._frames = deque()
+        self._ready = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._frames)
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._drain())
+
+    def stop(self):
+        """Stop the writer and drop anything still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._frames.clear()
+        self._set_lagging(False)
+
+    def push(self, frame):
+        """Queue frame without waiting; on overflow drop the backlog and apply the policy"""
+        if len(self._frames) >= self.capacity:
+            stats.dropped_frames += len(self._frames) + 1
+            self._frames.clear()
+            self._set_lagging(False)
+            self.on_overflow()
+            return
+        self._frames.append(frame)
+        self._set_lagging(len(self._frames) >= self.lag_threshold)
+        self._ready.set()
+
+    def _set_lagging(self, lagging):
+        if lagging != self.lagging:
+            self.lagging = lagging
+            stats.lagging += 1 if lagging else -1
+
+    async def _drain(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self._frames:
+                frame = self._frames.popleft()
+                self._set_lagging(len(self._frames) >= self.lag_threshold)
+                await self.write(frame)
+
+
+class BackpressureMixin:
+    """Route a WebSocket consumer's text frames through a bounded OutboundBuffer.
+
+    Subclasses call start_outbound() once accepted, stop_outbound() on
+    disconnect, and implement resync() to send their current state.
+    """
+
+    outbound = None
+    dropped = False
+
+    def start_outbound(self):
+        self.outbound = OutboundBuffer(
+            self.write_frame,
+            getattr(settings, 'QUEUE_WS_SEND_BUFFER', 256),
+            self.handle_overflow
+        )
+        self.outbound.start()
+        stats.connections += 1
+        metrics.inc('queue_ws_connections_total', consumer=type(self).__name__)
+
+    def stop_outbound(self):
+        if self.outbound is not None:
+            self.outbound.stop()
+            self.outbound = None
+            stats.connections -= 1
+            metrics.inc('queue_ws_disconnections_total', consumer=type(self).__name__)
+
+    async def write_frame(self, text):
+        await self.base_send({'type': 'websocket.send', 'text': text})
+        metrics.inc('queue_ws_frames_sent_total', consumer=type(self).__name__)
+
+    async def websocket_receive(self, message):
+        metrics.inc('queue_ws_frames_received_total', consumer=type(self).__name__)
+        await super().websocket_receive(message)
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        """Buffer text frames; anything else goes straight to the socket"""
+        if self.dropped:
+            return
+        if text_data is not None and bytes_data is None and not close and self.outbound is not None:
+            self.outbound.push(text_data)
+            return
+        await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+
+    def handle_overflow(self):
+        """Client fell a full buffer behind: resync it or drop it"""
+        if getattr(settings, 'QUEUE_WS_SLOW_CLIENT_POLICY', 'coalesce') == 'disconnect':
+            stats.disconnected += 1
+            self.dropped = True
+            logger.warning('Closing slow display socket %s', getattr(self, 'channel_name', None))
+            self.stop_outbound()
+            asyncio.ensure_future(self.close(code=CLOSE_TOO_SLOW))
+            return
+        stats.coalesced += 1
+        asyncio.ensure_future(self._resync())
+
+    async def _resync(self):
+        try:
+            await self.resync()
+        except Exception:
+            logger.exception('Failed to resync slow display socket %s', getattr(self, 'channel_name', None))
+
+    async def resync(self):
+        """Send the current state to replace the dropped backlog"""
+        raise NotImplementedError
@@ -1,89 +1,457 @@
+"""
+WebSocket consumers for queue displays, region screens and counter UIs.
+
+Clients get a sequenced SNAPSHOT on connect and live delta frames after it;
+the frame format, resume, summary stream, counter commands and multiplexing
+are described in doc/WEBSOCKET_PROTOCOL.md.
+"""
+import asyncio
 import json
+import re
+from urllib.parse import parse_qs
+from django.conf import settings
+from django.db import transaction
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from apps.queue.models import Counter, QueueTicket
+from apps.queue.selectors import get_office_snapshot, get_region_snapshot, get_counter_snapshot
+from apps.queue.services import (
+    event_log,
+    call_next_ticket,
+    start_service,
+    recall_ticket,
+    complete_service,
+    complete_and_call_next,
+    prepare_ticket_data,
+    InvalidTransition,
+    TicketNotAtCounter
+)
+from apps.queue.services.events import encode_frame, encode_json, tag_frame
+from apps.queue.consumers.backpressure import BackpressureMixin
 
 
-class OfficeConsumer(AsyncWebsocketConsumer):
-    """Handles connections to office_{office_id} group"""
+def encode_reply(request_id, data=None, error=None):
+    """REPLY frame answering a client command"""
+    reply = {'type': 'REPLY', 'request_id': request_id, 'ok': error is None}
+    if error is None:
+        reply['data'] = data
+    else:
+        reply['error'] = error
+    return encode_json(reply)
+
+
+class QueueGroupConsumer(BackpressureMixin, AsyncWebsocketConsumer):
+    """Base consumer that joins one queue group and forwards its events"""
+    
+    group_prefix = None
+    url_kwarg = None
+    min_seq = 0
     
     async def connect(self):
-        """Connect to office group"""
-        self.office_id = self.scope['url_route']['kwargs']['office_id']
-        self.group_name = f'office_{self.office_id}'
+        """Connect to group and send its current state"""
+        self.group_id = int(self.scope['url_route']['kwargs'][self.url_kwarg])
+        self.group_name = f'{self.group_prefix}_{self.group_id}'
+        self.min_seq = 0
         
         await self.channel_layer.group_add(
             self.group_name,
             self.channel_name
         )
         await self.accept()
+        self.start_outbound()
+        await self.send_initial_state()
     
     async def disconnect(self, close_code):
-        """Disconnect from office group"""
+        """Disconnect from group"""
+        self.stop_outbound()
         await self.channel_layer.group_discard(
             self.group_name,
             self.channel_name
         )
     
+    async def resync(self):
+        """Replace a slow client's dropped backlog with a fresh snapshot"""
+        await self.send_snapshot()
+    
+    def get_query_int(self, name):
+        """Parse an integer query string parameter"""
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        try:
+            return int(query[name][0])
+        except (KeyError, ValueError):
+            return None
+    
+    def get_resume_from(self):
+        """Parse resume_from query parameter"""
+        return self.get_query_int('resume_from')
+    
+    async def send_initial_state(self):
+        """Replay missed events when resuming, otherwise send a snapshot"""
+        resume_from = self.get_resume_from()
+        if resume_from is not None:
+            replayed = await sync_to_async(event_log.replay)(self.group_name, resume_from)
+            if replayed is not None:
+                self.min_seq, frames = replayed
+                for frame in frames:
+                    await self.send(text_data=frame)
+                return
+        await self.send_snapshot()
+    
+    async def send_snapshot(self):
+        """Send group state tagged with the sequence number it covers"""
+        seq = await sync_to_async(event_log.current_seq)(self.group_name)
+        snapshot = await database_sync_to_async(self.build_snapshot)()
+        self.min_seq = seq
+        await self.send(text_data=encode_frame('SNAPSHOT', snapshot, seq))
+    
+    def build_snapshot(self):
+        """Current state of the group"""
+        raise NotImplementedError
+    
     async def queue_event(self, event):
-        """Receive queue event from group"""
-        await self.send(text_data=json.dumps({
-            'type': event['event_type'],
-            'data': event['data']
-        }))
+        """Receive queue event from group and forward the pre-encoded frame"""
+        seq = event.get('seq')
+        if seq is not None and seq <= self.min_seq:
+            # Already covered by the snapshot or replay sent on connect
+            return
+        
+        text = event.get('text')
+        if text is None:
+            text = encode_frame(event['event_type'], event['data'], seq)
+        await self.send(text_data=text)
+
+
+class OfficeConsumer(QueueGroupConsumer):
+    """Handles connections to office_{office_id} group"""
+    
+    group_prefix = 'office'
+    url_kwarg = 'office_id'
+    
+    async def connect(self):
+        """Connect to office group"""
+        self.office_id = self.scope['url_route']['kwargs']['office_id']
+        await super().connect()
+    
+    def build_snapshot(self):
+        return get_office_snapshot(self.group_id)
 
 
-class RegionConsumer(AsyncWebsocketConsumer):
+class RegionConsumer(QueueGroupConsumer):
     """Handles connections to region_{region_id} group"""
     
+    group_prefix = 'region'
+    url_kwarg = 'region_id'
+    
     async def connect(self):
         """Connect to region group"""
         self.region_id = self.scope['url_route']['kwargs']['region_id']
-        self.group_name = f'region_{self.region_id}'
-        
-        await self.channel_layer.group_add(
-            self.group_name,
-            self.channel_name
-        )
-        await self.accept()
+        await super().connect()
     
-    async def disconnect(self, close_code):
-        """Disconnect from region group"""
-        await self.channel_layer.group_discard(
-            self.group_name,
-            self.channel_name
-        )
-    
-    async def queue_event(self, event):
-        """Receive queue event from group"""
-        await self.send(text_data=json.dumps({
-            'type': event['event_type'],
-            'data': event['data']
-        }))
+    def build_snapshot(self):
+        return get_region_snapshot(self.group_id)
 
 
-class CounterConsumer(AsyncWebsocketConsumer):
+class CounterConsumer(QueueGroupConsumer):
     """Handles connections to counter_{counter_id} group"""
     
+    group_prefix = 'counter'
+    url_kwarg = 'counter_id'
+    
+    # Commands acting on one ticket of this counter: action -> service
+    TICKET_COMMANDS = {
+        'start': start_service,
+        'recall': recall_ticket,
+        'complete': complete_service,
+    }
+    
     async def connect(self):
         """Connect to counter group"""
         self.counter_id = self.scope['url_route']['kwargs']['counter_id']
-        self.group_name = f'counter_{self.counter_id}'
+        await super().connect()
+    
+    def build_snapshot(self):
+        return get_counter_snapshot(self.group_id)
+    
+    async def receive(self, text_data=None, bytes_data=None):
+        """Run an officer command and reply with the result under its request_id"""
+        try:
+            command = json.loads(text_data)
+            request_id = command.get('request_id')
+        except (TypeError, ValueError, AttributeError):
+            await self.send_reply(None, error='Commands must be JSON objects')
+            return
         
-        await self.channel_layer.group_add(
-            self.group_name,
-            self.channel_name
-        )
+        try:
+            data = await database_sync_to_async(self.run_command)(command)
+        except QueueTicket.DoesNotExist:
+            await self.send_reply(request_id, error='Ticket not found')
+        except (ValueError, InvalidTransition, TicketNotAtCounter) as exc:
+            await self.send_reply(request_id, error=str(exc))
+        else:
+            await self.send_reply(request_id, data=data)
+    
+    async def send_reply(self, request_id, data=None, error=None):
+        await self.send(text_data=encode_reply(request_id, data, error))
+    
+    def run_command(self, command):
+        """Run command against this counter through the service layer"""
+        action = command.get('action')
+        if action == 'call_next':
+            self.check_counter_active()
+            ticket = call_next_ticket(self.group_id)
+            return {'ticket': prepare_ticket_data(ticket) if ticket else None}
+        
+        if action != 'complete_and_call_next' and action not in self.TICKET_COMMANDS:
+            raise ValueError(f'Unknown action: {action}')
+        try:
+            ticket_id = int(command['ticket_id'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('ticket_id is required')
+        
+        if action == 'complete_and_call_next':
+            self.check_counter_active()
+            completed, ticket = complete_and_call_next(self.group_id, ticket_id)
+            return {
+                'completed': prepare_ticket_data(completed),
+                'ticket': prepare_ticket_data(ticket) if ticket else None
+            }
+        
+        with transaction.atomic():
+            ticket = self.TICKET_COMMANDS[action](ticket_id)
+            if ticket.counter_id != self.group_id:
+                raise TicketNotAtCounter(ticket_id, self.group_id)
+        return {'ticket': prepare_ticket_data(ticket)}
+    
+    def check_counter_active(self):
+        if not Counter.objects.filter(id=self.group_id, is_active=True).exists():
+            raise ValueError('Counter is not active')
+
+
+class RegionSummaryConsumer(RegionConsumer):
+    """Handles coalesced region_{region_id} stream: one summary frame per flush interval"""
+    
+    MIN_INTERVAL_MS = 50
+    MAX_INTERVAL_MS = 10000
+    LAST_CALLED_LIMIT = 5
+    
+    async def connect(self):
+        """Connect to region group and start the flush loop"""
+        self.interval = self.get_interval()
+        self.waiting = {}
+        self.pending = {}
+        self.last_seq = 0
+        self.flush_task = None
+        await super().connect()
+        self.flush_task = asyncio.ensure_future(self.flush_loop())
+    
+    async def disconnect(self, close_code):
+        """Stop flushing and leave region group"""
+        if getattr(self, 'flush_task', None):
+            self.flush_task.cancel()
+        await super().disconnect(close_code)
+    
+    def get_interval(self):
+        """Flush interval in seconds from ?interval=<ms>, clamped to sane bounds"""
+        interval_ms = self.get_query_int('interval')
+        if interval_ms is None:
+            interval_ms = getattr(settings, 'QUEUE_REGION_SUMMARY_INTERVAL_MS', 250)
+        return min(max(interval_ms, self.MIN_INTERVAL_MS), self.MAX_INTERVAL_MS) / 1000
+    
+    async def send_initial_state(self):
+        """Summaries are state-based, so always start from a snapshot"""
+        await self.send_snapshot()
+    
+    def build_snapshot(self):
+        snapshot = get_region_snapshot(self.group_id)
+        self.waiting = {
+            office['office_id']: office['status_counts']['WAITING']
+            for office in snapshot['offices']
+        }
+        return snapshot
+    
+    def _office_summary(self, office_id):
+        return self.pending.setdefault(office_id, {'created': 0, 'called': 0, 'last_called': []})
+    
+    async def queue_event(self, event):
+        """Fold region event into the pending per-office summaries"""
+        seq = event.get('seq')
+        if seq is not None:
+            if seq <= self.min_seq:
+                return
+            self.last_seq = max(self.last_seq, seq)
+        
+        data = event['data']
+        office_id = data.get('office_id')
+        if office_id is None:
+            return
+        
+        summary = self._office_summary(office_id)
+        if event['event_type'] in ('TICKET_CREATED', 'TICKETS_CREATED'):
+            created = data.get('count', 1)
+            summary['created'] += created
+            self.waiting[office_id] = self.waiting.get(office_id, 0) + created
+        elif event['event_type'] == 'TICKET_CALLED':
+            self._fold_called(office_id, summary, data)
+        elif event['event_type'] == 'SERVICE_COMPLETED_AND_CALLED' and data['called']:
+            self._fold_called(office_id, summary, data['called'])
+    
+    def _fold_called(self, office_id, summary, ticket):
+        summary['called'] += 1
+        self.waiting[office_id] = max(self.waiting.get(office_id, 0) - 1, 0)
+        summary['last_called'] = (summary['last_called'] + [ticket['ticket_number']])[-self.LAST_CALLED_LIMIT:]
+    
+    async def flush(self):
+        """Send one frame summarizing every office that changed since the last flush"""
+        if not self.pending:
+            return
+        offices = [
+            {'office_id': office_id, 'waiting': self.waiting.get(office_id, 0), **summary}
+            for office_id, summary in sorted(self.pending.items())
+        ]
+        self.pending = {}
+        await self.send(text_data=encode_frame(
+            'REGION_SUMMARY',
+            {'region_id': self.group_id, 'offices': offices},
+            self.last_seq or None
+        ))
+    
+    async def flush_loop(self):
+        """Flush pending summaries every interval"""
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+
+class MultiplexConsumer(BackpressureMixin, AsyncWebsocketConsumer):
+    """One socket subscribed to several queue groups, each with an optional event type filter"""
+    
+    MAX_SUBSCRIPTIONS = 20
+    GROUP_PATTERN = re.compile(r'^(office|region|counter)_(\d+)$')
+    SNAPSHOT_BUILDERS = {
+        'office': get_office_snapshot,
+        'region': get_region_snapshot,
+        'counter': get_counter_snapshot,
+    }
+    
+    async def connect(self):
+        """Accept, then subscribe to any groups given in the query string"""
+        self.subscriptions = {}
         await self.accept()
+        self.start_outbound()
+        
+        groups = self.get_query_list('subscribe')
+        if groups:
+            try:
+                await self.subscribe(groups, self.get_query_list('events'))
+            except ValueError as exc:
+                await self.send(text_data=encode_reply(None, error=str(exc)))
     
     async def disconnect(self, close_code):
-        """Disconnect from counter group"""
-        await self.channel_layer.group_discard(
-            self.group_name,
-            self.channel_name
-        )
+        """Leave every subscribed group"""
+        self.stop_outbound()
+        for group_name in list(getattr(self, 'subscriptions', {})):
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+    
+    def get_query_list(self, name):
+        """Parse a comma separated query string parameter"""
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        values = ','.join(query.get(name, []))
+        return [value for value in values.split(',') if value]
+    
+    async def receive(self, text_data=None, bytes_data=None):
+        """Handle subscribe/unsubscribe commands"""
+        try:
+            command = json.loads(text_data)
+            request_id = command.get('request_id')
+        except (TypeError, ValueError, AttributeError):
+            await self.send(text_data=encode_reply(None, error='Commands must be JSON objects'))
+            return
+        
+        action = command.get('action')
+        groups = command.get('groups') or []
+        try:
+            if not isinstance(groups, list):
+                raise ValueError('groups must be a list')
+            if action == 'subscribe':
+                self.validate_subscription(groups, command.get('events'))
+                await self.send(text_data=encode_reply(request_id, {'groups': groups}))
+                await self.subscribe(groups, command.get('events'), command.get('resume_from'))
+            elif action == 'unsubscribe':
+                await self.unsubscribe(groups)
+                await self.send(text_data=encode_reply(request_id, {'groups': groups}))
+            else:
+                raise ValueError(f'Unknown action: {action}')
+        except ValueError as exc:
+            await self.send(text_data=encode_reply(request_id, error=str(exc)))
+    
+    def validate_subscription(self, groups, events):
+        for group_name in groups:
+            if not isinstance(group_name, str) or not self.GROUP_PATTERN.match(group_name):
+                raise ValueError(f'Invalid group: {group_name}')
+        if len(set(self.subscriptions) | set(groups)) > self.MAX_SUBSCRIPTIONS:
+            raise ValueError(f'At most {self.MAX_SUBSCRIPTIONS} subscriptions per connection')
+        if events is not None and not isinstance(events, list):
+            raise ValueError('events must be a list')
+    
+    async def subscribe(self, groups, events=None, resume_from=None):
+        """Join groups with an event type filter (None for every event) and send their state.
+        
+        resume_from maps group name to the last seq seen, to replay instead of snapshot.
+        """
+        self.validate_subscription(groups, events)
+        if not isinstance(resume_from, dict):
+            resume_from = {}
+        event_filter = frozenset(events) if events else None
+        
+        for group_name in groups:
+            subscription = self.subscriptions.get(group_name)
+            if subscription is not None:
+                subscription['events'] = event_filter
+                continue
+            self.subscriptions[group_name] = {'events': event_filter, 'min_seq': 0}
+            await self.channel_layer.group_add(group_name, self.channel_name)
+            await self.send_initial_state(group_name, resume_from.get(group_name))
+    
+    async def resync(self):
+        """Replace a slow client's dropped backlog with fresh snapshots of its groups"""
+        for group_name in list(self.subscriptions):
+            await self.send_initial_state(group_name)
+    
+    async def unsubscribe(self, groups):
+        for group_name in groups:
+            if self.subscriptions.pop(group_name, None) is not None:
+                await self.channel_layer.group_discard(group_name, self.channel_name)
+    
+    async def send_initial_state(self, group_name, resume_from=None):
+        """Replay missed events of group when resuming, otherwise send its snapshot"""
+        subscription = self.subscriptions[group_name]
+        if isinstance(resume_from, int):
+            replayed = await sync_to_async(event_log.replay)(group_name, resume_from)
+            if replayed is not None:
+                subscription['min_seq'], frames = replayed
+                for frame in frames:
+                    await self.send(text_data=tag_frame(group_name, frame))
+                return
+        
+        kind, group_id = self.GROUP_PATTERN.match(group_name).groups()
+        seq = await sync_to_async(event_log.current_seq)(group_name)
+        snapshot = await database_sync_to_async(self.SNAPSHOT_BUILDERS[kind])(int(group_id))
+        subscription['min_seq'] = seq
+        await self.send(text_data=tag_frame(group_name, encode_frame('SNAPSHOT', snapshot, seq)))
     
     async def queue_event(self, event):
-        """Receive queue event from group"""
-        await self.send(text_data=json.dumps({
-            'type': event['event_type'],
-            'data': event['data']
-        }))
+        """Forward event if its group's filter accepts it, tagged with the group"""
+        subscription = self.subscriptions.get(event.get('group'))
+        if subscription is None:
+            return
+        if subscription['events'] is not None and event['event_type'] not in subscription['events']:
+            return
+        seq = event.get('seq')
+        if seq is not None and seq <= subscription['min_seq']:
+            return
+        
+        text = event.get('text')
+        if text is None:
+            text = encode_frame(event['event_type'], event['data'], seq)
+        await self.send(text_data=tag_frame(event['group'], text))
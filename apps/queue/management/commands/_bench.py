@@ -0,0 +1,73 @@
+"""
+Shared helpers for the queue benchmark commands.
+"""
+import json
+import threading
+import time
+import uuid
+
+from apps.queue.models import Region, Office, Counter
+
+
+def create_bench_office(counters=1):
+    """Create a throwaway region/office with active counters"""
+    label = uuid.uuid4().hex[:8]
+    region = Region.objects.create(name=f'bench-{label}')
+    office = Office.objects.create(name=f'bench-{label}', region=region)
+    counter_list = [
+        Counter.objects.create(name=f'bench-{label}-{i}', office=office)
+        for i in range(counters)
+    ]
+    return region, office, counter_list
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_summary(samples):
+    """Summarize latency samples (seconds) in milliseconds"""
+    if not samples:
+        return {'count': 0}
+    return {
+        'count': len(samples),
+        'mean_ms': sum(samples) / len(samples) * 1000,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': max(samples) * 1000,
+    }
+
+
+def run_threads(count, target):
+    """Run target(index) in count threads released together, return elapsed seconds"""
+    barrier = threading.Barrier(count + 1)
+
+    def worker(index):
+        barrier.wait()
+        target(index)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def write_report(stdout, name, results, as_json=False):
+    """Print benchmark results as JSON or aligned key/value lines"""
+    if as_json:
+        stdout.write(json.dumps({'benchmark': name, 'results': results}, default=str))
+        return
+    stdout.write(name)
+    for key, value in results.items():
+        if isinstance(value, float):
+            value = f'{value:.3f}'
+        stdout.write(f'  {key:<34} {value}')
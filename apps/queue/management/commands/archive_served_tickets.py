@@ -0,0 +1,43 @@
+"""
+Move SERVED tickets older than the retention window into ticket history.
+
+Runs one short transaction per batch so it can run while offices are open;
+schedule it daily (cron, Celery beat). --sleep pauses between batches to let
+replicas and the live workload keep up.
+
+    python manage.py archive_served_tickets --days 30 --batch-size 5000
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.queue.services import archive_cutoff, archive_served_tickets
+from apps.queue.services.archive import get_archivable_tickets
+
+
+class Command(BaseCommand):
+    help = 'Archive SERVED tickets older than --days into queue_ticket_history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=getattr(settings, 'QUEUE_HISTORY_RETENTION_DAYS', 30),
+            help='Keep tickets served within this many days in the live table'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count archivable tickets')
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['days'])
+        if options['dry_run']:
+            self.stdout.write(f'{get_archivable_tickets(cutoff).count()} tickets served before {cutoff:%Y-%m-%d %H:%M} to archive')
+            return
+
+        started = time.perf_counter()
+        total = archive_served_tickets(
+            cutoff, options['batch_size'], sleep=options['sleep'],
+            progress=lambda archived: self.stdout.write(f'Archived {archived} tickets')
+        )
+
+        self.stdout.write(f'Archived {total} tickets served before {cutoff:%Y-%m-%d %H:%M} in {time.perf_counter() - started:.1f}s')
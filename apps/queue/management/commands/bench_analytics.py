@@ -0,0 +1,113 @@
+"""
+Benchmark month-range analytics from hourly rollups against raw tickets.
+
+Writes a month of served tickets for a few offices straight into ticket
+history (as the archival job would leave them), rolls them up with
+rollup_range, then times office and region analytics over the month from the
+rollups next to the same wait percentiles computed from the raw rows.
+
+    python manage.py bench_analytics --offices 5 --days 30 --tickets-per-day 300
+"""
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from apps.queue.models import Office, TicketHistory
+from apps.queue.selectors import get_office_analytics, get_region_analytics
+from apps.queue.services import rollup_range
+from apps.queue.services.rollups import floor_hour
+from ._bench import create_bench_office, latency_summary, percentile, write_report
+
+
+class Command(BaseCommand):
+    help = 'Benchmark month-range analytics from hourly rollups vs raw ticket rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--offices', type=int, default=5)
+        parser.add_argument('--days', type=int, default=30)
+        parser.add_argument('--tickets-per-day', type=int, default=300, help='Per office')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--json', action='store_true')
+        parser.add_argument('--keep', action='store_true', help='Keep benchmark rows')
+
+    def handle(self, *args, **options):
+        region, office, counters = create_bench_office()
+        offices = [office] + [
+            Office.objects.create(name=f'{office.name}-{i}', region=region)
+            for i in range(1, options['offices'])
+        ]
+        end = floor_hour(timezone.now()).replace(hour=0)
+        start = end - timedelta(days=options['days'])
+
+        started = time.perf_counter()
+        rows = self.insert_history(region, offices, start, options['days'], options['tickets_per_day'])
+        results = {
+            'backend': connection.vendor,
+            'offices': len(offices),
+            'days': options['days'],
+            'tickets': rows,
+            'insert_s': time.perf_counter() - started,
+        }
+
+        started = time.perf_counter()
+        results['rollup_rows'] = rollup_range(start, end)
+        results['rollup_s'] = time.perf_counter() - started
+
+        first_day, last_day = start.date(), (end - timedelta(days=1)).date()
+        timings = {
+            'office_rollup': lambda: get_office_analytics(office.id, first_day, last_day),
+            'region_rollup': lambda: get_region_analytics(region.id, first_day, last_day),
+            'office_raw': lambda: self.raw_wait_percentiles(office, start, end),
+        }
+        for name, query in timings.items():
+            samples = []
+            for _ in range(options['repeat']):
+                query_started = time.perf_counter()
+                query()
+                samples.append(time.perf_counter() - query_started)
+            summary = latency_summary(samples)
+            results[f'{name}_p50_ms'] = summary['p50_ms']
+            results[f'{name}_p99_ms'] = summary['p99_ms']
+        if results['office_rollup_p50_ms']:
+            results['office_speedup'] = results['office_raw_p50_ms'] / results['office_rollup_p50_ms']
+
+        write_report(self.stdout, 'analytics', results, as_json=options['json'])
+
+        if not options['keep']:
+            region.delete()
+
+    def insert_history(self, region, offices, start, days, per_day):
+        """Served tickets spread over opening hours, with random waits and service times"""
+        rng = random.Random(42)
+        tickets = []
+        for office in offices:
+            for day in range(days):
+                opening = start + timedelta(days=day, hours=8)
+                for i in range(per_day):
+                    created_at = opening + timedelta(seconds=rng.uniform(0, 9 * 3600))
+                    called_at = created_at + timedelta(seconds=rng.expovariate(1 / 600))
+                    tickets.append(TicketHistory(
+                        ticket_id=-(len(tickets) + 1) - office.id * 10 ** 9,
+                        ticket_number=f'B{office.id}-{day:03d}-{i:05d}',
+                        region=region,
+                        office=office,
+                        created_at=created_at,
+                        called_at=called_at,
+                        served_at=called_at + timedelta(seconds=rng.expovariate(1 / 240))
+                    ))
+        TicketHistory.objects.bulk_create(tickets, batch_size=5000)
+        return len(tickets)
+
+    def raw_wait_percentiles(self, office, start, end):
+        """What the rollups replace: fetch every wait in range and sort"""
+        rows = TicketHistory.objects.filter(
+            office=office,
+            served_at__gte=start,
+            served_at__lt=end
+        ).values_list('created_at', 'called_at')
+        waits = [(called_at - created_at).total_seconds() for created_at, called_at in rows]
+        return {pct: percentile(waits, pct) for pct in (50, 90, 95)}
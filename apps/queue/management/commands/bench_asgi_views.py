@@ -0,0 +1,82 @@
+"""
+ASGI throughput of the DRF (sync) and async ticket endpoints.
+
+Drives Django's ASGI application in-process with N concurrent clients, each
+serving tickets through create -> call-next -> start -> complete on its own
+counter, once against /api/... and once against /api/async/..., and reports
+requests per second and per-request latency for both.
+"""
+import asyncio
+import json
+import time
+
+from asgiref.sync import async_to_sync
+from channels.testing import HttpCommunicator
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+
+from ._bench import create_bench_office, latency_summary, write_report
+
+PREFIXES = {'sync': '/api', 'async': '/api/async'}
+
+
+class Command(BaseCommand):
+    help = 'Compare ASGI throughput of the sync DRF and async ticket endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=10)
+        parser.add_argument('--cycles', type=int, default=20, help='Tickets served per client')
+        parser.add_argument('--json', action='store_true')
+        parser.add_argument('--keep', action='store_true', help='Keep benchmark rows')
+
+    async def _post(self, path, body=None):
+        host = (settings.ALLOWED_HOSTS or ['localhost'])[0]
+        payload = json.dumps(body).encode() if body else b''
+        communicator = HttpCommunicator(
+            self.application, 'POST', path,
+            body=payload,
+            headers=[
+                (b'host', host.encode()),
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(payload)).encode()),
+            ]
+        )
+        started = time.perf_counter()
+        response = await communicator.get_response(timeout=30)
+        self.samples.append(time.perf_counter() - started)
+        return json.loads(response['body'] or b'null')
+
+    async def _client(self, prefix, region, office, counter):
+        for _ in range(self.cycles):
+            await self._post(f'{prefix}/tickets/', {'region_id': region.id, 'office_id': office.id})
+            called = await self._post(f'{prefix}/counters/{counter.id}/call-next/')
+            ticket_id = called['ticket']['id']
+            await self._post(f'{prefix}/tickets/{ticket_id}/start-service/')
+            await self._post(f'{prefix}/tickets/{ticket_id}/complete-service/')
+
+    async def _run(self, prefix, region, office, counters):
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            self._client(prefix, region, office, counter)
+            for counter in counters
+        ))
+        return time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        self.cycles = options['cycles']
+        self.application = get_asgi_application()
+        region, office, counters = create_bench_office(counters=options['clients'])
+
+        results = {'clients': options['clients'], 'requests': options['clients'] * self.cycles * 4}
+        for name, prefix in PREFIXES.items():
+            self.samples = []
+            elapsed = async_to_sync(self._run)(prefix, region, office, counters)
+            results[f'{name}_requests_per_sec'] = len(self.samples) / elapsed if elapsed else 0.0
+            summary = latency_summary(self.samples)
+            results[f'{name}_p50_ms'] = summary['p50_ms']
+            results[f'{name}_p99_ms'] = summary['p99_ms']
+        write_report(self.stdout, 'asgi_views', results, as_json=options['json'])
+
+        if not options['keep']:
+            region.delete()
@@ -0,0 +1,70 @@
+"""
+Microbenchmark for fanning one queue event out to office, region and counter.
+
+Compares the original pattern (one async_to_sync(group_send) call per group)
+with send_batch (one loop hop, groups sent concurrently), both on its own and
+behind prepare_deliveries, which sequences and logs the event as the outbox
+dispatcher does.
+"""
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand
+
+from apps.queue.services.events import build_message, prepare_deliveries, send_batch
+from ._bench import latency_summary, write_report
+
+
+class Command(BaseCommand):
+    help = 'Compare per-event latency of sequential group_sends vs send_batch, with and without sequencing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=1000)
+        parser.add_argument('--subscribers', type=int, default=1, help='Channels per group')
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        channel_layer = get_channel_layer()
+        groups = ['office_bench', 'region_bench', 'counter_bench']
+        data = {'ticket_id': 1, 'ticket_number': '001-20260101-0001', 'status': 'CALLED'}
+
+        async def subscribe():
+            channels = []
+            for group_name in groups:
+                for _ in range(options['subscribers']):
+                    channel = await channel_layer.new_channel()
+                    await channel_layer.group_add(group_name, channel)
+                    channels.append((group_name, channel))
+            return channels
+
+        async def unsubscribe(channels):
+            for group_name, channel in channels:
+                await channel_layer.group_discard(group_name, channel)
+
+        def sequential():
+            for group_name in groups:
+                async_to_sync(channel_layer.group_send)(group_name, build_message('TICKET_CALLED', data))
+
+        def batch():
+            deliveries = [[(group_name, build_message('TICKET_CALLED', data)) for group_name in groups]]
+            async_to_sync(send_batch)(deliveries)
+
+        def dispatch():
+            async_to_sync(send_batch)(prepare_deliveries([(groups, 'TICKET_CALLED', data)]))
+
+        channels = async_to_sync(subscribe)()
+        results = {'layer': type(channel_layer).__name__, 'groups': len(groups)}
+        try:
+            for label, send in (('sequential', sequential), ('send_batch', batch), ('dispatch', dispatch)):
+                samples = []
+                for _ in range(options['events']):
+                    started = time.perf_counter()
+                    send()
+                    samples.append(time.perf_counter() - started)
+                for key, value in latency_summary(samples).items():
+                    results[f'{label}_{key}'] = value
+        finally:
+            async_to_sync(unsubscribe)(channels)
+
+        write_report(self.stdout, 'broadcast', results, as_json=options['json'])
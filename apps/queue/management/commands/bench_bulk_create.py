@@ -0,0 +1,56 @@
+"""
+Benchmark batch ticket creation against one create_ticket call per ticket.
+
+Creates the same number of tickets both ways for a fresh office and reports
+wall time, SQL queries and broadcasts for each path.
+"""
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.queue.services import create_ticket, create_tickets_bulk
+from ._bench import create_bench_office, write_report
+
+
+class Command(BaseCommand):
+    help = 'Benchmark bulk ticket creation against N single create_ticket calls'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=200)
+        parser.add_argument('--json', action='store_true')
+        parser.add_argument('--keep', action='store_true', help='Keep benchmark rows')
+
+    def measure(self, create):
+        """Run create(), returning elapsed seconds, query count and broadcast count"""
+        with mock.patch('apps.queue.services.events._deliver') as deliver:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                create()
+                elapsed = time.perf_counter() - started
+        return elapsed, len(queries), deliver.call_count
+
+    def handle(self, *args, **options):
+        count = options['tickets']
+        region, office, _ = create_bench_office()
+        items = [{'region_id': region.id, 'office_id': office.id} for _ in range(count)]
+
+        def single():
+            for _ in range(count):
+                create_ticket(region.id, office.id)
+
+        results = {'backend': connection.vendor, 'tickets': count}
+        for label, create in (('single', single), ('bulk', lambda: create_tickets_bulk(items))):
+            elapsed, queries, broadcasts = self.measure(create)
+            results[f'{label}_elapsed_s'] = elapsed
+            results[f'{label}_tickets_per_sec'] = count / elapsed if elapsed else 0.0
+            results[f'{label}_queries'] = queries
+            results[f'{label}_broadcasts'] = broadcasts
+        if results['bulk_elapsed_s']:
+            results['speedup'] = results['single_elapsed_s'] / results['bulk_elapsed_s']
+        write_report(self.stdout, 'bulk_create', results, as_json=options['json'])
+
+        if not options['keep']:
+            region.delete()
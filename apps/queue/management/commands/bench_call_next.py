@@ -0,0 +1,81 @@
+"""
+Concurrency benchmark for call_next_ticket.
+
+Drives N counter threads against one office until the queue is drained and
+reports claims/sec and any ticket handed to more than one counter.
+"""
+from collections import Counter as Tally
+
+from django.core.management.base import BaseCommand
+from django.db import connection, OperationalError
+from django.utils import timezone
+
+from apps.queue.models import QueueTicket
+from apps.queue.services import call_next_ticket
+from ._bench import create_bench_office, run_threads, write_report
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent call-next claims against a single office'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--counters', type=int, default=20)
+        parser.add_argument('--tickets', type=int, default=2000)
+        parser.add_argument('--json', action='store_true')
+        parser.add_argument('--keep', action='store_true', help='Keep benchmark rows')
+
+    def _seed_tickets(self, region, office, count):
+        """Insert WAITING tickets directly, bypassing number generation"""
+        prefix = f'B{office.id}-{timezone.now():%H%M%S}'
+        QueueTicket.objects.bulk_create([
+            QueueTicket(
+                ticket_number=f'{prefix}-{i:06d}',
+                region=region,
+                office=office,
+                status='WAITING'
+            )
+            for i in range(count)
+        ])
+
+    def handle(self, *args, **options):
+        region, office, counters = create_bench_office(options['counters'])
+        self._seed_tickets(region, office, options['tickets'])
+
+        claims = [[] for _ in counters]
+        errors = [0 for _ in counters]
+
+        def drain(index):
+            try:
+                while True:
+                    try:
+                        ticket = call_next_ticket(counters[index].id)
+                    except OperationalError:
+                        errors[index] += 1
+                        continue
+                    if ticket is None:
+                        return
+                    claims[index].append(ticket.id)
+            finally:
+                connection.close()
+
+        elapsed = run_threads(len(counters), drain)
+
+        claimed_ids = [ticket_id for batch in claims for ticket_id in batch]
+        duplicates = sum(n - 1 for n in Tally(claimed_ids).values() if n > 1)
+        left_waiting = QueueTicket.objects.filter(office=office, status='WAITING').count()
+
+        write_report(self.stdout, 'call_next_ticket', {
+            'backend': connection.vendor,
+            'skip_locked': connection.features.has_select_for_update_skip_locked,
+            'counters': len(counters),
+            'tickets': options['tickets'],
+            'claims': len(claimed_ids),
+            'elapsed_s': elapsed,
+            'claims_per_sec': len(claimed_ids) / elapsed if elapsed else 0.0,
+            'duplicate_assignments': duplicates,
+            'left_waiting': left_waiting,
+            'lock_errors': sum(errors),
+        }, as_json=options['json'])
+
+        if not options['keep']:
+            region.delete()
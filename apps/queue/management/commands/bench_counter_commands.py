@@ -0,0 +1,95 @@
+"""
+Round-trip latency of counter actions over the counter socket and over HTTP.
+
+Serves N tickets through call_next -> start -> complete, once as commands on
+the counter WebSocket and once as DRF POSTs, both in-process, and reports
+per-action latency. Network time is not included, so the numbers show the
+server-side cost each transport adds on top of the service call.
+"""
+import time
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from apps.queue.routing import websocket_urlpatterns
+from apps.queue.services import create_tickets_bulk
+from ._bench import create_bench_office, latency_summary, write_report
+
+ACTIONS = ('call_next', 'start', 'complete')
+
+
+class Command(BaseCommand):
+    help = 'Compare counter action latency over the counter WebSocket and HTTP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tickets', type=int, default=200)
+        parser.add_argument('--json', action='store_true')
+        parser.add_argument('--keep', action='store_true', help='Keep benchmark rows')
+
+    def _queue(self, region, office):
+        create_tickets_bulk([{'region_id': region.id, 'office_id': office.id}] * self.tickets)
+
+    async def _socket(self, counter):
+        samples = {action: [] for action in ACTIONS}
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/counter/{counter.id}/')
+        await communicator.connect()
+        await communicator.receive_from()
+
+        async def command(action, request_id, ticket_id=None):
+            started = time.perf_counter()
+            await communicator.send_json_to({'action': action, 'request_id': request_id, 'ticket_id': ticket_id})
+            while True:
+                reply = await communicator.receive_json_from(timeout=5)
+                if reply.get('type') == 'REPLY' and reply['request_id'] == request_id:
+                    break
+            samples[action].append(time.perf_counter() - started)
+            return reply
+
+        for index in range(self.tickets):
+            reply = await command('call_next', f'{index}-call')
+            ticket_id = reply['data']['ticket']['ticket_id']
+            await command('start', f'{index}-start', ticket_id)
+            await command('complete', f'{index}-complete', ticket_id)
+        await communicator.disconnect()
+        return samples
+
+    def _http(self, counter):
+        samples = {action: [] for action in ACTIONS}
+        client = Client(HTTP_HOST=(settings.ALLOWED_HOSTS or ['localhost'])[0])
+
+        def post(action, path):
+            started = time.perf_counter()
+            response = client.post(path)
+            samples[action].append(time.perf_counter() - started)
+            return response
+
+        for _ in range(self.tickets):
+            response = post('call_next', f'/api/counters/{counter.id}/call-next/')
+            ticket_id = response.json()['ticket']['id']
+            post('start', f'/api/tickets/{ticket_id}/start-service/')
+            post('complete', f'/api/tickets/{ticket_id}/complete-service/')
+        return samples
+
+    def handle(self, *args, **options):
+        self.tickets = options['tickets']
+        region, office, (counter,) = create_bench_office()
+
+        results = {'tickets': self.tickets}
+        self._queue(region, office)
+        transports = {'ws': async_to_sync(self._socket)(counter)}
+        self._queue(region, office)
+        transports['http'] = self._http(counter)
+
+        for transport, samples in transports.items():
+            for action in ACTIONS:
+                summary = latency_summary(samples[action])
+                results[f'{transport}_{action}_p50_ms'] = summary['p50_ms']
+                results[f'{transport}_{action}_p99_ms'] = summary['p99_ms']
+        write_report(self.stdout, 'counter_commands', results, as_json=options['json'])
+
+        if not options['keep']:
+            region.delete()
@@ -0,0 +1,69 @@
+"""
+CPU cost of delivering one queue event to many display sockets.
+
+Drives the real queue_event handler of N RegionConsumer instances with the
+transport stubbed out, once with legacy messages (encoded per socket) and
+once with pre-encoded frames, and reports CPU time per event.
+"""
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+
+from apps.queue.consumers.consumers import RegionConsumer
+from apps.queue.services import events
+from ._bench import write_report
+
+
+async def _discard(message):
+    """Stand-in transport that drops outgoing frames"""
+
+
+class Command(BaseCommand):
+    help = 'Measure CPU per event when fanning out to many WebSocket consumers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, nargs='+', default=[1000, 10000])
+        parser.add_argument('--events', type=int, default=20)
+        parser.add_argument('--json', action='store_true')
+
+    def _consumers(self, count):
+        consumers = []
+        for _ in range(count):
+            consumer = RegionConsumer()
+            consumer.base_send = _discard
+            consumers.append(consumer)
+        return consumers
+
+    def _measure(self, consumers, make_message, count):
+        data = {
+            'ticket_id': 123456,
+            'ticket_number': '001-20260101-0420',
+            'region_id': 1,
+            'office_id': 1,
+            'counter_id': 4,
+            'status': 'CALLED',
+            'timestamp': '2026-01-01T09:30:00+00:00'
+        }
+
+        async def deliver(message):
+            for consumer in consumers:
+                await consumer.queue_event(message)
+
+        started = time.process_time()
+        for _ in range(count):
+            async_to_sync(deliver)(make_message('TICKET_CALLED', data))
+        return (time.process_time() - started) / count
+
+    def handle(self, *args, **options):
+        def legacy(event_type, data):
+            return {'type': 'queue_event', 'event_type': event_type, 'data': data}
+
+        results = {'encoder': 'orjson' if events.orjson is not None else 'json'}
+        for count in options['subscribers']:
+            consumers = self._consumers(count)
+            per_socket = self._measure(consumers, legacy, options['events'])
+            pre_encoded = self._measure(consumers, events.build_message, options['events'])
+            results[f'{count}_per_socket_encode_cpu_ms'] = per_socket * 1000
+            results[f'{count}_pre_encoded_cpu_ms'] = pre_encoded * 1000
+        write_report(self.stdout, 'fanout', results, as_json=options['json'])
@@ -0,0 +1,128 @@
+"""
+Benchmark live queue queries as SERVED ticket history grows.
+
+Gives one office a realistic live queue, then adds old SERVED tickets in
+--steps equal batches up to --rows, timing the live queries (next waiting
+ticket, office snapshot, status counts, supervisor dashboard) after each
+step while the history stays in queue_ticket. Then archives it all into
+queue_ticket_history with archive_served_tickets and times the live queries
+again: with history archived they should match the empty-table numbers
+however large the history table is.
+
+    python manage.py bench_history --rows 1000000 --steps 4 --json
+"""
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from apps.queue.models import QueueTicket, TicketHistory
+from apps.queue.selectors import get_next_waiting_ticket, get_office_queue_stats, get_office_snapshot
+from apps.queue.services import archive_cutoff, archive_served_tickets, get_supervisor_dashboard_data
+from ._bench import create_bench_office, latency_summary, write_report
+
+INSERT_BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = 'Benchmark live query latency with SERVED history in queue_ticket vs archived'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000, help='Total SERVED history rows')
+        parser.add_argument('--steps', type=int, default=4)
+        parser.add_argument('--waiting', type=int, default=50, help='Live WAITING tickets')
+        parser.add_argument('--repeat', type=int, default=50, help='Samples per query and step')
+        parser.add_argument('--days', type=int, default=30, help='Retention window used for archival')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Archival batch size')
+        parser.add_argument('--json', action='store_true')
+        parser.add_argument('--keep', action='store_true', help='Keep benchmark rows')
+
+    def handle(self, *args, **options):
+        region, office, counters = create_bench_office(counters=2)
+        now = timezone.now()
+        QueueTicket.objects.bulk_create([
+            QueueTicket(
+                ticket_number=f'B{office.id}-live-{i:06d}',
+                region=region,
+                office=office,
+                status='WAITING'
+            )
+            for i in range(options['waiting'])
+        ])
+        QueueTicket.objects.create(
+            ticket_number=f'B{office.id}-live-serving',
+            region=region,
+            office=office,
+            counter=counters[0],
+            status='SERVING',
+            called_at=now
+        )
+
+        queries = {
+            'next_waiting': lambda: get_next_waiting_ticket(office.id),
+            'office_snapshot': lambda: get_office_snapshot(office.id),
+            'status_counts': lambda: list(get_office_queue_stats(office.id)),
+            'dashboard': lambda: get_supervisor_dashboard_data(office.id),
+        }
+        results = {'backend': connection.vendor, 'waiting': options['waiting']}
+        self.measure(results, 'live_0', queries, options['repeat'])
+
+        per_step = options['rows'] // max(options['steps'], 1)
+        inserted = 0
+        for _ in range(options['steps']):
+            started = time.perf_counter()
+            self.insert_history(region, office, counters, inserted, per_step, now - timedelta(days=options['days'] + 1))
+            inserted += per_step
+            results[f'live_{inserted}_insert_s'] = time.perf_counter() - started
+            self.measure(results, f'live_{inserted}', queries, options['repeat'])
+
+        started = time.perf_counter()
+        archived = archive_served_tickets(archive_cutoff(options['days']), options['batch_size'])
+        elapsed = time.perf_counter() - started
+        results['archived'] = archived
+        results['archive_s'] = elapsed
+        results['archive_rows_per_sec'] = archived / elapsed if elapsed else 0.0
+        results['history_rows'] = TicketHistory.objects.filter(office=office).count()
+        self.measure(results, f'archived_{archived}', queries, options['repeat'])
+
+        write_report(self.stdout, 'history', results, as_json=options['json'])
+
+        if not options['keep']:
+            region.delete()
+
+    def measure(self, results, label, queries, repeat):
+        """Record p50/p99 of each live query under label"""
+        for name, query in queries.items():
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                query()
+                samples.append(time.perf_counter() - started)
+            summary = latency_summary(samples)
+            results[f'{label}_{name}_p50_ms'] = summary['p50_ms']
+            results[f'{label}_{name}_p99_ms'] = summary['p99_ms']
+
+    def insert_history(self, region, office, counters, start, count, served_before):
+        """Insert count SERVED tickets spread over the days before served_before"""
+        for offset in range(start, start + count, INSERT_BATCH):
+            tickets = []
+            for i in range(offset, min(offset + INSERT_BATCH, start + count)):
+                served_at = served_before - timedelta(minutes=i)
+                tickets.append(QueueTicket(
+                    ticket_number=f'B{office.id}-{i:09d}',
+                    region=region,
+                    office=office,
+                    counter=counters[i % len(counters)],
+                    status='SERVED',
+                    called_at=served_at - timedelta(minutes=5),
+                    served_at=served_at
+                ))
+            QueueTicket.objects.bulk_create(tickets)
+        # bulk_create stamps created_at/updated_at with now; backdate them like real history
+        QueueTicket.objects.filter(office=office, status='SERVED', updated_at__gte=served_before).update(
+            created_at=F('called_at') - timedelta(minutes=10),
+            updated_at=F('served_at')
+        )
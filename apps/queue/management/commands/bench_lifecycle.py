@@ -0,0 +1,182 @@
+"""
+End-to-end benchmark of the ticket lifecycle.
+
+Kiosks create tickets, counters cycle call-next -> start -> complete and N
+display sockets per office follow along, all in one process: HTTP requests
+go through the Django test client and displays are WebsocketCommunicators
+on the in-memory channel layer (or a local Redis with --redis). Reports
+p50/p99 latency and queries per request for each endpoint, and event
+delivery lag from the event timestamp to a display receiving it.
+
+By default requests run on the same sync thread channels uses for consumer
+housekeeping (close_old_connections before every handler), as when one ASGI
+process serves both HTTP and sockets, so event lag includes waiting for the
+request in flight. --isolate-http runs them on separate threads instead, like
+a dedicated HTTP worker. The thread switch interval is lowered while the
+benchmark runs so GIL hand-offs do not dominate the measured lag.
+
+    python manage.py bench_lifecycle --offices 2 --subscribers 20 --json --output bench.json
+"""
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.queue.routing import websocket_urlpatterns
+from ._bench import create_bench_office, latency_summary, write_report
+
+ENDPOINTS = ('ticket_create', 'call_next', 'start_service', 'complete_service')
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the full ticket lifecycle with kiosks, counters and display sockets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--offices', type=int, default=2)
+        parser.add_argument('--kiosks', type=int, default=2, help='Kiosks per office')
+        parser.add_argument('--counters', type=int, default=2, help='Counters per office')
+        parser.add_argument('--subscribers', type=int, default=10, help='Display sockets per office')
+        parser.add_argument('--tickets', type=int, default=25, help='Tickets per kiosk')
+        parser.add_argument('--redis', metavar='URL', help='Use a Redis channel layer instead of the in-memory one')
+        parser.add_argument('--isolate-http', action='store_true', help='Run requests off the shared sync thread')
+        parser.add_argument('--switch-interval', type=float, default=0.1, help='Thread switch interval (ms)')
+        parser.add_argument('--json', action='store_true')
+        parser.add_argument('--output', metavar='PATH', help='Also write JSON results to PATH')
+        parser.add_argument('--keep', action='store_true', help='Keep benchmark rows')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.latencies = {endpoint: [] for endpoint in ENDPOINTS}
+        self.queries = {endpoint: [] for endpoint in ENDPOINTS}
+        self.lags = []
+        self.client = Client(HTTP_HOST=(settings.ALLOWED_HOSTS or ['localhost'])[0])
+
+        if options['redis']:
+            layer_settings = {'CHANNEL_LAYERS': {'default': {
+                'BACKEND': 'channels_redis.core.RedisChannelLayer',
+                'CONFIG': {'hosts': [options['redis']]},
+            }}}
+        else:
+            # The in-memory layer only works on one event loop, so send events inline
+            layer_settings = {
+                'CHANNEL_LAYERS': {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+                'QUEUE_OUTBOX_ASYNC': False,
+            }
+
+        offices = [create_bench_office(counters=options['counters']) for _ in range(options['offices'])]
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(options['switch_interval'] / 1000)
+        try:
+            with override_settings(**layer_settings):
+                elapsed = async_to_sync(self._run)(offices)
+        finally:
+            sys.setswitchinterval(switch_interval)
+
+        results = {
+            'backend': connection.vendor,
+            'channel_layer': 'redis' if options['redis'] else 'in_memory',
+            'isolate_http': options['isolate_http'],
+            'offices': options['offices'],
+            'kiosks_per_office': options['kiosks'],
+            'counters_per_office': options['counters'],
+            'subscribers_per_office': options['subscribers'],
+            'tickets': options['offices'] * options['kiosks'] * options['tickets'],
+            'elapsed_s': elapsed,
+        }
+        for endpoint in ENDPOINTS:
+            summary = latency_summary(self.latencies[endpoint])
+            results[f'{endpoint}_count'] = summary['count']
+            results[f'{endpoint}_p50_ms'] = summary.get('p50_ms')
+            results[f'{endpoint}_p99_ms'] = summary.get('p99_ms')
+            queries = self.queries[endpoint]
+            results[f'{endpoint}_queries_per_op'] = sum(queries) / len(queries) if queries else None
+        lag = latency_summary(self.lags)
+        results['events_received'] = lag['count']
+        results['event_lag_p50_ms'] = lag.get('p50_ms')
+        results['event_lag_p99_ms'] = lag.get('p99_ms')
+
+        write_report(self.stdout, 'lifecycle', results, as_json=options['json'])
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'benchmark': 'lifecycle', 'results': results}, output, indent=2, default=str)
+
+        if not options['keep']:
+            for region, _, _ in offices:
+                region.delete()
+
+    def _request(self, endpoint, path, body=None):
+        """POST through the full middleware/DRF stack, recording latency and query count"""
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self.client.post(path, body, content_type='application/json')
+            self.latencies[endpoint].append(time.perf_counter() - started)
+        self.queries[endpoint].append(len(queries))
+        return response
+
+    async def _run(self, offices):
+        request = sync_to_async(self._request, thread_sensitive=not self.options['isolate_http'])
+        per_office = self.options['kiosks'] * self.options['tickets']
+        served = {office.id: 0 for _, office, _ in offices}
+
+        async def kiosk(region, office):
+            for _ in range(self.options['tickets']):
+                await request('ticket_create', '/api/tickets/', {'region_id': region.id, 'office_id': office.id})
+
+        async def counter(office, counter_id):
+            while served[office.id] < per_office:
+                response = await request('call_next', f'/api/counters/{counter_id}/call-next/')
+                if response.status_code == 404:
+                    await asyncio.sleep(0.005)
+                    continue
+                ticket_id = response.json()['ticket']['id']
+                await request('start_service', f'/api/tickets/{ticket_id}/start-service/')
+                await request('complete_service', f'/api/tickets/{ticket_id}/complete-service/')
+                served[office.id] += 1
+
+        displays = []
+        for _, office, _ in offices:
+            for _ in range(self.options['subscribers']):
+                communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/office/{office.id}/')
+                await communicator.connect()
+                await communicator.receive_from()
+                displays.append(communicator)
+        done = asyncio.Event()
+        readers = [asyncio.ensure_future(self._read(display, done)) for display in displays]
+
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            [kiosk(region, office) for region, office, _ in offices for _ in range(self.options['kiosks'])]
+            + [counter(office, c.id) for _, office, counters in offices for c in counters]
+        ))
+        elapsed = time.perf_counter() - started
+
+        # Let displays drain the last events before stopping
+        await asyncio.sleep(0.2)
+        done.set()
+        await asyncio.gather(*readers)
+        for display in displays:
+            await display.disconnect()
+        return elapsed
+
+    async def _read(self, display, done):
+        """Record delivery lag of every event frame a display receives"""
+        while not done.is_set():
+            # receive_from() kills the consumer on timeout, so poll instead
+            if await display.receive_nothing(timeout=0.05):
+                continue
+            text = await display.receive_from()
+            timestamp = json.loads(text).get('data', {}).get('timestamp')
+            if timestamp:
+                lag = timezone.now() - datetime.fromisoformat(timestamp)
+                self.lags.append(lag.total_seconds())
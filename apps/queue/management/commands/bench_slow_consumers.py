@@ -0,0 +1,76 @@
+"""
+Delivery latency for healthy displays while some displays stop reading.
+
+Feeds events to N fast and M hung OfficeConsumer instances (transport
+stubbed out) and reports fast-client delivery latency with and without the
+hung readers, plus the backpressure counters.
+"""
+import asyncio
+import json
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+
+from apps.queue.consumers.backpressure import stats
+from apps.queue.consumers.consumers import OfficeConsumer
+from apps.queue.services.events import build_message
+from ._bench import latency_summary, write_report
+
+
+class Command(BaseCommand):
+    help = 'Measure fast display latency next to slow (hung) display sockets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fast', type=int, default=200)
+        parser.add_argument('--slow', type=int, default=50)
+        parser.add_argument('--events', type=int, default=500)
+        parser.add_argument('--json', action='store_true')
+
+    def _consumer(self, base_send):
+        consumer = OfficeConsumer()
+        consumer.scope = {'type': 'websocket'}
+        consumer.base_send = base_send
+        consumer.group_id = 0
+        consumer.group_name = 'office_0'
+        consumer.min_seq = 0
+        # Resyncing would need a database; an empty snapshot is enough here
+        consumer.build_snapshot = lambda: {}
+        consumer.start_outbound()
+        return consumer
+
+    async def _run(self, fast_count, slow_count):
+        latencies, sent_at = [], {}
+
+        async def fast_send(message):
+            frame = json.loads(message['text'])
+            if frame['type'] == 'TICKET_CREATED':
+                latencies.append(time.perf_counter() - sent_at[frame['seq']])
+
+        async def slow_send(message):
+            await asyncio.sleep(3600)
+
+        consumers = [self._consumer(fast_send) for _ in range(fast_count)]
+        consumers += [self._consumer(slow_send) for _ in range(slow_count)]
+        for seq in range(1, self.events + 1):
+            message = build_message('TICKET_CREATED', {'ticket_id': seq}, seq=seq)
+            sent_at[seq] = time.perf_counter()
+            for consumer in consumers:
+                await consumer.queue_event(message)
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.1)
+        for consumer in consumers:
+            consumer.stop_outbound()
+        return latencies
+
+    def handle(self, *args, **options):
+        self.events = options['events']
+        results = {'fast': options['fast'], 'slow': options['slow'], 'events': self.events}
+        for label, slow in (('baseline', 0), ('with_slow', options['slow'])):
+            stats.reset()
+            summary = latency_summary(async_to_sync(self._run)(options['fast'], slow))
+            results[f'{label}_delivered'] = summary['count']
+            results[f'{label}_p50_ms'] = summary.get('p50_ms')
+            results[f'{label}_p99_ms'] = summary.get('p99_ms')
+        results.update({f'slow_{key}': value for key, value in stats.as_dict().items()})
+        write_report(self.stdout, 'slow_consumers', results, as_json=options['json'])
@@ -0,0 +1,66 @@
+"""
+Load test for kiosk ticket creation.
+
+Runs N kiosk threads creating tickets for one office and reports throughput,
+per-ticket latency at the start and end of the burst, and IntegrityErrors.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, IntegrityError
+
+from apps.queue.models import QueueTicket
+from apps.queue.services import create_ticket
+from ._bench import create_bench_office, latency_summary, run_threads, write_report
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent kiosk ticket creation for a single office'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kiosks', type=int, default=10)
+        parser.add_argument('--tickets', type=int, default=200, help='Tickets per kiosk')
+        parser.add_argument('--json', action='store_true')
+        parser.add_argument('--keep', action='store_true', help='Keep benchmark rows')
+
+    def handle(self, *args, **options):
+        region, office, _ = create_bench_office()
+        samples = [[] for _ in range(options['kiosks'])]
+        integrity_errors = [0 for _ in range(options['kiosks'])]
+
+        def kiosk(index):
+            try:
+                for _ in range(options['tickets']):
+                    started = time.perf_counter()
+                    try:
+                        create_ticket(region.id, office.id)
+                    except IntegrityError:
+                        integrity_errors[index] += 1
+                        continue
+                    samples[index].append((started, time.perf_counter() - started))
+            finally:
+                connection.close()
+
+        elapsed = run_threads(options['kiosks'], kiosk)
+
+        ordered = [latency for _, latency in sorted(s for batch in samples for s in batch)]
+        tenth = max(1, len(ordered) // 10)
+        created = QueueTicket.objects.filter(office=office).count()
+        distinct = QueueTicket.objects.filter(office=office).values('ticket_number').distinct().count()
+
+        results = {
+            'backend': connection.vendor,
+            'kiosks': options['kiosks'],
+            'created': created,
+            'distinct_numbers': distinct,
+            'elapsed_s': elapsed,
+            'tickets_per_sec': created / elapsed if elapsed else 0.0,
+            'integrity_errors': sum(integrity_errors),
+        }
+        for label, window in (('first_10pct', ordered[:tenth]), ('last_10pct', ordered[-tenth:])):
+            for key, value in latency_summary(window).items():
+                results[f'{label}_{key}'] = value
+        write_report(self.stdout, 'create_ticket', results, as_json=options['json'])
+
+        if not options['keep']:
+            region.delete()
@@ -0,0 +1,17 @@
+"""
+Rebuild the Redis live queue index from the database.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.queue.services import live_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the live queue index (WAITING tickets, active counters and status counts) from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--office', type=int, action='append', help='Only rebuild this office (repeatable)')
+
+    def handle(self, *args, **options):
+        offices = live_index.rebuild(options['office'])
+        self.stdout.write(f'Rebuilt live index for {offices} offices')
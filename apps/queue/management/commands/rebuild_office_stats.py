@@ -0,0 +1,69 @@
+"""
+Rebuild OfficeDailyStats from ticket history.
+
+Only needed once after deploying the running aggregates, or to repair them;
+the service layer keeps them current afterwards. Reads archived tickets from
+ticket history as well as the live table.
+"""
+from collections import defaultdict
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.queue.models import OfficeDailyStats, QueueTicket, TicketHistory
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-office daily wait/service aggregates from tickets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--office', type=int, help='Only rebuild this office')
+
+    def handle(self, *args, **options):
+        tickets = QueueTicket.objects.filter(called_at__isnull=False)
+        history = TicketHistory.objects.filter(called_at__isnull=False)
+        if options['office']:
+            tickets = tickets.filter(office_id=options['office'])
+            history = history.filter(office_id=options['office'])
+
+        totals = defaultdict(lambda: defaultdict(float))
+        fields = ('office_id', 'created_at', 'called_at', 'served_at')
+        rows = chain(
+            tickets.values_list(*fields).iterator(chunk_size=5000),
+            history.values_list(*fields).iterator(chunk_size=5000)
+        )
+        for office_id, created_at, called_at, served_at in rows:
+            wait = (called_at - created_at).total_seconds()
+            day = totals[(office_id, timezone.localdate(called_at))]
+            day['called_count'] += 1
+            day['wait_time_sum'] += wait
+            day['wait_time_sq_sum'] += wait * wait
+            if served_at:
+                service = (served_at - called_at).total_seconds()
+                day = totals[(office_id, timezone.localdate(served_at))]
+                day['served_count'] += 1
+                day['service_time_sum'] += service
+                day['service_time_sq_sum'] += service * service
+
+        with transaction.atomic():
+            existing = OfficeDailyStats.objects.all()
+            if options['office']:
+                existing = existing.filter(office_id=options['office'])
+            existing.delete()
+            OfficeDailyStats.objects.bulk_create([
+                OfficeDailyStats(
+                    office_id=office_id,
+                    date=date,
+                    called_count=int(values['called_count']),
+                    served_count=int(values['served_count']),
+                    **{
+                        key: value for key, value in values.items()
+                        if key not in ('called_count', 'served_count')
+                    }
+                )
+                for (office_id, date), values in totals.items()
+            ], batch_size=1000)
+
+        self.stdout.write(f'Rebuilt {len(totals)} office-day rows')
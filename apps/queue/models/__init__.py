@@ -3,5 +3,9 @@ from .office import Office
 from .counter import Counter
 from .officer import Officer
 from .queue_ticket import QueueTicket
+from .ticket_sequence import TicketSequence
+from .office_daily_stats import OfficeDailyStats
+from .ticket_history import TicketHistory
+from .office_hourly_rollup import OfficeHourlyRollup
 
-__all__ = ['Region', 'Office', 'Counter', 'Officer', 'QueueTicket']
+__all__ = ['Region', 'Office', 'Counter', 'Officer', 'QueueTicket', 'TicketSequence', 'OfficeDailyStats', 'TicketHistory', 'OfficeHourlyRollup']
@@ -0,0 +1,43 @@
+from django.db import models
+from .office import Office
+from .upsert import upsert_increment
+
+
+class OfficeDailyStats(models.Model):
+    """Running wait/service time aggregates per office per day"""
+    office = models.ForeignKey(Office, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    called_count = models.PositiveIntegerField(default=0)
+    wait_time_sum = models.FloatField(default=0)
+    wait_time_sq_sum = models.FloatField(default=0)
+    served_count = models.PositiveIntegerField(default=0)
+    service_time_sum = models.FloatField(default=0)
+    service_time_sq_sum = models.FloatField(default=0)
+
+    def __str__(self):
+        return f"{self.office_id} {self.date}"
+
+    @classmethod
+    def record_wait(cls, office_id, date, seconds):
+        """Add one called ticket's wait time (created -> called)"""
+        upsert_increment(cls, keys={'office_id': office_id, 'date': date}, increments={
+            'called_count': 1,
+            'wait_time_sum': seconds,
+            'wait_time_sq_sum': seconds * seconds,
+        })
+
+    @classmethod
+    def record_service(cls, office_id, date, seconds):
+        """Add one served ticket's service time (called -> served)"""
+        upsert_increment(cls, keys={'office_id': office_id, 'date': date}, increments={
+            'served_count': 1,
+            'service_time_sum': seconds,
+            'service_time_sq_sum': seconds * seconds,
+        })
+
+    class Meta:
+        db_table = 'queue_office_daily_stats'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['office', 'date'], name='unique_office_daily_stats'),
+        ]
@@ -0,0 +1,52 @@
+from django.db import models
+from .region import Region
+from .office import Office
+
+# Histogram upper bounds (seconds); the last bucket is unbounded
+WAIT_BUCKETS = (60, 120, 300, 600, 900, 1200, 1800, 2700, 3600, 5400, 7200, None)
+SERVICE_BUCKETS = (30, 60, 120, 180, 300, 450, 600, 900, 1200, 1800, 3600, None)
+
+
+def bucket_field_names(prefix, bounds):
+    """Column names of a histogram, e.g. wait_le_60 ... wait_le_inf"""
+    return [f'{prefix}_le_{bound if bound is not None else "inf"}' for bound in bounds]
+
+
+WAIT_BUCKET_FIELDS = bucket_field_names('wait', WAIT_BUCKETS)
+SERVICE_BUCKET_FIELDS = bucket_field_names('service', SERVICE_BUCKETS)
+
+
+class OfficeHourlyRollup(models.Model):
+    """Ticket activity per office per hour, rebuilt from tickets by the rollup_hourly command.
+
+    Tickets count towards the hour of each event: created in the hour of
+    created_at, called (with its wait) in the hour of called_at and served
+    (with its service time) in the hour of served_at. Histogram buckets are
+    one integer column each so range queries sum them in SQL.
+    """
+    office = models.ForeignKey(Office, on_delete=models.CASCADE, related_name='hourly_rollups', db_index=False)
+    region = models.ForeignKey(Region, on_delete=models.CASCADE, related_name='hourly_rollups', db_index=False)
+    hour = models.DateTimeField()
+    created_count = models.PositiveIntegerField(default=0)
+    called_count = models.PositiveIntegerField(default=0)
+    served_count = models.PositiveIntegerField(default=0)
+    wait_time_sum = models.FloatField(default=0)
+    service_time_sum = models.FloatField(default=0)
+    max_waiting = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.office_id} {self.hour:%Y-%m-%d %H:00}"
+
+    class Meta:
+        db_table = 'queue_office_hourly_rollup'
+        ordering = ['hour']
+        constraints = [
+            models.UniqueConstraint(fields=['office', 'hour'], name='unique_office_hourly_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['region', 'hour']),
+        ]
+
+
+for _name in WAIT_BUCKET_FIELDS + SERVICE_BUCKET_FIELDS:
+    OfficeHourlyRollup.add_to_class(_name, models.PositiveIntegerField(default=0))
@@ -3,6 +3,7 @@ from django.utils import timezone
 from .region import Region
 from .office import Office
 from .counter import Counter
+from .ticket_sequence import TicketSequence
 
 
 class QueueTicket(models.Model):
@@ -21,33 +22,21 @@ class QueueTicket(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     called_at = models.DateTimeField(null=True, blank=True)
     served_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.ticket_number} - {self.status}"
 
-    def _get_last_ticket_number(self):
-        """Get last ticket number for today"""
-        from datetime import datetime
-        return QueueTicket.objects.filter(
-            office=self.office,
-            created_at__date=datetime.now().date()
-        ).order_by('-id').first()
-    
-    def _get_next_sequence_number(self, last_ticket):
-        """Get next sequence number"""
-        if last_ticket:
-            last_num = int(last_ticket.ticket_number.split('-')[-1])
-            return str(last_num + 1).zfill(4)
-        return '0001'
+    @staticmethod
+    def format_ticket_number(office_id, date, sequence):
+        """Format ticket number as OFFICE-YYYYMMDD-XXXX"""
+        return f"{str(office_id).zfill(3)}-{date.strftime('%Y%m%d')}-{str(sequence).zfill(4)}"
     
     def generate_ticket_number(self):
-        """Generate unique ticket number in format: OFFICE-YYYYMMDD-XXXX"""
-        from datetime import datetime
-        office_code = str(self.office.id).zfill(3)
-        date_str = datetime.now().strftime('%Y%m%d')
-        last_ticket = self._get_last_ticket_number()
-        new_num = self._get_next_sequence_number(last_ticket)
-        return f"{office_code}-{date_str}-{new_num}"
+        """Generate unique ticket number from the office's daily sequence"""
+        today = timezone.localdate()
+        sequence = TicketSequence.allocate(self.office_id, today)
+        return self.format_ticket_number(self.office_id, today, sequence)
 
     def save(self, *args, **kwargs):
         if not self.ticket_number:
@@ -60,4 +49,9 @@ class QueueTicket(models.Model):
         indexes = [
             models.Index(fields=['office', 'status', 'created_at']),
             models.Index(fields=['status']),
+            models.Index(fields=['office', '-updated_at']),
+            # Hourly rollups select tickets by event time
+            models.Index(fields=['created_at']),
+            models.Index(fields=['called_at']),
+            models.Index(fields=['served_at']),
         ]
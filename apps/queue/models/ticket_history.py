@@ -0,0 +1,32 @@
+from django.db import models
+from .region import Region
+from .office import Office
+from .counter import Counter
+
+
+class TicketHistory(models.Model):
+    """Compact copy of a SERVED ticket archived out of queue_ticket"""
+    ticket_id = models.BigIntegerField(primary_key=True)
+    ticket_number = models.CharField(max_length=50)
+    region = models.ForeignKey(Region, on_delete=models.CASCADE, related_name='+', db_index=False)
+    office = models.ForeignKey(Office, on_delete=models.CASCADE, related_name='ticket_history', db_index=False)
+    counter = models.ForeignKey(
+        Counter, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', db_index=False
+    )
+    created_at = models.DateTimeField()
+    called_at = models.DateTimeField(null=True, blank=True)
+    served_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.ticket_number
+
+    class Meta:
+        db_table = 'queue_ticket_history'
+        ordering = ['served_at']
+        indexes = [
+            models.Index(fields=['office', 'served_at']),
+            # Hourly rollups select tickets by event time
+            models.Index(fields=['created_at']),
+            models.Index(fields=['called_at']),
+            models.Index(fields=['served_at']),
+        ]
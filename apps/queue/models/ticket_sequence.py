@@ -0,0 +1,28 @@
+from django.db import models
+from .office import Office
+from .upsert import upsert_increment
+
+
+class TicketSequence(models.Model):
+    office = models.ForeignKey(Office, on_delete=models.CASCADE, related_name='ticket_sequences')
+    date = models.DateField()
+    last_value = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.office_id} {self.date}: {self.last_value}"
+
+    @classmethod
+    def allocate(cls, office_id, date, count=1):
+        """Reserve count consecutive numbers for office/date in one round trip, return the last one"""
+        return upsert_increment(
+            cls,
+            keys={'office_id': office_id, 'date': date},
+            increments={'last_value': count},
+            returning='last_value'
+        )
+
+    class Meta:
+        db_table = 'queue_ticket_sequence'
+        constraints = [
+            models.UniqueConstraint(fields=['office', 'date'], name='unique_ticket_sequence_office_date'),
+        ]
@@ -0,0 +1,57 @@
+from django.db import connection, transaction
+from django.db.models import F
+
+
+def supports_upsert_returning():
+    """INSERT ... ON CONFLICT ... RETURNING is available on PostgreSQL and SQLite 3.35+"""
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35, 0)
+    return False
+
+
+def _upsert_returning(model, keys, increments, returning):
+    """Insert or add to the row identified by keys in a single statement"""
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = {model._meta.get_field(name).column: value for name, value in {**keys, **increments}.items()}
+    # Raw INSERT skips Python-side defaults, so fill in the remaining columns
+    for field in model._meta.concrete_fields:
+        if field.column not in columns and not field.primary_key and field.has_default():
+            columns[field.column] = field.get_db_prep_save(field.get_default(), connection)
+    key_columns = [model._meta.get_field(name).column for name in keys]
+    increment_columns = [model._meta.get_field(name).column for name in increments]
+    assignments = ', '.join(
+        f'{quote(column)} = {table}.{quote(column)} + excluded.{quote(column)}'
+        for column in increment_columns
+    )
+    sql = (
+        f"INSERT INTO {table} ({', '.join(quote(c) for c in columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT ({', '.join(quote(c) for c in key_columns)}) DO UPDATE SET {assignments}"
+    )
+    if returning:
+        sql += f" RETURNING {quote(model._meta.get_field(returning).column)}"
+    with connection.cursor() as cursor:
+        cursor.execute(sql, list(columns.values()))
+        return cursor.fetchone()[0] if returning else None
+
+
+def _upsert_locked(model, keys, increments, returning):
+    """Fallback for backends without upsert-returning: lock the row and bump it"""
+    with transaction.atomic():
+        row, _ = model.objects.select_for_update().get_or_create(**keys)
+        model.objects.filter(pk=row.pk).update(**{
+            name: F(name) + value for name, value in increments.items()
+        })
+        if returning:
+            return getattr(row, returning) + increments[returning]
+    return None
+
+
+def upsert_increment(model, keys, increments, returning=None):
+    """Add increments to the row matching keys (creating it), optionally returning one field"""
+    if supports_upsert_returning():
+        return _upsert_returning(model, keys, increments, returning)
+    return _upsert_locked(model, keys, increments, returning)
@@ -1 +1,52 @@
 # Selectors module
+from .selectors import (
+    get_next_waiting_ticket,
+    aget_next_waiting_ticket,
+    get_next_waiting_ticket_for_update,
+    get_office_queue_stats,
+    get_queue_depths,
+    get_region_queue_stats,
+    get_region_counter_activity,
+    get_active_counters,
+    get_idle_counters,
+    get_open_counter_ids,
+    get_ticket_by_id,
+    aget_ticket_by_id,
+    get_office_tickets,
+    get_recent_office_activity,
+    get_office_snapshot,
+    get_region_snapshot,
+    get_counter_snapshot,
+    get_office_service_stats,
+    get_region_service_stats,
+    calculate_average_service_time,
+)
+from .analytics import (
+    get_office_analytics,
+    get_region_analytics,
+)
+
+__all__ = [
+    'get_next_waiting_ticket',
+    'aget_next_waiting_ticket',
+    'get_next_waiting_ticket_for_update',
+    'get_office_queue_stats',
+    'get_queue_depths',
+    'get_region_queue_stats',
+    'get_region_counter_activity',
+    'get_active_counters',
+    'get_idle_counters',
+    'get_open_counter_ids',
+    'get_ticket_by_id',
+    'aget_ticket_by_id',
+    'get_office_tickets',
+    'get_recent_office_activity',
+    'get_office_snapshot',
+    'get_region_snapshot',
+    'get_counter_snapshot',
+    'get_office_service_stats',
+    'get_region_service_stats',
+    'calculate_average_service_time',
+    'get_office_analytics',
+    'get_region_analytics',
+]
@@ -0,0 +1,156 @@
+"""
+Office and region analytics read from the hourly rollups.
+
+Every figure comes from summing OfficeHourlyRollup columns in SQL: one
+aggregate query for the totals and histograms, one query grouped by hour for
+the time series (and one grouped by office for a region's breakdown),
+however long the range. Percentiles are estimated from the histogram
+buckets by linear interpolation within the bucket that holds them. A
+region's queue peak is the highest sum of its offices' hourly peaks, an
+upper bound when offices peak at different minutes of the hour.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Max, Sum
+from django.utils import timezone
+from apps.queue.models import OfficeHourlyRollup
+from apps.queue.models.office_hourly_rollup import (
+    WAIT_BUCKETS,
+    SERVICE_BUCKETS,
+    WAIT_BUCKET_FIELDS,
+    SERVICE_BUCKET_FIELDS,
+)
+
+PERCENTILES = (50, 90, 95)
+TOTAL_FIELDS = ('created_count', 'called_count', 'served_count', 'wait_time_sum', 'service_time_sum')
+INTERVALS = ('hour', 'day')
+
+
+def _date_range(start_date, end_date):
+    """Aware datetimes covering whole days start_date..end_date"""
+    start = timezone.make_aware(datetime.combine(start_date, time.min))
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+    return start, end
+
+
+def _elapsed_hours(start, end):
+    """Hours of [start, end) that have already passed, so a range running into the future is not diluted"""
+    elapsed = min(end, timezone.now()) - start
+    return max(elapsed / timedelta(hours=1), 0)
+
+
+def _summary_annotations():
+    fields = TOTAL_FIELDS + tuple(WAIT_BUCKET_FIELDS) + tuple(SERVICE_BUCKET_FIELDS)
+    annotations = {name: Sum(name) for name in fields}
+    annotations['max_waiting'] = Max('max_waiting')
+    return annotations
+
+
+def estimate_percentile(bounds, counts, pct):
+    """Estimate a percentile (seconds) from histogram bucket counts"""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = total * pct / 100
+    cumulative, lower = 0, 0
+    for bound, count in zip(bounds, counts):
+        if count and cumulative + count >= rank:
+            if bound is None:
+                return float(lower)
+            return lower + (bound - lower) * (rank - cumulative) / count
+        cumulative += count
+        lower = bound if bound is not None else lower
+    return float(lower)
+
+
+def _timing(bounds, fields, row, count_field, sum_field):
+    counts = [row[name] or 0 for name in fields]
+    count = row[count_field] or 0
+    timing = {'average_seconds': row[sum_field] / count if count else None}
+    for pct in PERCENTILES:
+        timing[f'p{pct}_seconds'] = estimate_percentile(bounds, counts, pct)
+    timing['histogram'] = [
+        {'le_seconds': bound, 'count': bucket_count}
+        for bound, bucket_count in zip(bounds, counts)
+    ]
+    return timing
+
+
+def _build_summary(row):
+    return {
+        'created_count': row['created_count'] or 0,
+        'called_count': row['called_count'] or 0,
+        'served_count': row['served_count'] or 0,
+        'peak_waiting': row['max_waiting'] or 0,
+        'wait': _timing(WAIT_BUCKETS, WAIT_BUCKET_FIELDS, row, 'called_count', 'wait_time_sum'),
+        'service': _timing(SERVICE_BUCKETS, SERVICE_BUCKET_FIELDS, row, 'served_count', 'service_time_sum'),
+    }
+
+
+def _period_start(hour, interval, tz):
+    if interval == 'hour':
+        return hour
+    return hour.astimezone(tz).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _series(rollups, interval):
+    """Counts and peak queue per period; a period's peak is its busiest hour summed over offices"""
+    hours = rollups.values('hour').annotate(
+        created=Sum('created_count'),
+        served=Sum('served_count'),
+        waiting=Sum('max_waiting')
+    ).order_by('hour')
+    tz = timezone.get_current_timezone()
+    periods = {}
+    for row in hours:
+        period = periods.setdefault(_period_start(row['hour'], interval, tz), {
+            'created_count': 0,
+            'served_count': 0,
+            'peak_waiting': 0,
+        })
+        period['created_count'] += row['created']
+        period['served_count'] += row['served']
+        period['peak_waiting'] = max(period['peak_waiting'], row['waiting'])
+    return [{'period': period.isoformat(), **values} for period, values in periods.items()]
+
+
+def _analytics(rollups, start_date, end_date, interval):
+    start, end = _date_range(start_date, end_date)
+    rollups = rollups.filter(hour__gte=start, hour__lt=end).order_by()
+    summary = _build_summary(rollups.aggregate(**_summary_annotations()))
+    series = _series(rollups, interval)
+    summary['peak_waiting'] = max((item['peak_waiting'] for item in series), default=0)
+    hours = _elapsed_hours(start, end)
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'interval': interval,
+        **summary,
+        'served_per_hour': summary['served_count'] / hours if hours else 0.0,
+        'peak_served_per_period': max((item['served_count'] for item in series), default=0),
+        'series': series,
+    }
+
+
+def get_office_analytics(office_id, start_date, end_date, interval='day'):
+    """Ticket counts, wait/service percentiles, throughput and peak queue for office over whole days"""
+    return {
+        'office_id': office_id,
+        **_analytics(OfficeHourlyRollup.objects.filter(office_id=office_id), start_date, end_date, interval)
+    }
+
+
+def get_region_analytics(region_id, start_date, end_date, interval='day'):
+    """Region-wide get_office_analytics plus a per-office breakdown"""
+    rollups = OfficeHourlyRollup.objects.filter(region_id=region_id)
+    analytics = {'region_id': region_id, **_analytics(rollups, start_date, end_date, interval)}
+    
+    start, end = _date_range(start_date, end_date)
+    per_office = rollups.filter(hour__gte=start, hour__lt=end).values('office_id').annotate(
+        **_summary_annotations()
+    ).order_by('office_id')
+    analytics['offices'] = [
+        {'office_id': row['office_id'], **_build_summary(row)}
+        for row in per_office
+    ]
+    return analytics
@@ -1,7 +1,8 @@
-from django.db.models import Count, Q, Avg
+import math
+from django.db.models import Count, Exists, OuterRef, Q, Avg, Sum
 from datetime import timedelta
 from django.utils import timezone
-from apps.queue.models import QueueTicket, Counter
+from apps.queue.models import QueueTicket, Counter, OfficeDailyStats
 
 
 def get_next_waiting_ticket(office_id):
@@ -12,6 +13,22 @@ def get_next_waiting_ticket(office_id):
     ).order_by('created_at').first()
 
 
+async def aget_next_waiting_ticket(office_id):
+    """Async get_next_waiting_ticket"""
+    return await QueueTicket.objects.filter(
+        office_id=office_id,
+        status='WAITING'
+    ).order_by('created_at').afirst()
+
+
+def get_next_waiting_ticket_for_update(office_id):
+    """Lock oldest WAITING ticket not already locked by another transaction"""
+    return QueueTicket.objects.filter(
+        office_id=office_id,
+        status='WAITING'
+    ).order_by('created_at').select_for_update(skip_locked=True).first()
+
+
 def get_office_queue_stats(office_id):
     """Count tickets by status for an office"""
     return QueueTicket.objects.filter(
@@ -21,6 +38,15 @@ def get_office_queue_stats(office_id):
     )
 
 
+def get_queue_depths():
+    """Count active (WAITING/CALLED/SERVING) tickets by office and status"""
+    return QueueTicket.objects.filter(
+        status__in=['WAITING', 'CALLED', 'SERVING']
+    ).values('office_id', 'status').annotate(
+        count=Count('id')
+    ).order_by()
+
+
 def get_active_counters(office_id):
     """Get counters with active tickets (CALLED or SERVING)"""
     return Counter.objects.filter(
@@ -44,6 +70,39 @@ def get_idle_counters(office_id):
     ).exclude(id__in=active_counter_ids)
 
 
+def get_open_counter_ids(office_id):
+    """Ids of office's counters that are open (is_active), busy or not"""
+    return Counter.objects.filter(
+        office_id=office_id,
+        is_active=True
+    ).values_list('id', flat=True)
+
+
+def get_region_queue_stats(region_id):
+    """Count tickets by office and status across a region"""
+    return QueueTicket.objects.filter(
+        region_id=region_id
+    ).values('office_id', 'status').annotate(
+        count=Count('id')
+    ).order_by()
+
+
+def get_region_counter_activity(region_id):
+    """(office_id, counter_id, busy) for every active counter in region, busy = has a CALLED/SERVING ticket"""
+    busy_counter_ids = QueueTicket.objects.filter(
+        region_id=region_id,
+        status__in=['CALLED', 'SERVING'],
+        counter__isnull=False
+    ).values('counter_id')
+    
+    return Counter.objects.filter(
+        office__region_id=region_id,
+        is_active=True
+    ).annotate(
+        busy=Exists(busy_counter_ids.filter(counter_id=OuterRef('id')))
+    ).values_list('office_id', 'id', 'busy')
+
+
 def get_ticket_by_id(ticket_id):
     """Get ticket with related objects"""
     return QueueTicket.objects.select_related(
@@ -51,6 +110,13 @@ def get_ticket_by_id(ticket_id):
     ).get(id=ticket_id)
 
 
+async def aget_ticket_by_id(ticket_id):
+    """Async get_ticket_by_id"""
+    return await QueueTicket.objects.select_related(
+        'region', 'office', 'counter'
+    ).aget(id=ticket_id)
+
+
 def get_office_tickets(office_id, status=None):
     """Filter tickets by office and status"""
     queryset = QueueTicket.objects.filter(office_id=office_id)
@@ -59,32 +125,138 @@ def get_office_tickets(office_id, status=None):
     return queryset.order_by('created_at')
 
 
-def _get_served_tickets(office_id):
-    """Get served tickets with timing data"""
+def get_recent_office_activity(office_id, limit=10):
+    """Get office tickets with the most recent state changes, newest first"""
     return QueueTicket.objects.filter(
+        office_id=office_id
+    ).select_related('counter').only(
+        'ticket_number', 'status', 'updated_at', 'counter__name'
+    ).order_by('-updated_at')[:limit]
+
+
+def get_office_snapshot(office_id):
+    """Live queue for office: waiting tickets in call order and tickets at counters"""
+    tickets = QueueTicket.objects.filter(
         office_id=office_id,
-        status='SERVED',
-        called_at__isnull=False,
-        served_at__isnull=False
+        status__in=['WAITING', 'CALLED', 'SERVING']
+    ).order_by('created_at').values('id', 'ticket_number', 'status', 'counter_id')
+    
+    waiting, active = [], []
+    for ticket in tickets:
+        if ticket['status'] == 'WAITING':
+            waiting.append({'ticket_id': ticket['id'], 'ticket_number': ticket['ticket_number']})
+        else:
+            active.append({
+                'ticket_id': ticket['id'],
+                'ticket_number': ticket['ticket_number'],
+                'status': ticket['status'],
+                'counter_id': ticket['counter_id']
+            })
+    return {'office_id': office_id, 'waiting': waiting, 'active': active}
+
+
+def get_region_snapshot(region_id):
+    """Live ticket counts by status for every office in region"""
+    rows = QueueTicket.objects.filter(
+        region_id=region_id,
+        status__in=['WAITING', 'CALLED', 'SERVING']
+    ).values('office_id', 'status').annotate(count=Count('id'))
+    
+    offices = {}
+    for row in rows:
+        counts = offices.setdefault(row['office_id'], {'WAITING': 0, 'CALLED': 0, 'SERVING': 0})
+        counts[row['status']] = row['count']
+    return {
+        'region_id': region_id,
+        'offices': [
+            {'office_id': office_id, 'status_counts': counts}
+            for office_id, counts in sorted(offices.items())
+        ]
+    }
+
+
+def get_counter_snapshot(counter_id):
+    """Ticket currently CALLED or SERVING at counter, if any"""
+    ticket = QueueTicket.objects.filter(
+        counter_id=counter_id,
+        status__in=['CALLED', 'SERVING']
+    ).order_by('-called_at').values('id', 'ticket_number', 'status').first()
+    
+    return {
+        'counter_id': counter_id,
+        'ticket': {
+            'ticket_id': ticket['id'],
+            'ticket_number': ticket['ticket_number'],
+            'status': ticket['status']
+        } if ticket else None
+    }
+
+
+def _get_daily_stats(office_id, start_date=None, end_date=None):
+    """Get office daily stats rows within an optional date window"""
+    return _within_window(OfficeDailyStats.objects.filter(office_id=office_id), start_date, end_date)
+
+
+def _within_window(queryset, start_date=None, end_date=None):
+    """Filter daily stats rows to an optional date window"""
+    if start_date:
+        queryset = queryset.filter(date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(date__lte=end_date)
+    return queryset
+
+
+def _mean_and_stddev(count, total, sq_total):
+    """Mean and population standard deviation from running sums"""
+    if not count:
+        return None, None
+    mean = total / count
+    variance = max(sq_total / count - mean * mean, 0.0)
+    return mean, math.sqrt(variance)
+
+
+def _service_totals():
+    fields = (
+        'called_count', 'wait_time_sum', 'wait_time_sq_sum',
+        'served_count', 'service_time_sum', 'service_time_sq_sum',
     )
+    return {name: Sum(name) for name in fields}
 
 
-def _calculate_service_times(served_tickets):
-    """Calculate service times in seconds"""
-    return [
-        (ticket.served_at - ticket.called_at).total_seconds()
-        for ticket in served_tickets
-    ]
+def _service_stats(totals):
+    """Means and standard deviations from summed daily aggregates"""
+    average_wait, wait_stddev = _mean_and_stddev(
+        totals['called_count'], totals['wait_time_sum'], totals['wait_time_sq_sum']
+    )
+    average_service, service_stddev = _mean_and_stddev(
+        totals['served_count'], totals['service_time_sum'], totals['service_time_sq_sum']
+    )
+    return {
+        'called_count': totals['called_count'] or 0,
+        'served_count': totals['served_count'] or 0,
+        'average_wait_seconds': average_wait,
+        'wait_stddev_seconds': wait_stddev,
+        'average_service_seconds': average_service,
+        'service_stddev_seconds': service_stddev,
+    }
+
+
+def get_region_service_stats(region_id, start_date=None, end_date=None):
+    """get_office_service_stats for every office in region, keyed by office id"""
+    queryset = _within_window(OfficeDailyStats.objects.filter(office__region_id=region_id), start_date, end_date)
+    rows = queryset.values('office_id').annotate(**_service_totals()).order_by()
+    return {row['office_id']: _service_stats(row) for row in rows}
 
 
-def calculate_average_service_time(office_id):
-    """Calculate average service time from served tickets"""
-    served_tickets = _get_served_tickets(office_id)
-    if not served_tickets.exists():
+def get_office_service_stats(office_id, start_date=None, end_date=None):
+    """Wait and service time stats for an office from its running daily aggregates"""
+    totals = _get_daily_stats(office_id, start_date, end_date).aggregate(**_service_totals())
+    return _service_stats(totals)
+
+
+def calculate_average_service_time(office_id, start_date=None, end_date=None):
+    """Calculate average service time from the office's running aggregates"""
+    stats = get_office_service_stats(office_id, start_date, end_date)
+    if stats['average_service_seconds'] is None:
         return None
-    
-    service_times = _calculate_service_times(served_tickets)
-    if service_times:
-        avg_seconds = sum(service_times) / len(service_times)
-        return timedelta(seconds=avg_seconds)
-    return None
+    return timedelta(seconds=stats['average_service_seconds'])
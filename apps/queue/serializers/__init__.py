@@ -1 +1,26 @@
 # Serializers module
+from .serializers import (
+    QueueTicketSerializer,
+    QueueTicketCreateSerializer,
+    QueueTicketBulkCreateSerializer,
+    CounterCallNextSerializer,
+    CounterCompleteAndCallNextSerializer,
+    SupervisorDashboardSerializer,
+    RegionDashboardSerializer,
+    TicketEtaSerializer,
+    SupervisorDashboardQuerySerializer,
+    AnalyticsQuerySerializer,
+)
+
+__all__ = [
+    'QueueTicketSerializer',
+    'QueueTicketCreateSerializer',
+    'QueueTicketBulkCreateSerializer',
+    'CounterCallNextSerializer',
+    'CounterCompleteAndCallNextSerializer',
+    'SupervisorDashboardSerializer',
+    'RegionDashboardSerializer',
+    'TicketEtaSerializer',
+    'SupervisorDashboardQuerySerializer',
+    'AnalyticsQuerySerializer',
+]
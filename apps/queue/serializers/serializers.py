@@ -24,11 +24,11 @@ class QueueTicketCreateSerializer(serializers.Serializer):
     office_id = serializers.IntegerField()
 
     def validate(self, attrs):
-        """Validate region and office exist and match"""
+        """Validate region and office exist and match, keeping the office (with its region) as attrs['office']"""
         from apps.queue.models import Region, Office
         
         try:
-            office = Office.objects.get(id=attrs['office_id'])
+            office = Office.objects.select_related('region').get(id=attrs['office_id'])
             if office.region_id != attrs['region_id']:
                 raise serializers.ValidationError(
                     "Office does not belong to the specified region"
@@ -36,15 +36,52 @@ class QueueTicketCreateSerializer(serializers.Serializer):
         except Office.DoesNotExist:
             raise serializers.ValidationError("Office not found")
         
+        attrs['office'] = office
         return attrs
 
 
+class QueueTicketBulkItemSerializer(serializers.Serializer):
+    """One ticket in a bulk create request (validated by the parent)"""
+    region_id = serializers.IntegerField()
+    office_id = serializers.IntegerField()
+
+
+class QueueTicketBulkCreateSerializer(serializers.Serializer):
+    """For batch ticket creation from kiosks syncing offline tickets or pre-booking imports"""
+    MAX_TICKETS = 1000
+
+    tickets = QueueTicketBulkItemSerializer(many=True, allow_empty=False, max_length=MAX_TICKETS)
+
+    def validate_tickets(self, tickets):
+        """Validate every office exists and belongs to its region, in one query"""
+        from apps.queue.models import Office
+
+        office_regions = dict(
+            Office.objects.filter(
+                id__in={ticket['office_id'] for ticket in tickets}
+            ).values_list('id', 'region_id')
+        )
+        for ticket in tickets:
+            if ticket['office_id'] not in office_regions:
+                raise serializers.ValidationError(f"Office {ticket['office_id']} not found")
+            if office_regions[ticket['office_id']] != ticket['region_id']:
+                raise serializers.ValidationError(
+                    f"Office {ticket['office_id']} does not belong to region {ticket['region_id']}"
+                )
+        return tickets
+
+
 class CounterCallNextSerializer(serializers.Serializer):
     """Response for call-next action"""
     ticket = QueueTicketSerializer(read_only=True)
     message = serializers.CharField(read_only=True)
 
 
+class CounterCompleteAndCallNextSerializer(serializers.Serializer):
+    """Request for the complete-and-call-next counter action"""
+    ticket_id = serializers.IntegerField(help_text='SERVING ticket to complete')
+
+
 class SupervisorDashboardSerializer(serializers.Serializer):
     """Office stats aggregation"""
     waiting_count = serializers.IntegerField()
@@ -54,4 +91,76 @@ class SupervisorDashboardSerializer(serializers.Serializer):
     active_counters = serializers.IntegerField()
     idle_counters = serializers.IntegerField()
     average_service_time_seconds = serializers.FloatField(allow_null=True)
+    average_wait_time_seconds = serializers.FloatField(allow_null=True)
     activity_feed = serializers.ListField()
+
+
+class OfficeStatusSerializer(serializers.Serializer):
+    """One office's row on the region dashboard"""
+    office_id = serializers.IntegerField()
+    office_name = serializers.CharField()
+    waiting_count = serializers.IntegerField()
+    called_count = serializers.IntegerField()
+    serving_count = serializers.IntegerField()
+    served_count = serializers.IntegerField()
+    active_counters = serializers.IntegerField()
+    idle_counters = serializers.IntegerField()
+    average_service_time_seconds = serializers.FloatField(allow_null=True)
+    average_wait_time_seconds = serializers.FloatField(allow_null=True)
+
+
+class RegionDashboardSerializer(serializers.Serializer):
+    """Region totals with per-office stats"""
+    region_id = serializers.IntegerField()
+    waiting_count = serializers.IntegerField()
+    called_count = serializers.IntegerField()
+    serving_count = serializers.IntegerField()
+    served_count = serializers.IntegerField()
+    active_counters = serializers.IntegerField()
+    idle_counters = serializers.IntegerField()
+    average_service_time_seconds = serializers.FloatField(allow_null=True)
+    average_wait_time_seconds = serializers.FloatField(allow_null=True)
+    offices = OfficeStatusSerializer(many=True)
+
+
+class TicketEtaSerializer(serializers.Serializer):
+    """Ticket's place in the queue and projected wait (nulls once it is called)"""
+    ticket_id = serializers.IntegerField()
+    office_id = serializers.IntegerField()
+    status = serializers.CharField()
+    position = serializers.IntegerField(allow_null=True)
+    waiting_count = serializers.IntegerField(allow_null=True)
+    active_counters = serializers.IntegerField(allow_null=True)
+    average_service_seconds = serializers.FloatField(allow_null=True)
+    estimated_wait_seconds = serializers.FloatField(allow_null=True)
+
+
+class SupervisorDashboardQuerySerializer(serializers.Serializer):
+    """Optional date window for dashboard timing stats"""
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        """Validate window is not reversed"""
+        start_date = attrs.get('start_date')
+        end_date = attrs.get('end_date')
+        if start_date and end_date and start_date > end_date:
+            raise serializers.ValidationError("start_date must be on or before end_date")
+        return attrs
+
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    """Whole-day range and series interval for rollup analytics"""
+    MAX_DAYS = 366
+
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    interval = serializers.ChoiceField(choices=['hour', 'day'], default='day')
+
+    def validate(self, attrs):
+        """Validate range is ordered and at most MAX_DAYS long"""
+        if attrs['start_date'] > attrs['end_date']:
+            raise serializers.ValidationError("start_date must be on or before end_date")
+        if (attrs['end_date'] - attrs['start_date']).days >= self.MAX_DAYS:
+            raise serializers.ValidationError(f"Range must not exceed {self.MAX_DAYS} days")
+        return attrs
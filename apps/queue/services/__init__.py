@@ -1 +1,110 @@
 # Services module
+from .services import (
+    broadcast_websocket_event,
+    broadcast_to_office,
+    broadcast_to_region,
+    broadcast_to_counter,
+    broadcast_to_groups,
+    prepare_ticket_data,
+    prepare_created_ticket_data,
+    create_ticket,
+    create_tickets_bulk,
+    claim_next_ticket,
+    call_next_ticket,
+    start_service,
+    recall_ticket,
+    complete_service,
+    complete_and_call_next,
+    get_supervisor_dashboard_data,
+    get_region_dashboard_data,
+)
+from .transitions import InvalidTransition, TicketNotAtCounter, transition_ticket
+from .dashboard_cache import (
+    get_dashboard_version,
+    invalidate_dashboard,
+    dashboard_etag,
+    get_cached_dashboard,
+    get_dashboard_versions,
+    region_dashboard_digest,
+    region_dashboard_etag,
+    get_cached_region_dashboard,
+)
+from .idempotency import (
+    IdempotencyConflict,
+    MAX_IDEMPOTENCY_KEY_LENGTH,
+    reserve_idempotency_key,
+    store_idempotent_response,
+    release_idempotency_key,
+)
+from .async_services import (
+    acreate_ticket,
+    aclaim_next_ticket,
+    acall_next_ticket,
+    astart_service,
+    acomplete_service,
+)
+from .archive import (
+    archive_cutoff,
+    archive_served_batch,
+    archive_served_tickets,
+)
+from .wait_estimates import (
+    estimate_office,
+    estimate_ticket,
+    get_ticket_eta,
+)
+from .rollups import (
+    compute_rollups,
+    rollup_range,
+    rollup_pending,
+)
+
+__all__ = [
+    'broadcast_websocket_event',
+    'broadcast_to_office',
+    'broadcast_to_region',
+    'broadcast_to_counter',
+    'broadcast_to_groups',
+    'prepare_ticket_data',
+    'prepare_created_ticket_data',
+    'create_ticket',
+    'create_tickets_bulk',
+    'claim_next_ticket',
+    'call_next_ticket',
+    'start_service',
+    'recall_ticket',
+    'complete_service',
+    'complete_and_call_next',
+    'get_supervisor_dashboard_data',
+    'get_region_dashboard_data',
+    'InvalidTransition',
+    'TicketNotAtCounter',
+    'transition_ticket',
+    'get_dashboard_version',
+    'invalidate_dashboard',
+    'dashboard_etag',
+    'get_cached_dashboard',
+    'get_dashboard_versions',
+    'region_dashboard_digest',
+    'region_dashboard_etag',
+    'get_cached_region_dashboard',
+    'IdempotencyConflict',
+    'MAX_IDEMPOTENCY_KEY_LENGTH',
+    'reserve_idempotency_key',
+    'store_idempotent_response',
+    'release_idempotency_key',
+    'acreate_ticket',
+    'aclaim_next_ticket',
+    'acall_next_ticket',
+    'astart_service',
+    'acomplete_service',
+    'archive_cutoff',
+    'archive_served_batch',
+    'archive_served_tickets',
+    'estimate_office',
+    'estimate_ticket',
+    'get_ticket_eta',
+    'compute_rollups',
+    'rollup_range',
+    'rollup_pending',
+]
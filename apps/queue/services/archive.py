@@ -0,0 +1,73 @@
+"""
+Archival of served tickets out of the live ticket table.
+
+Live operations only touch today's WAITING/CALLED/SERVING rows, but every
+SERVED ticket stays in ``queue_ticket`` and its indexes forever. SERVED
+tickets served before a cutoff are copied into the compact TicketHistory
+table and deleted from ``queue_ticket`` one batch per transaction, so the
+live table (and its status indexes) stays the size of the retention window
+and no transaction holds locks for long. Wait/service aggregates live in
+OfficeDailyStats and are unaffected.
+"""
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from apps.queue.models import QueueTicket, TicketHistory
+from apps.queue.services import live_index
+from apps.queue.services.bookkeeping import invalidate_dashboard_on_commit, update_live_index_on_commit
+
+ARCHIVE_FIELDS = ('id', 'ticket_number', 'region_id', 'office_id', 'counter_id', 'created_at', 'called_at', 'served_at')
+HISTORY_FIELDS = ('ticket_id',) + ARCHIVE_FIELDS[1:]
+
+
+def archive_cutoff(days, now=None):
+    """Tickets served before this time are archived when keeping days of history"""
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def get_archivable_tickets(cutoff):
+    """SERVED tickets served before cutoff, oldest ids first"""
+    return QueueTicket.objects.filter(status='SERVED', served_at__lt=cutoff).order_by('id')
+
+
+def archive_served_batch(cutoff, batch_size=5000):
+    """Move up to batch_size SERVED tickets served before cutoff into TicketHistory, return how many moved"""
+    with transaction.atomic():
+        rows = list(get_archivable_tickets(cutoff).values_list(*ARCHIVE_FIELDS)[:batch_size])
+        if not rows:
+            return 0
+        
+        TicketHistory.objects.bulk_create([
+            TicketHistory(**dict(zip(HISTORY_FIELDS, row)))
+            for row in rows
+        ])
+        QueueTicket.objects.filter(id__in=[row[0] for row in rows]).delete()
+        
+        # The dashboard's served count covers the live table only
+        archived = {}
+        for row in rows:
+            archived[row[3]] = archived.get(row[3], 0) + 1
+        for office_id, count in archived.items():
+            update_live_index_on_commit(live_index.forget_served, office_id, count)
+            invalidate_dashboard_on_commit(office_id)
+    return len(rows)
+
+
+def archive_served_tickets(cutoff, batch_size=5000, sleep=0, progress=None):
+    """Archive every SERVED ticket served before cutoff, batch by batch; return how many moved.
+    
+    sleep pauses that many seconds between batches; progress, if given, is
+    called with the running total after each batch that moved tickets.
+    """
+    total = 0
+    while True:
+        moved = archive_served_batch(cutoff, batch_size)
+        total += moved
+        if moved and progress:
+            progress(total)
+        if moved < batch_size:
+            return total
+        if sleep:
+            time.sleep(sleep)
@@ -0,0 +1,125 @@
+"""
+Async versions of the ticket hot path, for the ASGI views.
+
+Every write here is one autocommitted statement through Django's async ORM,
+so the change is durable as soon as it is awaited and its event is sent
+straight away with ``await channel_layer.group_send`` instead of being
+handed to on_commit and the outbox thread. Work that only has a sync API
+(the ticket number upsert, stats rows, the Redis live index, the
+dashboard version and wait estimates) runs as one sync_to_async call per
+request; outside a transaction its on_commit callbacks fire immediately.
+
+Ticket creation allocates the number and inserts the row in two statements,
+so a failed insert leaves a gap in the day's numbering, never a duplicate.
+"""
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from apps.queue.models import QueueTicket, Counter, TicketSequence
+from apps.queue.selectors import aget_next_waiting_ticket, aget_ticket_by_id
+from apps.queue.services import live_index
+from apps.queue.services.bookkeeping import (
+    invalidate_dashboard_on_commit,
+    schedule_claim_bookkeeping,
+    schedule_completion_bookkeeping,
+    schedule_create_bookkeeping,
+    schedule_start_bookkeeping
+)
+from apps.queue.services.events import apublish_many
+from apps.queue.services.transitions import atransition_ticket
+from apps.queue.services.services import (
+    prepare_ticket_data,
+    prepare_created_ticket_data,
+    claim_from_live_index,
+    counter_groups,
+    with_office_estimate
+)
+
+
+def _create_bookkeeping(ticket):
+    schedule_create_bookkeeping(ticket)
+    return prepare_created_ticket_data(ticket)
+
+
+def _claim_bookkeeping(ticket, counter_id):
+    schedule_claim_bookkeeping(ticket, counter_id)
+    invalidate_dashboard_on_commit(ticket.office_id)
+    return with_office_estimate(prepare_ticket_data(ticket), ticket.office_id)
+
+
+def _completion_bookkeeping(ticket):
+    schedule_completion_bookkeeping(ticket)
+    invalidate_dashboard_on_commit(ticket.office_id)
+    return with_office_estimate(prepare_ticket_data(ticket), ticket.office_id)
+
+
+async def acreate_ticket(region_id, office_id):
+    """Async create_ticket"""
+    today = timezone.localdate()
+    sequence = await sync_to_async(TicketSequence.allocate)(office_id, today)
+    ticket = await QueueTicket.objects.acreate(
+        ticket_number=QueueTicket.format_ticket_number(office_id, today, sequence),
+        region_id=region_id,
+        office_id=office_id,
+        status='WAITING'
+    )
+    data = await sync_to_async(_create_bookkeeping)(ticket)
+    
+    await apublish_many([f'office_{office_id}', f'region_{region_id}'], 'TICKET_CREATED', data)
+    
+    return ticket
+
+
+async def aclaim_next_ticket(office_id, counter_id):
+    """Async claim_next_ticket, claiming with a guarded UPDATE (no transaction to hold locks in)"""
+    if live_index.is_enabled():
+        ticket = await sync_to_async(claim_from_live_index)(office_id, counter_id)
+        if ticket:
+            return ticket
+    
+    while True:
+        ticket = await aget_next_waiting_ticket(office_id)
+        if not ticket:
+            return None
+        
+        called_at = timezone.now()
+        claimed = await QueueTicket.objects.filter(
+            id=ticket.id,
+            status='WAITING'
+        ).aupdate(counter_id=counter_id, status='CALLED', called_at=called_at, updated_at=called_at)
+        
+        if claimed:
+            return await aget_ticket_by_id(ticket.id)
+
+
+async def acall_next_ticket(counter_id):
+    """Async call_next_ticket"""
+    counter = await Counter.objects.select_related('office').aget(id=counter_id)
+    ticket = await aclaim_next_ticket(counter.office_id, counter_id)
+    
+    if not ticket:
+        return None
+    
+    data = await sync_to_async(_claim_bookkeeping)(ticket, counter_id)
+    await apublish_many(counter_groups(counter), 'TICKET_CALLED', data)
+    
+    return ticket
+
+
+async def astart_service(ticket_id):
+    """Async start_service"""
+    ticket = await atransition_ticket(ticket_id, 'CALLED', 'SERVING')
+    await sync_to_async(schedule_start_bookkeeping)(ticket)
+    
+    await apublish_many([f'office_{ticket.office_id}'], 'SERVICE_STARTED', prepare_ticket_data(ticket))
+    
+    return ticket
+
+
+async def acomplete_service(ticket_id):
+    """Async complete_service"""
+    ticket = await atransition_ticket(ticket_id, 'SERVING', 'SERVED', served_at=timezone.now())
+    data = await sync_to_async(_completion_bookkeeping)(ticket)
+    
+    await apublish_many([f'office_{ticket.office_id}'], 'SERVICE_COMPLETED', data)
+    
+    return ticket
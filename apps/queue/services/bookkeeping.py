@@ -0,0 +1,96 @@
+"""
+After-commit bookkeeping shared by the sync and async ticket services.
+
+A committed state change also has to reach the office's daily stats, the
+live index, the wait estimates and the dashboard cache. None of that is
+worth holding row locks for or failing the committed request over, so each
+update is registered with on_commit as a robust callback: inside a
+transaction it runs once the transaction commits, in autocommit (the async
+services) it runs straight away, and a failure is logged.
+"""
+from functools import partial, update_wrapper
+
+from django.db import transaction
+from django.utils import timezone
+from apps.queue.models import OfficeDailyStats
+from apps.queue.services.dashboard_cache import invalidate_dashboard
+from apps.queue.services import live_index, wait_estimates
+
+
+def record_wait_time(ticket):
+    """Add called ticket's wait time to its office's daily stats"""
+    wait = ticket.called_at - ticket.created_at
+    OfficeDailyStats.record_wait(
+        ticket.office_id,
+        timezone.localdate(ticket.called_at),
+        wait.total_seconds()
+    )
+
+
+def record_service_time(ticket):
+    """Add served ticket's service time to its office's daily stats"""
+    if not ticket.called_at:
+        return
+    service = ticket.served_at - ticket.called_at
+    OfficeDailyStats.record_service(
+        ticket.office_id,
+        timezone.localdate(ticket.served_at),
+        service.total_seconds()
+    )
+
+
+def on_commit_robust(func, *args):
+    """Run func(*args) after commit; a failure is logged instead of failing the committed request"""
+    # update_wrapper gives the partial the __qualname__ Django's failure log reads
+    transaction.on_commit(update_wrapper(partial(func, *args), func), robust=True)
+
+
+def update_live_index_on_commit(func, *args):
+    """Apply a live index change after commit; index failures never fail the request"""
+    if live_index.is_enabled():
+        on_commit_robust(func, *args)
+
+
+def update_wait_estimates_on_commit(func, *args):
+    """Apply a wait estimate change after commit; cache failures never fail the request"""
+    on_commit_robust(func, *args)
+
+
+def invalidate_dashboard_on_commit(office_id):
+    """Drop cached supervisor dashboards for office once the change is committed"""
+    on_commit_robust(invalidate_dashboard, office_id)
+
+
+def schedule_create_bookkeeping(ticket):
+    """After-commit live index, estimate and dashboard updates for a new WAITING ticket"""
+    update_live_index_on_commit(live_index.add_waiting, ticket.office_id, ticket.id, ticket.created_at)
+    update_wait_estimates_on_commit(wait_estimates.note_issued, ticket.office_id, [ticket.id])
+    invalidate_dashboard_on_commit(ticket.office_id)
+
+
+def schedule_claim_bookkeeping(ticket, counter_id):
+    """After-commit stats, live index and estimate updates for a ticket claimed by counter"""
+    # Stats rows are shared by every counter in the office: update them after
+    # commit so concurrent claims do not queue on the stats row lock
+    on_commit_robust(record_wait_time, ticket)
+    update_live_index_on_commit(live_index.mark_called, ticket.office_id, counter_id, ticket.id)
+    update_wait_estimates_on_commit(wait_estimates.note_called, ticket.office_id)
+
+
+def schedule_start_bookkeeping(ticket):
+    """After-commit live index and dashboard updates for a ticket whose service started"""
+    update_live_index_on_commit(live_index.mark_serving, ticket.office_id, ticket.id)
+    invalidate_dashboard_on_commit(ticket.office_id)
+
+
+def schedule_completion_bookkeeping(ticket, clear_counter=True):
+    """After-commit stats, estimate and live index updates for a SERVED ticket"""
+    on_commit_robust(record_service_time, ticket)
+    if ticket.called_at:
+        service = ticket.served_at - ticket.called_at
+        update_wait_estimates_on_commit(
+            wait_estimates.record_service_time, ticket.office_id, service.total_seconds()
+        )
+    update_live_index_on_commit(
+        live_index.mark_served, ticket.office_id, ticket.id, ticket.counter_id if clear_counter else None
+    )
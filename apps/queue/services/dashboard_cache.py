@@ -0,0 +1,89 @@
+"""
+Event-invalidated cache for the supervisor dashboard.
+
+Each office has a version number in the cache. Services bump it after every
+committed ticket state change; cached dashboards are stored under the version
+they were built for, so a bump makes every older copy unreachable without a
+TTL. The version doubles as the HTTP ETag, letting unchanged polls be answered
+from one cache read. A region dashboard is keyed by a digest of its offices'
+versions, so a change in any office invalidates it.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+
+# Only bounds memory held by superseded versions; freshness comes from the version
+DASHBOARD_CACHE_TIMEOUT = 60 * 60
+
+
+def _version_key(office_id):
+    return f'queue:dashboard:{office_id}:version'
+
+
+def _data_key(office_id, version, start_date, end_date):
+    return f'queue:dashboard:{office_id}:{version}:{start_date or ""}:{end_date or ""}'
+
+
+def get_dashboard_version(office_id):
+    """Current dashboard version for office, starting a new series if none is cached"""
+    version = cache.get(_version_key(office_id))
+    if version is None:
+        # A fresh series starts from the clock so it never reuses an evicted version
+        cache.add(_version_key(office_id), time.time_ns() // 1000, timeout=None)
+        version = cache.get(_version_key(office_id))
+    return version
+
+
+def invalidate_dashboard(office_id):
+    """Bump office dashboard version after a ticket state change"""
+    try:
+        cache.incr(_version_key(office_id))
+    except ValueError:
+        get_dashboard_version(office_id)
+
+
+def dashboard_etag(office_id, version, start_date=None, end_date=None):
+    """Strong ETag for a dashboard version and date window"""
+    return f'"{office_id}-{version}-{start_date or ""}-{end_date or ""}"'
+
+
+def get_cached_dashboard(office_id, version, build, start_date=None, end_date=None):
+    """Return dashboard for version from cache, building and storing it on a miss"""
+    key = _data_key(office_id, version, start_date, end_date)
+    data = cache.get(key)
+    if data is None:
+        data = build(office_id, start_date=start_date, end_date=end_date)
+        cache.set(key, data, timeout=DASHBOARD_CACHE_TIMEOUT)
+    return data
+
+
+def get_dashboard_versions(office_ids):
+    """Current dashboard versions for several offices in one cache round trip"""
+    keys = {_version_key(office_id): office_id for office_id in office_ids}
+    versions = {keys[key]: version for key, version in cache.get_many(list(keys)).items()}
+    for office_id in office_ids:
+        if office_id not in versions:
+            versions[office_id] = get_dashboard_version(office_id)
+    return versions
+
+
+def region_dashboard_digest(versions):
+    """Short digest of office versions identifying one state of a region dashboard"""
+    state = ','.join(f'{office_id}:{version}' for office_id, version in sorted(versions.items()))
+    return hashlib.sha1(state.encode()).hexdigest()[:16]
+
+
+def region_dashboard_etag(region_id, digest, start_date=None, end_date=None):
+    """Strong ETag for a region dashboard state and date window"""
+    return f'"region-{region_id}-{digest}-{start_date or ""}-{end_date or ""}"'
+
+
+def get_cached_region_dashboard(region_id, digest, build, start_date=None, end_date=None):
+    """Return region dashboard for digest from cache, building and storing it on a miss"""
+    key = f'queue:dashboard:region:{region_id}:{digest}:{start_date or ""}:{end_date or ""}'
+    data = cache.get(key)
+    if data is None:
+        data = build(region_id, start_date=start_date, end_date=end_date)
+        cache.set(key, data, timeout=DASHBOARD_CACHE_TIMEOUT)
+    return data
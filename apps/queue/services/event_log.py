@@ -0,0 +1,103 @@
+"""
+Per-group event sequence numbers and a bounded replay log.
+
+Every frame sent to a group gets the next number in that group's sequence
+and is kept in the cache for the last QUEUE_EVENT_LOG_SIZE events. A display
+that reconnects with ``resume_from=<last seq seen>`` is sent the frames it
+missed from the log; if they have already been trimmed it gets a fresh
+snapshot instead. Sequences live in the shared cache, so they are monotonic
+across worker processes; a client that notices a gap can reconnect to fill it.
+
+The dispatcher sequences a whole batch at once: one block of numbers per
+group (a single pipeline on the Redis cache backend), then one set_many for
+the frames and one delete_many for the trimmed entries.
+"""
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.redis import RedisCache
+
+
+def _log_size():
+    return getattr(settings, 'QUEUE_EVENT_LOG_SIZE', 500)
+
+
+def _log_timeout():
+    return getattr(settings, 'QUEUE_EVENT_LOG_TIMEOUT', 60 * 60)
+
+
+def _seq_key(group_name):
+    return f'queue:events:{group_name}:seq'
+
+
+def _frame_key(group_name, seq):
+    return f'queue:events:{group_name}:{seq}'
+
+
+def current_seq(group_name):
+    """Sequence number of the last event sent to group (0 if none)"""
+    return cache.get(_seq_key(group_name), 0)
+
+
+def _redis_client():
+    """Raw client behind Django's Redis cache backend, None for other backends"""
+    backend = caches['default']
+    if isinstance(backend, RedisCache):
+        return backend._cache.get_client(write=True)
+    return None
+
+
+def _incr(key, delta):
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key, delta)
+
+
+def reserve_seqs(counts):
+    """Reserve counts[group] consecutive sequence numbers per group; return the first of each"""
+    groups = list(counts)
+    client = _redis_client()
+    if client is not None:
+        # Cache values are stored as plain integers, so INCRBY works on them
+        # directly and a missing key starts from 0 with no expiry, like add()
+        pipe = client.pipeline(transaction=False)
+        for group_name in groups:
+            pipe.incrby(cache.make_and_validate_key(_seq_key(group_name)), counts[group_name])
+        lasts = pipe.execute()
+    else:
+        lasts = [_incr(_seq_key(group_name), counts[group_name]) for group_name in groups]
+    return {
+        group_name: last - counts[group_name] + 1
+        for group_name, last in zip(groups, lasts)
+    }
+
+
+def append_many(frames):
+    """Store (group, seq, frame) entries and trim each group's log to QUEUE_EVENT_LOG_SIZE"""
+    cache.set_many(
+        {_frame_key(group_name, seq): frame for group_name, seq, frame in frames},
+        timeout=_log_timeout()
+    )
+    trimmed = [
+        _frame_key(group_name, seq - _log_size())
+        for group_name, seq, _ in frames
+        if seq > _log_size()
+    ]
+    if trimmed:
+        cache.delete_many(trimmed)
+
+
+def replay(group_name, after_seq):
+    """(last_seq, frames) sent to group after after_seq, or None if some were already trimmed"""
+    last_seq = current_seq(group_name)
+    if after_seq > last_seq:
+        return None
+    if last_seq - after_seq > _log_size():
+        return None
+    
+    keys = [_frame_key(group_name, seq) for seq in range(after_seq + 1, last_seq + 1)]
+    frames = cache.get_many(keys)
+    if len(frames) != len(keys):
+        return None
+    return last_seq, [frames[key] for key in keys]
@@ -0,0 +1,282 @@
+"""
+Transactional outbox for queue WebSocket events.
+
+Services publish events while their transaction is still open. Nothing is sent
+until the transaction commits: committed events are handed to a background
+dispatcher thread that sends them to the channel layer in batches, so request
+threads never wait on Redis while holding row locks, and rolled-back work never
+reaches the displays.
+"""
+import asyncio
+import atexit
+import json
+import logging
+import threading
+import time
+from collections import deque
+from functools import partial
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from apps.queue.services import event_log, metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def encode_json(value):
+    """Encode value as JSON text, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value)
+
+
+def splice_frame(event_type, data_text, seq=None):
+    """Assemble a client frame around already-encoded data"""
+    if seq is None:
+        return f'{{"type":{encode_json(event_type)},"data":{data_text}}}'
+    return f'{{"type":{encode_json(event_type)},"seq":{seq},"data":{data_text}}}'
+
+
+def encode_frame(event_type, data, seq=None):
+    """Encode the WebSocket frame sent to display clients"""
+    return splice_frame(event_type, encode_json(data), seq)
+
+
+def tag_frame(group_name, text):
+    """Add the group a frame was sent to, for sockets subscribed to several groups"""
+    return f'{{"group":{encode_json(group_name)},{text[1:]}'
+
+
+def build_message(event_type, data, seq=None, text=None, group=None):
+    """Build the channel layer message consumed by queue_event handlers.
+    
+    The client frame is encoded here, once per group, so consumers forward
+    ``text`` as-is instead of re-encoding the same payload for every socket.
+    ``group`` names the group the message is sent to, so multiplexed sockets
+    can filter it before sending.
+    """
+    message = {
+        'type': 'queue_event',
+        'event_type': event_type,
+        'data': data,
+        'text': text if text is not None else encode_frame(event_type, data, seq)
+    }
+    if seq is not None:
+        message['seq'] = seq
+    if group is not None:
+        message['group'] = group
+    return message
+
+
+def sequence_events(events):
+    """Number each (group_names, event_type, data) event per group and log its frame.
+    
+    Data is encoded once per event; only the small frame envelope carrying the
+    group's sequence number is built per group. Sequence numbers and frames
+    are reserved and stored for the whole batch in three cache round trips.
+    """
+    counts = {}
+    for group_names, _, _ in events:
+        for group_name in group_names:
+            counts[group_name] = counts.get(group_name, 0) + 1
+    next_seqs = event_log.reserve_seqs(counts)
+    
+    deliveries, frames = [], []
+    for group_names, event_type, data in events:
+        data_text = encode_json(data)
+        messages = []
+        for group_name in group_names:
+            seq = next_seqs[group_name]
+            next_seqs[group_name] = seq + 1
+            text = splice_frame(event_type, data_text, seq)
+            frames.append((group_name, seq, text))
+            messages.append((group_name, build_message(event_type, data, seq, text, group_name)))
+        deliveries.append(messages)
+    event_log.append_many(frames)
+    return deliveries
+
+
+def unsequenced_events(events):
+    """Messages without sequence numbers, used when the event log is unavailable"""
+    deliveries = []
+    for group_names, event_type, data in events:
+        text = encode_frame(event_type, data)
+        deliveries.append([
+            (group_name, build_message(event_type, data, text=text, group=group_name))
+            for group_name in group_names
+        ])
+    return deliveries
+
+
+def prepare_deliveries(events):
+    """Sequence events for sending, falling back to plain frames if the log fails"""
+    try:
+        return sequence_events(events)
+    except Exception:
+        logger.exception('Event log unavailable, sending %d events without sequence numbers', len(events))
+        return unsequenced_events(events)
+
+
+async def send_batch(deliveries):
+    """Send each event's (group, message) pairs concurrently, keeping event order within each group"""
+    channel_layer = get_channel_layer()
+    for messages in deliveries:
+        await asyncio.gather(*(
+            channel_layer.group_send(group_name, message)
+            for group_name, message in messages
+        ))
+
+
+class EventDispatcher:
+    """Background thread that drains committed events and sends them in batches"""
+
+    def __init__(self, max_batch_size=500):
+        self.max_batch_size = max_batch_size
+        self._pending = deque()
+        self._ready = threading.Condition()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _ensure_started(self):
+        """Start the worker thread on first use (after any server fork)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name='queue-event-dispatcher',
+                    daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, events):
+        """Queue committed events for sending; never blocks on the channel layer"""
+        self._ensure_started()
+        self._put((time.perf_counter(), events))
+
+    def flush(self, timeout=5.0):
+        """Block until everything submitted so far has been sent"""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._put(done)
+        return done.wait(timeout)
+
+    def _put(self, item):
+        with self._ready:
+            self._pending.append(item)
+            self._ready.notify()
+
+    def _drain(self):
+        """Wait for work, then collect everything already queued into one batch"""
+        batch, submitted, markers = [], [], []
+        with self._ready:
+            while not self._pending:
+                self._ready.wait()
+            while self._pending and len(batch) < self.max_batch_size:
+                item = self._pending.popleft()
+                if isinstance(item, threading.Event):
+                    markers.append(item)
+                else:
+                    submitted.append(item[0])
+                    batch.extend(item[1])
+        return batch, submitted, markers
+
+    def _run(self):
+        """Worker loop; keeps one event loop so channel layer connections are reused"""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        while True:
+            batch, submitted, markers = self._drain()
+            if batch:
+                try:
+                    loop.run_until_complete(send_batch(prepare_deliveries(batch)))
+                except Exception:
+                    logger.exception('Failed to send %d queue events', len(batch))
+                else:
+                    record_broadcast(batch, submitted)
+            for marker in markers:
+                marker.set()
+
+
+dispatcher = EventDispatcher()
+atexit.register(dispatcher.flush)
+
+
+def record_broadcast(events, submitted):
+    """Record sent events and the commit-to-send latency of each submitted batch"""
+    sent_at = time.perf_counter()
+    for started in submitted:
+        metrics.observe('queue_broadcast_seconds', sent_at - started)
+    for _, event_type, _ in events:
+        metrics.inc('queue_events_sent_total', event_type=event_type)
+
+
+def _deliver(events):
+    """Hand committed events to the dispatcher, or send inline when async dispatch is off"""
+    if getattr(settings, 'QUEUE_OUTBOX_ASYNC', True):
+        dispatcher.submit(events)
+    else:
+        # The work has committed: a channel layer failure must not fail the request
+        started = time.perf_counter()
+        try:
+            async_to_sync(send_batch)(prepare_deliveries(events))
+        except Exception:
+            logger.exception('Failed to send %d queue events', len(events))
+        else:
+            record_broadcast(events, [started])
+
+
+def _deliver_built(group_names, event_type, build_data):
+    """Build event data now that the transaction has committed, then deliver the event"""
+    try:
+        data = build_data()
+    except Exception:
+        logger.exception('Failed to build %s event data', event_type)
+        return
+    _deliver([(group_names, event_type, data)])
+
+
+def publish_many(group_names, event_type, data):
+    """Publish one event to several groups once the current transaction commits.
+    
+    data may be a callable returning the event data, called after commit, for
+    data that reads caches or other slow stores and should not be gathered
+    while the transaction holds its row locks.
+    """
+    if callable(data):
+        transaction.on_commit(partial(_deliver_built, tuple(group_names), event_type, data))
+        return
+    events = [(tuple(group_names), event_type, data)]
+    transaction.on_commit(partial(_deliver, events))
+
+
+def publish(group_name, event_type, data):
+    """Publish event to group once the current transaction commits"""
+    publish_many([group_name], event_type, data)
+
+
+async def apublish_many(group_names, event_type, data):
+    """Sequence and send one event to several groups from async code, awaiting the channel layer.
+    
+    For async callers whose writes are already committed (autocommit), so there
+    is no transaction to wait for and no reason to hop through the outbox thread.
+    """
+    events = [(tuple(group_names), event_type, data)]
+    # The work has committed: a channel layer failure must not fail the request
+    started = time.perf_counter()
+    try:
+        deliveries = await sync_to_async(prepare_deliveries)(events)
+        await send_batch(deliveries)
+    except Exception:
+        logger.exception('Failed to send %d queue events', len(events))
+    else:
+        record_broadcast(events, [started])
@@ -0,0 +1,60 @@
+"""
+Idempotency keys for kiosk ticket creation.
+
+A kiosk that retries ``POST /api/tickets/`` sends the same ``Idempotency-Key``
+header each time. The first request reserves the key in the shared cache and
+stores its response there once the ticket exists; repeats within
+QUEUE_IDEMPOTENCY_WINDOW seconds get that stored response back without
+touching the database. Entries expire with the window, so the cache stays
+bounded by the number of tickets created per window.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# A reservation outlives a crashed request only this long
+PENDING_TIMEOUT = 30
+
+PENDING = 'pending'
+
+
+class IdempotencyConflict(Exception):
+    """Key is still being processed, or was used for a different request"""
+
+
+def _window():
+    return getattr(settings, 'QUEUE_IDEMPOTENCY_WINDOW', 10 * 60)
+
+
+def _key(idempotency_key):
+    return f'queue:idempotency:{idempotency_key}'
+
+
+def reserve_idempotency_key(idempotency_key, fingerprint):
+    """Reserve key for a new request, or return the stored response of an earlier one.
+
+    Returns None when the caller should go ahead and create the ticket.
+    """
+    if cache.add(_key(idempotency_key), (PENDING, fingerprint, None), timeout=PENDING_TIMEOUT):
+        return None
+    
+    entry = cache.get(_key(idempotency_key))
+    if entry is None:
+        return reserve_idempotency_key(idempotency_key, fingerprint)
+    state, stored_fingerprint, response = entry
+    if stored_fingerprint != fingerprint:
+        raise IdempotencyConflict('Idempotency-Key was already used for a different request')
+    if state == PENDING:
+        raise IdempotencyConflict('A request with this Idempotency-Key is still in progress')
+    return response
+
+
+def store_idempotent_response(idempotency_key, fingerprint, response):
+    """Remember the response for repeats of key within the window"""
+    cache.set(_key(idempotency_key), ('done', fingerprint, response), timeout=_window())
+
+
+def release_idempotency_key(idempotency_key):
+    """Drop a reservation whose request failed, so a retry can try again"""
+    cache.delete(_key(idempotency_key))
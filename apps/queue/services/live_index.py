@@ -0,0 +1,195 @@
+"""
+Optional Redis index of live queue state per office.
+
+When QUEUE_LIVE_INDEX_ENABLED is set, each office has:
+
+* ``queue:live:office:<id>:waiting`` - sorted set of WAITING ticket ids,
+  scored by creation time, so ZPOPMIN hands out the oldest ticket atomically
+* ``queue:live:office:<id>:counters`` - hash of counter id -> active ticket id
+* ``queue:live:office:<id>:called`` and ``:serving`` - sets of CALLED and
+  SERVING ticket ids
+* ``queue:live:office:<id>:served`` - number of SERVED tickets still in the
+  live table (archival takes them off)
+
+The service layer keeps them up to date after commit, so the supervisor
+dashboard reads its counts with one pipeline. The database stays the source
+of truth: a popped id is still claimed with a guarded UPDATE, and the index
+can be rebuilt at any time with ``manage.py rebuild_live_index``.
+"""
+import redis
+from django.conf import settings
+from django.db.models import Count
+from apps.queue.models import QueueTicket
+
+_client = None
+
+
+def is_enabled():
+    return getattr(settings, 'QUEUE_LIVE_INDEX_ENABLED', False)
+
+
+def get_client():
+    """Shared Redis client (thread-safe connection pool)"""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.QUEUE_LIVE_INDEX_URL)
+    return _client
+
+
+def _waiting_key(office_id):
+    return f'queue:live:office:{office_id}:waiting'
+
+
+def _counters_key(office_id):
+    return f'queue:live:office:{office_id}:counters'
+
+
+def _called_key(office_id):
+    return f'queue:live:office:{office_id}:called'
+
+
+def _serving_key(office_id):
+    return f'queue:live:office:{office_id}:serving'
+
+
+def _served_key(office_id):
+    return f'queue:live:office:{office_id}:served'
+
+
+def _office_keys(office_id):
+    return [
+        _waiting_key(office_id), _counters_key(office_id),
+        _called_key(office_id), _serving_key(office_id), _served_key(office_id)
+    ]
+
+
+def add_waiting(office_id, ticket_id, created_at):
+    """Add WAITING ticket in FIFO position"""
+    get_client().zadd(_waiting_key(office_id), {ticket_id: created_at.timestamp()})
+
+
+def add_waiting_many(office_id, tickets):
+    """Add (ticket_id, created_at) pairs in one command"""
+    if tickets:
+        get_client().zadd(_waiting_key(office_id), {
+            ticket_id: created_at.timestamp() for ticket_id, created_at in tickets
+        })
+
+
+def pop_waiting(office_id):
+    """Atomically take the oldest WAITING ticket id, or None if the index is empty"""
+    popped = get_client().zpopmin(_waiting_key(office_id))
+    if not popped:
+        return None
+    member, score = popped[0]
+    return int(member), score
+
+
+def restore_waiting(office_id, ticket_id, score):
+    """Put a popped ticket back (its claim did not go through)"""
+    get_client().zadd(_waiting_key(office_id), {ticket_id: score})
+
+
+def mark_called(office_id, counter_id, ticket_id):
+    """Record ticket as CALLED and active at counter"""
+    pipe = get_client().pipeline(transaction=False)
+    pipe.hset(_counters_key(office_id), counter_id, ticket_id)
+    pipe.sadd(_called_key(office_id), ticket_id)
+    pipe.execute()
+
+
+def mark_serving(office_id, ticket_id):
+    """Move ticket from CALLED to SERVING"""
+    pipe = get_client().pipeline(transaction=False)
+    pipe.srem(_called_key(office_id), ticket_id)
+    pipe.sadd(_serving_key(office_id), ticket_id)
+    pipe.execute()
+
+
+def mark_served(office_id, ticket_id, counter_id=None):
+    """Count ticket as SERVED, freeing counter_id when given"""
+    pipe = get_client().pipeline(transaction=False)
+    pipe.srem(_serving_key(office_id), ticket_id)
+    pipe.incr(_served_key(office_id))
+    if counter_id:
+        pipe.hdel(_counters_key(office_id), counter_id)
+    pipe.execute()
+
+
+def forget_served(office_id, count):
+    """Take archived SERVED tickets off office's served count"""
+    get_client().decrby(_served_key(office_id), count)
+
+
+def waiting_position(office_id, ticket_id):
+    """0-based position of ticket in the office queue, or None if not waiting"""
+    return get_client().zrank(_waiting_key(office_id), ticket_id)
+
+
+def get_live_counts(office_id):
+    """WAITING ticket count and number of counters with an active ticket"""
+    pipe = get_client().pipeline(transaction=False)
+    pipe.zcard(_waiting_key(office_id))
+    pipe.hlen(_counters_key(office_id))
+    waiting_count, active_counters = pipe.execute()
+    return waiting_count, active_counters
+
+
+def get_office_counts(office_id):
+    """({waiting,called,serving,served}_count, ids of counters with an active ticket) in one pipeline"""
+    pipe = get_client().pipeline(transaction=False)
+    pipe.zcard(_waiting_key(office_id))
+    pipe.scard(_called_key(office_id))
+    pipe.scard(_serving_key(office_id))
+    pipe.get(_served_key(office_id))
+    pipe.hkeys(_counters_key(office_id))
+    waiting_count, called_count, serving_count, served_count, busy = pipe.execute()
+    counts = {
+        'waiting_count': waiting_count,
+        'called_count': called_count,
+        'serving_count': serving_count,
+        'served_count': int(served_count or 0),
+    }
+    return counts, {int(counter_id) for counter_id in busy}
+
+
+def rebuild(office_ids=None):
+    """Rebuild the index from the database, for all offices or only office_ids"""
+    tickets = QueueTicket.objects.filter(status__in=['WAITING', 'CALLED', 'SERVING'])
+    served = QueueTicket.objects.filter(status='SERVED')
+    if office_ids:
+        tickets = tickets.filter(office_id__in=office_ids)
+        served = served.filter(office_id__in=office_ids)
+
+    waiting, counters, active = {}, {}, {'CALLED': {}, 'SERVING': {}}
+    rows = tickets.order_by('created_at').values_list('id', 'office_id', 'counter_id', 'status', 'created_at')
+    for ticket_id, office_id, counter_id, status, created_at in rows.iterator(chunk_size=5000):
+        if status == 'WAITING':
+            waiting.setdefault(office_id, {})[ticket_id] = created_at.timestamp()
+            continue
+        active[status].setdefault(office_id, []).append(ticket_id)
+        if counter_id:
+            counters.setdefault(office_id, {})[counter_id] = ticket_id
+    served_counts = dict(served.values('office_id').annotate(count=Count('id')).values_list('office_id', 'count'))
+
+    client = get_client()
+    if office_ids:
+        stale = [key for office_id in office_ids for key in _office_keys(office_id)]
+    else:
+        stale = list(client.scan_iter(match='queue:live:office:*'))
+
+    pipe = client.pipeline(transaction=True)
+    if stale:
+        pipe.delete(*stale)
+    for office_id, members in waiting.items():
+        pipe.zadd(_waiting_key(office_id), members)
+    for office_id, mapping in counters.items():
+        pipe.hset(_counters_key(office_id), mapping=mapping)
+    for office_id, ticket_ids in active['CALLED'].items():
+        pipe.sadd(_called_key(office_id), *ticket_ids)
+    for office_id, ticket_ids in active['SERVING'].items():
+        pipe.sadd(_serving_key(office_id), *ticket_ids)
+    for office_id, count in served_counts.items():
+        pipe.set(_served_key(office_id), count)
+    pipe.execute()
+    return len(set(waiting).union(counters, *active.values(), served_counts))
@@ -0,0 +1,304 @@
+"""
+Prometheus-style metrics for the queue.
+
+Hot-path code records into a registry owned by the current thread, so
+recording never takes a lock or races another thread; a scrape merges the
+thread registries of the process, after folding the registries of threads
+that have exited into one retired registry. With QUEUE_METRICS_URL set, every process
+also publishes its merged snapshot to a Redis hash every
+QUEUE_METRICS_FLUSH_INTERVAL seconds and ``/metrics`` adds up the snapshots
+of all live processes, so any worker can answer a scrape for the whole
+deployment. A process that stops publishing drops out after three intervals
+(its counters then look like a reset to Prometheus).
+"""
+import bisect
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+import redis
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets (seconds)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+METRICS_KEY = 'queue:metrics:processes'
+
+HELP = {
+    'queue_service_calls_total': ('counter', 'Service function calls by outcome'),
+    'queue_service_duration_seconds': ('histogram', 'Service function duration, including commit'),
+    'queue_service_queries_total': ('counter', 'Database queries run by service functions'),
+    'queue_broadcast_seconds': ('histogram', 'Time from commit until an event batch is sent to the channel layer'),
+    'queue_events_sent_total': ('counter', 'Events sent to the channel layer by event type'),
+    'queue_ws_connections_total': ('counter', 'WebSocket connections accepted by consumer class'),
+    'queue_ws_disconnections_total': ('counter', 'WebSocket disconnections by consumer class'),
+    'queue_ws_frames_sent_total': ('counter', 'WebSocket frames written by consumer class'),
+    'queue_ws_frames_received_total': ('counter', 'WebSocket frames received by consumer class'),
+    'queue_ws_open_connections': ('gauge', 'Open display sockets'),
+    'queue_ws_lagging_connections': ('gauge', 'Display sockets at least half a send buffer behind'),
+    'queue_ws_coalesced_total': ('counter', 'Slow display sockets resynced from a snapshot'),
+    'queue_ws_slow_disconnects_total': ('counter', 'Slow display sockets closed'),
+    'queue_ws_dropped_frames_total': ('counter', 'Frames dropped from slow display socket buffers'),
+    'queue_tickets': ('gauge', 'Active tickets per office and status'),
+}
+
+
+class _Registry:
+    """Metrics recorded by one thread"""
+
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+
+
+_local = threading.local()
+# (thread, registry) pairs of live threads; counts of exited threads live on in _retired
+_registries = []
+_retired = _Registry()
+# Taken once per thread, when it records its first metric, and by snapshots
+_registries_lock = threading.Lock()
+_process_gauges = []
+_publisher = None
+
+
+def _registry():
+    registry = getattr(_local, 'registry', None)
+    if registry is None:
+        registry = _local.registry = _Registry()
+        with _registries_lock:
+            _registries.append((threading.current_thread(), registry))
+        _ensure_publisher()
+    return registry
+
+
+def _retire_dead_threads():
+    """Fold registries of exited threads into _retired; call with _registries_lock held"""
+    live = []
+    for thread, registry in _registries:
+        if thread.is_alive():
+            live.append((thread, registry))
+            continue
+        for key, value in registry.counters.items():
+            _retired.counters[key] += value
+        for key, buckets in registry.histograms.items():
+            _add_buckets(_retired.histograms, key, list(buckets))
+    _registries[:] = live
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Add value to a counter"""
+    _registry().counters[_key(name, labels)] += value
+
+
+def observe(name, value, **labels):
+    """Record value in a histogram"""
+    histograms = _registry().histograms
+    key = _key(name, labels)
+    buckets = histograms.get(key)
+    if buckets is None:
+        # One slot per bucket, one for +Inf, then the sum
+        buckets = histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+    buckets[bisect.bisect_left(BUCKETS, value)] += 1
+    buckets[-1] += value
+
+
+def register_process_gauges(collect):
+    """Register collect() -> [(name, labels, value)], read at every snapshot"""
+    _process_gauges.append(collect)
+
+
+def instrumented(func):
+    """Record calls, duration and query count of a service function"""
+    service = func.__name__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        queries = 0
+        
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+        
+        outcome = 'error'
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(count_query):
+                result = func(*args, **kwargs)
+            outcome = 'ok'
+            return result
+        finally:
+            observe('queue_service_duration_seconds', time.perf_counter() - started, service=service)
+            inc('queue_service_calls_total', service=service, outcome=outcome)
+            inc('queue_service_queries_total', queries, service=service)
+    return wrapper
+
+
+def _encode_key(key):
+    name, labels = key
+    return json.dumps([name, labels])
+
+
+def snapshot():
+    """Merged metrics of every thread in this process"""
+    counters, histograms, gauges = defaultdict(float), {}, defaultdict(float)
+    with _registries_lock:
+        _retire_dead_threads()
+        # Copied under the lock, so a registry retired by a concurrent snapshot is not counted twice
+        registries = [_copy(_retired), *(registry for _, registry in _registries)]
+    for registry in registries:
+        # dict()/list() copies are atomic under the GIL, even while the owner writes
+        for key, value in dict(registry.counters).items():
+            counters[_encode_key(key)] += value
+        for key, buckets in dict(registry.histograms).items():
+            _add_buckets(histograms, _encode_key(key), list(buckets))
+    for collect in _process_gauges:
+        for name, labels, value in collect():
+            gauges[_encode_key(_key(name, labels))] += value
+    return {'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+
+def _copy(registry):
+    copy = _Registry()
+    copy.counters.update(registry.counters)
+    copy.histograms = {key: list(buckets) for key, buckets in registry.histograms.items()}
+    return copy
+
+
+def _add_buckets(histograms, key, buckets):
+    total = histograms.get(key)
+    if total is None:
+        histograms[key] = buckets
+    else:
+        histograms[key] = [a + b for a, b in zip(total, buckets)]
+
+
+def _merge(snapshots):
+    merged = {'counters': defaultdict(float), 'histograms': {}, 'gauges': defaultdict(float)}
+    for item in snapshots:
+        for kind in ('counters', 'gauges'):
+            for key, value in item[kind].items():
+                merged[kind][key] += value
+        for key, buckets in item['histograms'].items():
+            _add_buckets(merged['histograms'], key, buckets)
+    return merged
+
+
+def _url():
+    return getattr(settings, 'QUEUE_METRICS_URL', '')
+
+
+def _flush_interval():
+    return getattr(settings, 'QUEUE_METRICS_FLUSH_INTERVAL', 5)
+
+
+def _process_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _client():
+    return redis.Redis.from_url(_url())
+
+
+def publish(client=None):
+    """Store this process's snapshot in the shared hash"""
+    client = client or _client()
+    client.hset(METRICS_KEY, _process_id(), json.dumps({'time': time.time(), 'metrics': snapshot()}))
+
+
+def _publish_loop():
+    client = _client()
+    while True:
+        time.sleep(_flush_interval())
+        try:
+            publish(client)
+        except Exception:
+            logger.exception('Failed to publish queue metrics')
+
+
+def _ensure_publisher():
+    """Start the per-process publisher thread when a shared store is configured"""
+    global _publisher
+    if not _url() or (_publisher is not None and _publisher.is_alive()):
+        return
+    with _registries_lock:
+        if _publisher is None or not _publisher.is_alive():
+            _publisher = threading.Thread(target=_publish_loop, name='queue-metrics-publisher', daemon=True)
+            _publisher.start()
+
+
+def collect():
+    """Metrics of all live processes when a shared store is configured, else of this process"""
+    if not _url():
+        return snapshot()
+    
+    client = _client()
+    publish(client)
+    cutoff = time.time() - 3 * _flush_interval()
+    snapshots, stale = [], []
+    for process_id, raw in client.hgetall(METRICS_KEY).items():
+        item = json.loads(raw)
+        if item['time'] < cutoff:
+            stale.append(process_id)
+        else:
+            snapshots.append(item['metrics'])
+    if stale:
+        client.hdel(METRICS_KEY, *stale)
+    return _merge(snapshots)
+
+
+def _format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    """Sample value as text: whole numbers exactly, others at full float precision"""
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render(metrics, gauges=()):
+    """Prometheus text exposition of collected metrics plus (name, labels, value) gauges"""
+    series = defaultdict(list)
+    for kind in ('counters', 'gauges'):
+        for key, value in metrics[kind].items():
+            name, labels = json.loads(key)
+            series[name].append((labels, value))
+    for name, labels, value in gauges:
+        series[name].append((sorted(labels.items()), value))
+    for key, buckets in metrics['histograms'].items():
+        name, labels = json.loads(key)
+        series[name].append((labels, buckets))
+    
+    lines = []
+    for name in sorted(series):
+        kind, help_text = HELP.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in series[name]:
+            if kind != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip([*BUCKETS, '+Inf'], value[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {_format_value(cumulative)}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(value[-1])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {_format_value(cumulative)}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,186 @@
+"""
+Hourly rollups of ticket activity per office (OfficeHourlyRollup).
+
+rollup_range(start, end) recomputes every office-hour in [start, end) from
+the live ticket table and ticket history and replaces the stored rows, so a
+rerun never double counts. rollup_pending() carries on from the last run: it
+recomputes the latest stored hour (which may have been partial) up to the
+current hour, so running it every few minutes keeps the rollups current.
+
+Tickets with an event in the range are selected by their created_at,
+called_at and served_at, each bounded to [start, end) and indexed, so a
+chunk reads only its own tickets however much activity followed it. Peak
+queue length is swept from the create/call events in order, starting from
+the tickets already waiting when the range starts (one more query); an hour
+with no activity gets no row.
+"""
+import bisect
+from collections import defaultdict
+from datetime import timedelta
+from itertools import chain
+
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+from apps.queue.models import OfficeHourlyRollup, QueueTicket, TicketHistory
+from apps.queue.models.office_hourly_rollup import (
+    WAIT_BUCKETS,
+    SERVICE_BUCKETS,
+    WAIT_BUCKET_FIELDS,
+    SERVICE_BUCKET_FIELDS,
+)
+
+HOUR = timedelta(hours=1)
+TICKET_FIELDS = ('office_id', 'region_id', 'created_at', 'called_at', 'served_at')
+
+
+def floor_hour(value):
+    """Start of the hour containing value"""
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+class _HourTotals:
+    """Running totals for one office-hour"""
+
+    def __init__(self, region_id):
+        self.region_id = region_id
+        self.created_count = 0
+        self.called_count = 0
+        self.served_count = 0
+        self.wait_time_sum = 0.0
+        self.service_time_sum = 0.0
+        self.max_waiting = 0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS)
+        self.service_buckets = [0] * len(SERVICE_BUCKETS)
+
+    def to_rollup(self, office_id, hour):
+        return OfficeHourlyRollup(
+            office_id=office_id,
+            region_id=self.region_id,
+            hour=hour,
+            created_count=self.created_count,
+            called_count=self.called_count,
+            served_count=self.served_count,
+            wait_time_sum=self.wait_time_sum,
+            service_time_sum=self.service_time_sum,
+            max_waiting=self.max_waiting,
+            **dict(zip(WAIT_BUCKET_FIELDS, self.wait_buckets)),
+            **dict(zip(SERVICE_BUCKET_FIELDS, self.service_buckets))
+        )
+
+
+def _bucket_index(bounds, seconds):
+    return bisect.bisect_left(bounds[:-1], seconds)
+
+
+def _in_range(start, end):
+    """Tickets with a create, call or serve event in [start, end)"""
+    return (
+        Q(created_at__gte=start, created_at__lt=end)
+        | Q(called_at__gte=start, called_at__lt=end)
+        | Q(served_at__gte=start, served_at__lt=end)
+    )
+
+
+def _tickets_with_events(start, end):
+    """(office, region, created, called, served) of every ticket with an event in [start, end)"""
+    live = QueueTicket.objects.filter(_in_range(start, end)).values_list(*TICKET_FIELDS)
+    archived = TicketHistory.objects.filter(_in_range(start, end)).values_list(*TICKET_FIELDS)
+    return chain(live.iterator(chunk_size=5000), archived.iterator(chunk_size=5000))
+
+
+def _waiting_counts_at(start):
+    """Per office, tickets created before start and not yet called at start"""
+    not_called = Q(called_at__gte=start) | Q(called_at__isnull=True, status='WAITING')
+    live = QueueTicket.objects.filter(not_called, created_at__lt=start)
+    # Archived tickets are SERVED, so they were called at some point
+    archived = TicketHistory.objects.filter(created_at__lt=start, called_at__gte=start)
+    counts, regions = defaultdict(int), {}
+    for queryset in (live, archived):
+        rows = queryset.values('office_id', 'region_id').annotate(count=Count('pk')).order_by()
+        for row in rows:
+            counts[row['office_id']] += row['count']
+            regions[row['office_id']] = row['region_id']
+    return counts, regions
+
+
+def compute_rollups(start, end):
+    """Build OfficeHourlyRollup rows (unsaved) for every office-hour with activity in [start, end)"""
+    depth, regions = _waiting_counts_at(start)
+    totals = {}
+    events = []
+    
+    def hour_totals(office_id, at):
+        key = (office_id, floor_hour(at))
+        if key not in totals:
+            totals[key] = _HourTotals(regions[office_id])
+        return totals[key]
+    
+    for office_id, region_id, created_at, called_at, served_at in _tickets_with_events(start, end):
+        regions[office_id] = region_id
+        if start <= created_at < end:
+            hour_totals(office_id, created_at).created_count += 1
+            events.append((created_at, 1, office_id))
+        
+        if called_at is not None and start <= called_at < end:
+            wait = (called_at - created_at).total_seconds()
+            hour = hour_totals(office_id, called_at)
+            hour.called_count += 1
+            hour.wait_time_sum += wait
+            hour.wait_buckets[_bucket_index(WAIT_BUCKETS, wait)] += 1
+            events.append((called_at, -1, office_id))
+        
+        if served_at is not None and called_at is not None and start <= served_at < end:
+            service = (served_at - called_at).total_seconds()
+            hour = hour_totals(office_id, served_at)
+            hour.served_count += 1
+            hour.service_time_sum += service
+            hour.service_buckets[_bucket_index(SERVICE_BUCKETS, service)] += 1
+    
+    # Calls before creations at the same instant, so the peak is not overstated
+    events.sort(key=lambda event: (event[0], event[1]))
+    for at, delta, office_id in events:
+        hour = hour_totals(office_id, at)
+        hour.max_waiting = max(hour.max_waiting, depth[office_id])
+        depth[office_id] += delta
+        hour.max_waiting = max(hour.max_waiting, depth[office_id])
+    
+    return [hour.to_rollup(office_id, hour_start) for (office_id, hour_start), hour in totals.items()]
+
+
+def rollup_range(start, end, chunk=timedelta(days=1)):
+    """Recompute and replace rollups for [start, end), one transaction per chunk; return rows written"""
+    start, written = floor_hour(start), 0
+    while start < end:
+        chunk_end = min(start + chunk, end)
+        rollups = compute_rollups(start, chunk_end)
+        with transaction.atomic():
+            OfficeHourlyRollup.objects.filter(hour__gte=start, hour__lt=chunk_end).delete()
+            OfficeHourlyRollup.objects.bulk_create(rollups, batch_size=1000)
+        written += len(rollups)
+        start = chunk_end
+    return written
+
+
+def get_rollup_start():
+    """Where rollup_pending resumes: the latest stored hour, else the first ticket's hour"""
+    latest = OfficeHourlyRollup.objects.aggregate(hour=Max('hour'))['hour']
+    if latest is not None:
+        return latest
+    first = [
+        value for value in (
+            QueueTicket.objects.aggregate(first=Min('created_at'))['first'],
+            TicketHistory.objects.aggregate(first=Min('created_at'))['first'],
+        )
+        if value is not None
+    ]
+    return floor_hour(min(first)) if first else None
+
+
+def rollup_pending(now=None, chunk=timedelta(days=1)):
+    """Roll up everything from the last run through the current hour; return (start, end, rows written)"""
+    end = floor_hour(now or timezone.now()) + HOUR
+    start = get_rollup_start()
+    if start is None:
+        return None, end, 0
+    return start, end, rollup_range(start, end, chunk)
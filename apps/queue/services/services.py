@@ -1,32 +1,42 @@
-from django.db import transaction
+import logging
+import threading
+from functools import partial, wraps
+from django.db import connection, transaction
 from django.utils import timezone
-from apps.queue.models import QueueTicket, Counter
+from apps.queue.models import QueueTicket, Counter, Office, TicketSequence
 from apps.queue.selectors import (
     get_next_waiting_ticket,
-    get_ticket_by_id,
+    get_next_waiting_ticket_for_update,
     get_active_counters,
     get_idle_counters,
+    get_open_counter_ids,
     get_office_queue_stats,
-    calculate_average_service_time,
-    get_office_tickets
+    get_office_service_stats,
+    get_recent_office_activity,
+    get_region_queue_stats,
+    get_region_counter_activity,
+    get_region_service_stats
 )
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-
+from apps.queue.services.events import publish, publish_many
+from apps.queue.services.bookkeeping import (
+    invalidate_dashboard_on_commit,
+    schedule_claim_bookkeeping,
+    schedule_completion_bookkeeping,
+    schedule_create_bookkeeping,
+    schedule_start_bookkeeping,
+    update_live_index_on_commit,
+    update_wait_estimates_on_commit
+)
+from apps.queue.services.transitions import InvalidTransition, TicketNotAtCounter, transition_ticket
+from apps.queue.services import live_index, wait_estimates
+from apps.queue.services.metrics import instrumented
 
-channel_layer = get_channel_layer()
+logger = logging.getLogger(__name__)
 
 
 def broadcast_websocket_event(group_name, event_type, data):
-    """Helper for WebSocket broadcasting"""
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {
-            'type': 'queue_event',
-            'event_type': event_type,
-            'data': data
-        }
-    )
+    """Helper for WebSocket broadcasting, sent after the transaction commits"""
+    publish(group_name, event_type, data)
 
 
 def broadcast_to_office(office_id, event_type, data):
@@ -47,6 +57,11 @@ def broadcast_to_counter(counter_id, event_type, data):
     broadcast_websocket_event(group_name, event_type, data)
 
 
+def broadcast_to_groups(group_names, event_type, data):
+    """Broadcast one event to several groups in a single send"""
+    publish_many(group_names, event_type, data)
+
+
 def prepare_ticket_data(ticket):
     """Prepare ticket data for WebSocket events"""
     return {
@@ -60,6 +75,43 @@ def prepare_ticket_data(ticket):
     }
 
 
+def _wait_estimate(estimate, *args):
+    """estimate(*args), or None when the estimate cannot be read (e.g. the cache is down)"""
+    try:
+        return estimate(*args)
+    except Exception:
+        logger.exception('Wait estimate unavailable')
+        return None
+
+
+def prepare_created_ticket_data(ticket):
+    """TICKET_CREATED data with the ticket's projected wait; build it after commit"""
+    return {
+        **prepare_ticket_data(ticket),
+        'wait_estimate': _wait_estimate(wait_estimates.estimate_ticket, ticket.office_id, ticket.id)
+    }
+
+
+def _prepare_tickets_created_data(office_id, region_id, tickets):
+    """TICKETS_CREATED data with each new ticket's projected wait; build it after commit"""
+    estimates = _wait_estimate(wait_estimates.estimate_tickets, office_id, [ticket.id for ticket in tickets])
+    return {
+        'office_id': office_id,
+        'region_id': region_id,
+        'count': len(tickets),
+        'tickets': [
+            {**prepare_ticket_data(ticket), 'wait_estimate': estimate}
+            for ticket, estimate in zip(tickets, estimates or [None] * len(tickets))
+        ]
+    }
+
+
+def with_office_estimate(data, office_id):
+    """Add office's projected wait for new arrivals to event data; call after commit"""
+    return {**data, 'wait_estimate': _wait_estimate(wait_estimates.estimate_office, office_id)}
+
+
+@instrumented
 @transaction.atomic
 def create_ticket(region_id, office_id):
     """Create ticket, generate number, broadcast TICKET_CREATED"""
@@ -68,42 +120,207 @@ def create_ticket(region_id, office_id):
         office_id=office_id,
         status='WAITING'
     )
+    schedule_create_bookkeeping(ticket)
+
+    # The estimate reads the cache: build it after commit, not under the row lock
+    broadcast_to_groups(
+        [f'office_{office_id}', f'region_{region_id}'],
+        'TICKET_CREATED',
+        partial(prepare_created_ticket_data, ticket)
+    )
+
+    return ticket
+
+
+def _group_by_office(items):
+    """Group {region_id, office_id} items into office_id -> (region_id, count), keeping order"""
+    offices = {}
+    for item in items:
+        region_id, count = offices.get(item['office_id'], (item['region_id'], 0))
+        offices[item['office_id']] = (region_id, count + 1)
+    return offices
+
+
+@instrumented
+@transaction.atomic
+def create_tickets_bulk(items):
+    """Create many tickets: one number block and one TICKETS_CREATED broadcast per office, one bulk insert"""
+    today = timezone.localdate()
+    offices = _group_by_office(items)
     
-    data = prepare_ticket_data(ticket)
-    broadcast_to_office(office_id, 'TICKET_CREATED', data)
-    broadcast_to_region(region_id, 'TICKET_CREATED', data)
+    next_number = {}
+    for office_id, (_, count) in offices.items():
+        last = TicketSequence.allocate(office_id, today, count)
+        next_number[office_id] = last - count + 1
     
+    new_tickets = []
+    for item in items:
+        number = next_number[item['office_id']]
+        next_number[item['office_id']] = number + 1
+        new_tickets.append(QueueTicket(
+            ticket_number=QueueTicket.format_ticket_number(item['office_id'], today, number),
+            region_id=item['region_id'],
+            office_id=item['office_id'],
+            status='WAITING'
+        ))
+    tickets = QueueTicket.objects.bulk_create(new_tickets)
+    
+    for office_id, (region_id, _) in offices.items():
+        office_tickets = [ticket for ticket in tickets if ticket.office_id == office_id]
+        update_live_index_on_commit(
+            live_index.add_waiting_many,
+            office_id,
+            [(ticket.id, ticket.created_at) for ticket in office_tickets]
+        )
+        update_wait_estimates_on_commit(
+            wait_estimates.note_issued,
+            office_id,
+            [ticket.id for ticket in office_tickets]
+        )
+        invalidate_dashboard_on_commit(office_id)
+        broadcast_to_groups(
+            [f'office_{office_id}', f'region_{region_id}'],
+            'TICKETS_CREATED',
+            partial(_prepare_tickets_created_data, office_id, region_id, office_tickets)
+        )
+    
+    return tickets
+
+
+def _claim_with_skip_locked(office_id, counter_id):
+    """Claim next ticket with SELECT ... FOR UPDATE SKIP LOCKED"""
+    ticket = get_next_waiting_ticket_for_update(office_id)
+    if not ticket:
+        return None
+    
+    ticket.counter_id = counter_id
+    ticket.status = 'CALLED'
+    ticket.called_at = timezone.now()
+    ticket.save(update_fields=['counter', 'status', 'called_at', 'updated_at'])
     return ticket
 
 
+def _claim_with_compare_and_set(office_id, counter_id):
+    """Claim next ticket with a guarded UPDATE, retrying when another counter wins"""
+    while True:
+        ticket = get_next_waiting_ticket(office_id)
+        if not ticket:
+            return None
+        
+        called_at = timezone.now()
+        claimed = QueueTicket.objects.filter(
+            id=ticket.id,
+            status='WAITING'
+        ).update(counter_id=counter_id, status='CALLED', called_at=called_at, updated_at=called_at)
+        
+        if claimed:
+            ticket.counter_id = counter_id
+            ticket.status = 'CALLED'
+            ticket.called_at = called_at
+            ticket.updated_at = called_at
+            return ticket
+
+
+_live_claims = threading.local()
+
+
+def _restore_live_claims_on_error(func):
+    """Put tickets func popped from the live index back when it raises, as its transaction rolled back.
+    
+    Wraps the transaction.atomic call, so a failure after the claim (a later
+    query, an outer error) still finds the popped ids. Claims made by a
+    nested call are handed to the enclosing one once that call returns.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        outer = getattr(_live_claims, 'popped', None)
+        popped = _live_claims.popped = []
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            for office_id, ticket_id, score in popped:
+                try:
+                    live_index.restore_waiting(office_id, ticket_id, score)
+                except Exception:
+                    logger.exception('Failed to restore ticket %s to the live index', ticket_id)
+            raise
+        finally:
+            _live_claims.popped = outer
+        if outer is not None:
+            outer.extend(popped)
+        return result
+    return wrapper
+
+
+def claim_from_live_index(office_id, counter_id):
+    """Claim ticket popped from the live index, skipping stale entries; None when it is empty"""
+    while True:
+        popped = live_index.pop_waiting(office_id)
+        if popped is None:
+            return None
+        
+        ticket_id, score = popped
+        try:
+            ticket = transition_ticket(
+                ticket_id, 'WAITING', 'CALLED',
+                counter_id=counter_id,
+                called_at=timezone.now()
+            )
+        except (InvalidTransition, QueueTicket.DoesNotExist):
+            continue
+        except Exception:
+            live_index.restore_waiting(office_id, ticket_id, score)
+            raise
+        
+        claims = getattr(_live_claims, 'popped', None)
+        if claims is not None:
+            claims.append((office_id, ticket_id, score))
+        return ticket
+
+
+@instrumented
+def claim_next_ticket(office_id, counter_id):
+    """Atomically assign oldest WAITING ticket to counter, never handing one ticket to two counters"""
+    if live_index.is_enabled():
+        ticket = claim_from_live_index(office_id, counter_id)
+        if ticket:
+            return ticket
+    if connection.features.has_select_for_update_skip_locked:
+        return _claim_with_skip_locked(office_id, counter_id)
+    return _claim_with_compare_and_set(office_id, counter_id)
+
+
+def counter_groups(counter):
+    """Groups told about a counter's calls: its office, region and own group"""
+    return [f'office_{counter.office_id}', f'region_{counter.office.region_id}', f'counter_{counter.id}']
+
+
+@instrumented
+@_restore_live_claims_on_error
 @transaction.atomic
 def call_next_ticket(counter_id):
     """Get next WAITING ticket, assign to counter, update status to CALLED"""
     counter = Counter.objects.select_related('office').get(id=counter_id)
-    ticket = get_next_waiting_ticket(counter.office_id)
+    ticket = claim_next_ticket(counter.office_id, counter_id)
     
     if not ticket:
         return None
     
-    ticket.counter_id = counter_id
-    ticket.status = 'CALLED'
-    ticket.called_at = timezone.now()
-    ticket.save()
+    schedule_claim_bookkeeping(ticket, counter_id)
+    invalidate_dashboard_on_commit(ticket.office_id)
     
-    data = prepare_ticket_data(ticket)
-    broadcast_to_office(counter.office_id, 'TICKET_CALLED', data)
-    broadcast_to_region(counter.office.region_id, 'TICKET_CALLED', data)
-    broadcast_to_counter(counter_id, 'TICKET_CALLED', data)
+    # Built after commit, once the claim has been counted in the estimates
+    data = partial(with_office_estimate, prepare_ticket_data(ticket), ticket.office_id)
+    broadcast_to_groups(counter_groups(counter), 'TICKET_CALLED', data)
     
     return ticket
 
 
-@transaction.atomic
+@instrumented
 def start_service(ticket_id):
-    """Update status to SERVING, broadcast SERVICE_STARTED"""
-    ticket = get_ticket_by_id(ticket_id)
-    ticket.status = 'SERVING'
-    ticket.save()
+    """Move CALLED ticket to SERVING in one guarded UPDATE, broadcast SERVICE_STARTED"""
+    ticket = transition_ticket(ticket_id, 'CALLED', 'SERVING')
+    schedule_start_bookkeeping(ticket)
     
     data = prepare_ticket_data(ticket)
     broadcast_to_office(ticket.office_id, 'SERVICE_STARTED', data)
@@ -111,27 +328,74 @@ def start_service(ticket_id):
     return ticket
 
 
-@transaction.atomic
-def complete_service(ticket_id):
-    """Update status to SERVED, set served_at, broadcast SERVICE_COMPLETED"""
-    ticket = get_ticket_by_id(ticket_id)
-    ticket.status = 'SERVED'
-    ticket.served_at = timezone.now()
-    ticket.save()
+@instrumented
+def recall_ticket(ticket_id):
+    """Announce a CALLED ticket again on the displays, broadcast TICKET_RECALLED"""
+    ticket = transition_ticket(ticket_id, 'CALLED', 'CALLED')
+    invalidate_dashboard_on_commit(ticket.office_id)
     
     data = prepare_ticket_data(ticket)
+    broadcast_to_groups(
+        [f'office_{ticket.office_id}', f'region_{ticket.region_id}', f'counter_{ticket.counter_id}'],
+        'TICKET_RECALLED',
+        data
+    )
+    
+    return ticket
+
+
+@instrumented
+def complete_service(ticket_id):
+    """Move SERVING ticket to SERVED with served_at in one guarded UPDATE, broadcast SERVICE_COMPLETED"""
+    ticket = transition_ticket(ticket_id, 'SERVING', 'SERVED', served_at=timezone.now())
+    schedule_completion_bookkeeping(ticket)
+    invalidate_dashboard_on_commit(ticket.office_id)
+    
+    data = partial(with_office_estimate, prepare_ticket_data(ticket), ticket.office_id)
     broadcast_to_office(ticket.office_id, 'SERVICE_COMPLETED', data)
     
     return ticket
 
 
+@instrumented
+@_restore_live_claims_on_error
+@transaction.atomic
+def complete_and_call_next(counter_id, ticket_id):
+    """Complete counter's SERVING ticket and claim the next WAITING one in one transaction.
+    
+    Publishes a single SERVICE_COMPLETED_AND_CALLED event (called is None when
+    the queue is empty) instead of SERVICE_COMPLETED followed by TICKET_CALLED.
+    Returns (completed_ticket, called_ticket_or_None).
+    """
+    counter = Counter.objects.select_related('office').get(id=counter_id)
+    completed = transition_ticket(ticket_id, 'SERVING', 'SERVED', served_at=timezone.now())
+    if completed.counter_id != counter_id:
+        raise TicketNotAtCounter(ticket_id, counter_id)
+    
+    called = claim_next_ticket(counter.office_id, counter_id)
+    
+    schedule_completion_bookkeeping(completed, clear_counter=called is None)
+    if called:
+        schedule_claim_bookkeeping(called, counter_id)
+    invalidate_dashboard_on_commit(counter.office_id)
+    
+    broadcast_to_groups(counter_groups(counter), 'SERVICE_COMPLETED_AND_CALLED', partial(with_office_estimate, {
+        'counter_id': counter_id,
+        'office_id': counter.office_id,
+        'completed': prepare_ticket_data(completed),
+        'called': prepare_ticket_data(called) if called else None
+    }, counter.office_id))
+    
+    return completed, called
+
+
 def _build_status_counts(stats_by_status):
     """Convert stats list to dictionary"""
     return {item['status']: item['count'] for item in stats_by_status}
 
 
 def _build_activity_feed(recent_tickets):
-    """Build activity feed from tickets"""
+    """Build activity feed from recently changed tickets"""
     return [
         {
             'ticket_number': t.ticket_number,
@@ -143,25 +407,110 @@ def _build_activity_feed(recent_tickets):
     ]
 
 
-def get_supervisor_dashboard_data(office_id):
-    """Aggregate real-time stats for supervisor dashboard"""
-    stats_by_status = get_office_queue_stats(office_id)
-    status_counts = _build_status_counts(stats_by_status)
-    
-    waiting_count = status_counts.get('WAITING', 0)
-    active_counters = get_active_counters(office_id).count()
-    idle_counters = get_idle_counters(office_id).count()
-    avg_service_time = calculate_average_service_time(office_id)
-    recent_tickets = get_office_tickets(office_id)[:10]
-    activity_feed = _build_activity_feed(recent_tickets)
-    
+def _database_dashboard_counts(office_id):
+    """Dashboard status and counter counts from the ticket table"""
+    status_counts = _build_status_counts(get_office_queue_stats(office_id))
     return {
-        'waiting_count': waiting_count,
+        'waiting_count': status_counts.get('WAITING', 0),
         'called_count': status_counts.get('CALLED', 0),
         'serving_count': status_counts.get('SERVING', 0),
         'served_count': status_counts.get('SERVED', 0),
-        'active_counters': active_counters,
-        'idle_counters': idle_counters,
-        'average_service_time_seconds': avg_service_time.total_seconds() if avg_service_time else None,
+        'active_counters': get_active_counters(office_id).count(),
+        'idle_counters': get_idle_counters(office_id).count()
+    }
+
+
+def _live_dashboard_counts(office_id):
+    """Dashboard status and counter counts from the live index and the office's counters, no ticket queries"""
+    counts, busy = live_index.get_office_counts(office_id)
+    counter_ids = set(get_open_counter_ids(office_id))
+    return {
+        **counts,
+        'active_counters': len(counter_ids & busy),
+        'idle_counters': len(counter_ids - busy)
+    }
+
+
+@instrumented
+def get_supervisor_dashboard_data(office_id, start_date=None, end_date=None):
+    """Aggregate real-time stats for supervisor dashboard, timing stats optionally windowed by date"""
+    if live_index.is_enabled():
+        counts = _live_dashboard_counts(office_id)
+    else:
+        counts = _database_dashboard_counts(office_id)
+    service_stats = get_office_service_stats(office_id, start_date, end_date)
+    recent_tickets = get_recent_office_activity(office_id)
+    activity_feed = _build_activity_feed(recent_tickets)
+    
+    return {
+        **counts,
+        'average_service_time_seconds': service_stats['average_service_seconds'],
+        'average_wait_time_seconds': service_stats['average_wait_seconds'],
         'activity_feed': activity_feed
     }
+
+
+def _weighted_average(offices, average_key, count_key):
+    """Region-wide mean from per-office means weighted by their sample counts"""
+    total = sum(office[count_key] for office in offices if office[average_key] is not None)
+    if not total:
+        return None
+    return sum(
+        office[average_key] * office[count_key]
+        for office in offices if office[average_key] is not None
+    ) / total
+
+
+@instrumented
+def get_region_dashboard_data(region_id, start_date=None, end_date=None):
+    """Supervisor dashboard figures for every office in region, from four grouped queries"""
+    offices = {
+        office_id: {
+            'office_id': office_id,
+            'office_name': name,
+            'waiting_count': 0,
+            'called_count': 0,
+            'serving_count': 0,
+            'served_count': 0,
+            'active_counters': 0,
+            'idle_counters': 0,
+            'average_service_time_seconds': None,
+            'average_wait_time_seconds': None,
+            'timed_called_count': 0,
+            'timed_served_count': 0,
+        }
+        for office_id, name in Office.objects.filter(region_id=region_id).order_by('name').values_list('id', 'name')
+    }
+    
+    for row in get_region_queue_stats(region_id):
+        # Tickets keep the region they were issued in, even if their office moved since
+        if row['office_id'] in offices:
+            offices[row['office_id']][f"{row['status'].lower()}_count"] = row['count']
+    for office_id, _, busy in get_region_counter_activity(region_id):
+        offices[office_id]['active_counters' if busy else 'idle_counters'] += 1
+    for office_id, stats in get_region_service_stats(region_id, start_date, end_date).items():
+        office = offices[office_id]
+        office['average_service_time_seconds'] = stats['average_service_seconds']
+        office['average_wait_time_seconds'] = stats['average_wait_seconds']
+        office['timed_called_count'] = stats['called_count']
+        office['timed_served_count'] = stats['served_count']
+    
+    office_list = list(offices.values())
+    totals = {
+        key: sum(office[key] for office in office_list)
+        for key in (
+            'waiting_count', 'called_count', 'serving_count', 'served_count',
+            'active_counters', 'idle_counters',
+        )
+    }
+    return {
+        'region_id': region_id,
+        **totals,
+        'average_service_time_seconds': _weighted_average(
+            office_list, 'average_service_time_seconds', 'timed_served_count'
+        ),
+        'average_wait_time_seconds': _weighted_average(
+            office_list, 'average_wait_time_seconds', 'timed_called_count'
+        ),
+        'offices': office_list
+    }
@@ -0,0 +1,68 @@
+"""
+Compare-and-set ticket state transitions.
+
+A transition is a single ``UPDATE ... WHERE id = %s AND status = %s``: the
+status check and the write happen in one statement, so two requests racing on
+the same ticket cannot both succeed, and no row is read up front. The row is
+only looked at again to return it, or to explain why the update matched nothing.
+"""
+from django.utils import timezone
+from apps.queue.models import QueueTicket
+from apps.queue.selectors import get_ticket_by_id, aget_ticket_by_id
+
+
+class InvalidTransition(Exception):
+    """Ticket is not in the status the transition requires"""
+
+    def __init__(self, ticket_id, expected_status, current_status):
+        self.ticket_id = ticket_id
+        self.expected_status = expected_status
+        self.current_status = current_status
+        super().__init__(
+            f'Ticket must be {expected_status} status, current status: {current_status}'
+        )
+
+
+class TicketNotAtCounter(Exception):
+    """Ticket is assigned to a different counter than the one acting on it"""
+
+    def __init__(self, ticket_id, counter_id):
+        self.ticket_id = ticket_id
+        self.counter_id = counter_id
+        super().__init__(f'Ticket {ticket_id} is not assigned to counter {counter_id}')
+
+
+def transition_ticket(ticket_id, from_status, to_status, **fields):
+    """Move ticket from from_status to to_status, setting fields, and return the updated ticket"""
+    updated = QueueTicket.objects.filter(
+        id=ticket_id,
+        status=from_status
+    ).update(status=to_status, updated_at=timezone.now(), **fields)
+
+    if not updated:
+        current_status = QueueTicket.objects.filter(
+            id=ticket_id
+        ).values_list('status', flat=True).first()
+        if current_status is None:
+            raise QueueTicket.DoesNotExist(f'Ticket {ticket_id} not found')
+        raise InvalidTransition(ticket_id, from_status, current_status)
+
+    return get_ticket_by_id(ticket_id)
+
+
+async def atransition_ticket(ticket_id, from_status, to_status, **fields):
+    """Async transition_ticket"""
+    updated = await QueueTicket.objects.filter(
+        id=ticket_id,
+        status=from_status
+    ).aupdate(status=to_status, updated_at=timezone.now(), **fields)
+    
+    if not updated:
+        current_status = await QueueTicket.objects.filter(
+            id=ticket_id
+        ).values_list('status', flat=True).afirst()
+        if current_status is None:
+            raise QueueTicket.DoesNotExist(f'Ticket {ticket_id} not found')
+        raise InvalidTransition(ticket_id, from_status, current_status)
+    
+    return await aget_ticket_by_id(ticket_id)
@@ -0,0 +1,217 @@
+"""
+Live wait-time estimates per office, kept in the cache.
+
+Each office has:
+
+* an exponentially weighted moving average of service time (called_at to
+  served_at), updated in O(1) by every completed service; QUEUE_ETA_ALPHA is
+  the weight of the newest sample
+* ``issued`` and ``called`` counters, bumped after commit by ticket creation
+  and claims. Every WAITING ticket keeps the ``issued`` ordinal it was given,
+  so its place in the queue is its ordinal minus ``called`` and the queue
+  length is ``issued - called``
+* the number of active counters
+
+A ticket with p tickets ahead of it waits about (p + 1) * service / counters.
+Counters and ordinals are seeded from the office's WAITING tickets (one
+indexed query) under a new epoch and expire after QUEUE_ETA_RESYNC_SECONDS,
+so drift from lost updates, rolled-back work or tickets changed outside the
+services heals on the next reseed. The service average has no timeout and
+starts from the office's daily stats.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from apps.queue.models import QueueTicket, Counter
+from apps.queue.selectors import get_office_service_stats
+
+STATE_FIELDS = ('epoch', 'issued', 'called', 'counters')
+ESTIMATE_FIELDS = ('position', 'waiting_count', 'active_counters', 'average_service_seconds', 'estimated_wait_seconds')
+
+
+def _alpha():
+    return getattr(settings, 'QUEUE_ETA_ALPHA', 0.2)
+
+
+def _resync_seconds():
+    return getattr(settings, 'QUEUE_ETA_RESYNC_SECONDS', 900)
+
+
+def _office_key(office_id, name):
+    return f'queue:eta:office:{office_id}:{name}'
+
+
+def _ticket_key(ticket_id):
+    return f'queue:eta:ticket:{ticket_id}'
+
+
+def _initial_service_seconds(office_id):
+    """Starting service average: the office's recorded mean, else QUEUE_ETA_DEFAULT_SERVICE_SECONDS"""
+    average = get_office_service_stats(office_id)['average_service_seconds']
+    if average is None:
+        average = getattr(settings, 'QUEUE_ETA_DEFAULT_SERVICE_SECONDS', 300)
+    return float(average)
+
+
+def _service_seconds(office_id, cached=None):
+    if cached is None:
+        cached = _initial_service_seconds(office_id)
+        cache.add(_office_key(office_id, 'service'), cached, timeout=None)
+    return cached
+
+
+def _seed(office_id, ticket_ids=()):
+    """Rebuild office counters and ordinals from the database under a new epoch"""
+    waiting = list(
+        QueueTicket.objects.filter(office_id=office_id, status='WAITING')
+        .order_by('created_at')
+        .values_list('id', flat=True)
+    )
+    epoch = time.time_ns() // 1000
+    state = {
+        'epoch': epoch,
+        'issued': len(waiting),
+        'called': 0,
+        'counters': Counter.objects.filter(office_id=office_id, is_active=True).count(),
+    }
+    ordinals = {ticket_id: ordinal for ordinal, ticket_id in enumerate(waiting, 1)}
+
+    values = {_office_key(office_id, name): value for name, value in state.items()}
+    values.update({
+        _ticket_key(ticket_id): (office_id, epoch, ordinal)
+        for ticket_id, ordinal in ordinals.items()
+    })
+    cache.set_many(values, timeout=_resync_seconds())
+
+    state['service'] = _service_seconds(office_id)
+    return state, {ticket_id: ordinals[ticket_id] for ticket_id in ticket_ids if ticket_id in ordinals}
+
+
+def _load(office_id, ticket_ids=()):
+    """(state, {ticket_id: ordinal}) for office in one cache round trip, seeding when it has expired"""
+    state_keys = [_office_key(office_id, name) for name in STATE_FIELDS + ('service',)]
+    ticket_keys = [_ticket_key(ticket_id) for ticket_id in ticket_ids]
+    values = cache.get_many(state_keys + ticket_keys)
+
+    state = {name: values.get(key) for name, key in zip(STATE_FIELDS, state_keys)}
+    if any(value is None for value in state.values()):
+        return _seed(office_id, ticket_ids)
+    state['service'] = _service_seconds(office_id, values.get(state_keys[-1]))
+
+    ordinals = {}
+    for ticket_id, key in zip(ticket_ids, ticket_keys):
+        entry = values.get(key)
+        if entry is not None and entry[1] == state['epoch']:
+            ordinals[ticket_id] = entry[2]
+    return state, ordinals
+
+
+def _waiting_count(state):
+    return max(state['issued'] - state['called'], 0)
+
+
+def _estimate(state, ahead, waiting_count):
+    counters = state['counters']
+    return {
+        'position': ahead,
+        'waiting_count': waiting_count,
+        'active_counters': counters,
+        'average_service_seconds': state['service'],
+        'estimated_wait_seconds': (ahead + 1) * state['service'] / counters if counters else None,
+    }
+
+
+def note_issued(office_id, ticket_ids):
+    """Give new WAITING tickets the next ordinals; call after their creation commits"""
+    state, ordinals = _load(office_id, ticket_ids)
+    # A reseed that already saw the tickets has numbered them
+    new_ids = [ticket_id for ticket_id in ticket_ids if ticket_id not in ordinals]
+    if not new_ids:
+        return
+    try:
+        last = cache.incr(_office_key(office_id, 'issued'), len(new_ids))
+    except ValueError:
+        return
+    cache.set_many({
+        _ticket_key(ticket_id): (office_id, state['epoch'], ordinal)
+        for ordinal, ticket_id in enumerate(new_ids, last - len(new_ids) + 1)
+    }, timeout=_resync_seconds())
+
+
+def note_called(office_id, count=1):
+    """Move the front of office queue on by count claimed tickets"""
+    try:
+        cache.incr(_office_key(office_id, 'called'), count)
+    except ValueError:
+        pass
+
+
+def record_service_time(office_id, seconds):
+    """Fold one service time into office's moving average"""
+    key = _office_key(office_id, 'service')
+    average = _service_seconds(office_id, cache.get(key))
+    cache.set(key, average + _alpha() * (seconds - average), timeout=None)
+
+
+def estimate_tickets(office_id, ticket_ids):
+    """Projected waits for new tickets; ones not yet numbered count as joining the back in order"""
+    state, ordinals = _load(office_id, ticket_ids)
+    waiting = _waiting_count(state)
+    estimates, joined = [], 0
+    for ticket_id in ticket_ids:
+        if ticket_id in ordinals:
+            ahead = max(ordinals[ticket_id] - state['called'] - 1, 0)
+        else:
+            ahead = waiting + joined
+            joined += 1
+        estimates.append(_estimate(state, ahead, waiting + len(ticket_ids) - len(ordinals)))
+    return estimates
+
+
+def estimate_ticket(office_id, ticket_id):
+    """Projected wait for a single ticket, see estimate_tickets"""
+    return estimate_tickets(office_id, [ticket_id])[0]
+
+
+def estimate_office(office_id):
+    """Projected wait for a ticket issued now"""
+    state, _ = _load(office_id)
+    waiting = _waiting_count(state)
+    estimate = _estimate(state, waiting, waiting)
+    del estimate['position']
+    return estimate
+
+
+def get_ticket_eta(ticket_id):
+    """Ticket's place and projected wait from the cache; None for an unknown ticket.
+
+    A WAITING ticket numbered in the current epoch is answered from two cache
+    reads. Anything else costs one primary key lookup, plus a reseed if a
+    WAITING ticket has no ordinal.
+    """
+    entry = cache.get(_ticket_key(ticket_id))
+    if entry is not None:
+        office_id, epoch, ordinal = entry
+        state, _ = _load(office_id)
+        if state['epoch'] == epoch and ordinal > state['called']:
+            return {
+                'ticket_id': ticket_id,
+                'office_id': office_id,
+                'status': 'WAITING',
+                **_estimate(state, ordinal - state['called'] - 1, _waiting_count(state))
+            }
+
+    ticket = QueueTicket.objects.filter(id=ticket_id).values('office_id', 'status').first()
+    if ticket is None:
+        return None
+    eta = {'ticket_id': ticket_id, **ticket}
+    if ticket['status'] != 'WAITING':
+        return {**eta, **dict.fromkeys(ESTIMATE_FIELDS)}
+
+    state, ordinals = _load(ticket['office_id'], [ticket_id])
+    if ticket_id not in ordinals:
+        state, ordinals = _seed(ticket['office_id'], [ticket_id])
+    # Claims race creation order by a few ms; a ticket overtaken that way is next
+    ahead = max(ordinals.get(ticket_id, state['issued']) - state['called'] - 1, 0)
+    return {**eta, **_estimate(state, ahead, _waiting_count(state))}
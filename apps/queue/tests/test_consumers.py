@@ -0,0 +1,412 @@
+import asyncio
+import json
+import time
+from unittest import mock, skipIf
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from apps.queue.models import Region, Office, Counter, QueueTicket
+from apps.queue.consumers.backpressure import CLOSE_TOO_SLOW, stats
+from apps.queue.consumers.consumers import OfficeConsumer
+from apps.queue.routing import websocket_urlpatterns
+from apps.queue.services import event_log, metrics
+from apps.queue.services.events import build_message, send_batch, sequence_events
+from apps.queue.tests.utils import LOCMEM_CACHES
+
+
+IN_MEMORY_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+async def connect(path):
+    """Open a communicator and read the initial frame"""
+    communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+    connected, _ = await communicator.connect()
+    assert connected
+    return communicator, await communicator.receive_json_from()
+
+
+async def publish(group_name, event_type, data):
+    """Send an event the way the outbox dispatcher does"""
+    await send_batch(sequence_events([((group_name,), event_type, data)]))
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS, CACHES=LOCMEM_CACHES, QUEUE_EVENT_LOG_SIZE=3)
+class QueueConsumerTestCase(TestCase):
+    """Test queue WebSocket consumers"""
+    
+    def setUp(self):
+        cache.clear()
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+        self.counter = Counter.objects.create(name='Counter 1', office=self.office)
+    
+    def test_office_consumer_forwards_frame(self):
+        async def scenario():
+            communicator, _ = await connect(f'/ws/office/{self.office.id}/')
+            message = build_message('TICKET_CREATED', {'ticket_id': 7})
+            await get_channel_layer().group_send(f'office_{self.office.id}', message)
+            text = await communicator.receive_from()
+            await communicator.disconnect()
+            return message, text
+        
+        message, text = async_to_sync(scenario)()
+        self.assertEqual(text, message['text'])
+        self.assertEqual(json.loads(text), {'type': 'TICKET_CREATED', 'data': {'ticket_id': 7}})
+    
+    def test_socket_metrics_per_consumer_class(self):
+        def count(name):
+            key = metrics._encode_key(metrics._key(name, {'consumer': 'OfficeConsumer'}))
+            return metrics.snapshot()['counters'].get(key, 0)
+        
+        names = ('queue_ws_connections_total', 'queue_ws_disconnections_total', 'queue_ws_frames_sent_total')
+        before = {name: count(name) for name in names}
+        
+        async def scenario():
+            communicator, _ = await connect(f'/ws/office/{self.office.id}/')
+            await get_channel_layer().group_send(
+                f'office_{self.office.id}',
+                build_message('TICKET_CREATED', {'ticket_id': 7})
+            )
+            await communicator.receive_from()
+            await communicator.disconnect()
+        
+        async_to_sync(scenario)()
+        self.assertEqual({name: count(name) - before[name] for name in names}, {
+            'queue_ws_connections_total': 1,
+            'queue_ws_disconnections_total': 1,
+            'queue_ws_frames_sent_total': 2,
+        })
+    
+    def test_counter_consumer_encodes_legacy_message(self):
+        async def scenario():
+            communicator, _ = await connect(f'/ws/counter/{self.counter.id}/')
+            await get_channel_layer().group_send(f'counter_{self.counter.id}', {
+                'type': 'queue_event',
+                'event_type': 'TICKET_CALLED',
+                'data': {'ticket_id': 9}
+            })
+            payload = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return payload
+        
+        payload = async_to_sync(scenario)()
+        self.assertEqual(payload, {'type': 'TICKET_CALLED', 'data': {'ticket_id': 9}})
+    
+    def test_snapshot_on_connect(self):
+        ticket = QueueTicket.objects.create(region=self.region, office=self.office)
+        
+        async def scenario():
+            await publish(f'office_{self.office.id}', 'TICKET_CREATED', {'ticket_id': ticket.id})
+            communicator, snapshot = await connect(f'/ws/office/{self.office.id}/')
+            await communicator.disconnect()
+            return snapshot
+        
+        snapshot = async_to_sync(scenario)()
+        self.assertEqual(snapshot['type'], 'SNAPSHOT')
+        self.assertEqual(snapshot['seq'], 1)
+        self.assertEqual(snapshot['data']['waiting'], [
+            {'ticket_id': ticket.id, 'ticket_number': ticket.ticket_number}
+        ])
+    
+    def test_resume_replays_missed_events(self):
+        group_name = f'region_{self.region.id}'
+        
+        async def scenario():
+            communicator, snapshot = await connect(f'/ws/region/{self.region.id}/')
+            await communicator.disconnect()
+            for ticket_id in (1, 2):
+                await publish(group_name, 'TICKET_CREATED', {'ticket_id': ticket_id})
+            
+            communicator, first = await connect(f'/ws/region/{self.region.id}/?resume_from={snapshot["seq"]}')
+            second = await communicator.receive_json_from()
+            await publish(group_name, 'TICKET_CALLED', {'ticket_id': 1})
+            live = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return first, second, live
+        
+        first, second, live = async_to_sync(scenario)()
+        self.assertEqual([first['seq'], second['seq'], live['seq']], [1, 2, 3])
+        self.assertEqual(second['data'], {'ticket_id': 2})
+        self.assertEqual(live['type'], 'TICKET_CALLED')
+    
+    def test_resume_past_log_sends_snapshot(self):
+        group_name = f'counter_{self.counter.id}'
+        
+        async def scenario():
+            for ticket_id in range(5):
+                await publish(group_name, 'TICKET_CALLED', {'ticket_id': ticket_id})
+            communicator, frame = await connect(f'/ws/counter/{self.counter.id}/?resume_from=0')
+            await communicator.disconnect()
+            return frame
+        
+        frame = async_to_sync(scenario)()
+        self.assertEqual(frame['type'], 'SNAPSHOT')
+        self.assertEqual(frame['seq'], 5)
+        self.assertEqual(frame['data'], {'counter_id': self.counter.id, 'ticket': None})
+    
+    def test_region_summary_coalesces_events(self):
+        QueueTicket.objects.create(region=self.region, office=self.office)
+        group_name = f'region_{self.region.id}'
+        
+        async def scenario():
+            communicator, snapshot = await connect(f'/ws/region/{self.region.id}/summary/?interval=50')
+            for number in ('0002', '0003'):
+                await publish(group_name, 'TICKET_CREATED', {'office_id': self.office.id, 'ticket_number': number})
+            await publish(group_name, 'TICKET_CALLED', {'office_id': self.office.id, 'ticket_number': '0001'})
+            summary = await communicator.receive_json_from(timeout=2)
+            nothing = await communicator.receive_nothing(timeout=0.2)
+            await communicator.disconnect()
+            return snapshot, summary, nothing
+        
+        snapshot, summary, nothing = async_to_sync(scenario)()
+        self.assertEqual(snapshot['type'], 'SNAPSHOT')
+        self.assertEqual(summary['type'], 'REGION_SUMMARY')
+        self.assertEqual(summary['seq'], 3)
+        self.assertEqual(summary['data']['offices'], [{
+            'office_id': self.office.id,
+            'waiting': 2,
+            'created': 2,
+            'called': 1,
+            'last_called': ['0001']
+        }])
+        self.assertTrue(nothing)
+    
+    def test_counter_commands_reply_with_request_id(self):
+        QueueTicket.objects.create(region=self.region, office=self.office)
+        
+        async def scenario():
+            communicator, _ = await connect(f'/ws/counter/{self.counter.id}/')
+            await communicator.send_json_to({'action': 'call_next', 'request_id': 'r1'})
+            called = await communicator.receive_json_from()
+            ticket_id = called['data']['ticket']['ticket_id']
+            replies = [called]
+            for request_id, action in (('r2', 'recall'), ('r3', 'start'), ('r4', 'complete')):
+                await communicator.send_json_to({'action': action, 'request_id': request_id, 'ticket_id': ticket_id})
+                replies.append(await communicator.receive_json_from())
+            await communicator.disconnect()
+            return replies
+        
+        replies = async_to_sync(scenario)()
+        self.assertEqual([r['request_id'] for r in replies], ['r1', 'r2', 'r3', 'r4'])
+        self.assertTrue(all(r['type'] == 'REPLY' and r['ok'] for r in replies))
+        self.assertEqual(
+            [r['data']['ticket']['status'] for r in replies],
+            ['CALLED', 'CALLED', 'SERVING', 'SERVED']
+        )
+    
+    def test_counter_command_errors(self):
+        counter2 = Counter.objects.create(name='Counter 2', office=self.office)
+        ticket = QueueTicket.objects.create(
+            region=self.region,
+            office=self.office,
+            counter=counter2,
+            status='CALLED'
+        )
+        
+        async def scenario():
+            communicator, _ = await connect(f'/ws/counter/{self.counter.id}/')
+            replies = []
+            for command in (
+                {'action': 'start', 'request_id': 'r1', 'ticket_id': ticket.id},
+                {'action': 'complete', 'request_id': 'r2', 'ticket_id': ticket.id},
+                {'action': 'start', 'request_id': 'r3'},
+                {'action': 'dance', 'request_id': 'r4'},
+            ):
+                await communicator.send_json_to(command)
+                replies.append(await communicator.receive_json_from())
+            await communicator.disconnect()
+            return replies
+        
+        replies = async_to_sync(scenario)()
+        self.assertFalse(any(r['ok'] for r in replies))
+        self.assertEqual(replies[0]['error'], f'Ticket {ticket.id} is not assigned to counter {self.counter.id}')
+        self.assertEqual(replies[1]['error'], 'Ticket must be SERVING status, current status: CALLED')
+        self.assertEqual(replies[2]['error'], 'ticket_id is required')
+        self.assertEqual(replies[3]['error'], 'Unknown action: dance')
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.status, 'CALLED')
+    
+    def test_multiplex_filters_and_tags_frames(self):
+        office2 = Office.objects.create(name='Branch Office', region=self.region)
+        
+        async def scenario():
+            communicator, first = await connect(
+                f'/ws/multiplex/?subscribe=office_{self.office.id},office_{office2.id}&events=TICKET_CALLED'
+            )
+            second = await communicator.receive_json_from()
+            await communicator.send_json_to({
+                'action': 'subscribe',
+                'request_id': 's1',
+                'groups': [f'region_{self.region.id}']
+            })
+            reply = await communicator.receive_json_from()
+            region_snapshot = await communicator.receive_json_from()
+            
+            await publish(f'office_{self.office.id}', 'TICKET_CREATED', {'ticket_id': 1})
+            await publish(f'office_{office2.id}', 'TICKET_CALLED', {'ticket_id': 2})
+            await publish(f'region_{self.region.id}', 'TICKET_CREATED', {'ticket_id': 3})
+            called = await communicator.receive_json_from()
+            created = await communicator.receive_json_from()
+            nothing = await communicator.receive_nothing(timeout=0.1)
+            await communicator.disconnect()
+            return [first, second, region_snapshot], reply, called, created, nothing
+        
+        snapshots, reply, called, created, nothing = async_to_sync(scenario)()
+        self.assertEqual([s['type'] for s in snapshots], ['SNAPSHOT'] * 3)
+        self.assertEqual(
+            [s['group'] for s in snapshots],
+            [f'office_{self.office.id}', f'office_{office2.id}', f'region_{self.region.id}']
+        )
+        self.assertEqual(reply, {'type': 'REPLY', 'request_id': 's1', 'ok': True, 'data': {'groups': [f'region_{self.region.id}']}})
+        self.assertEqual((called['group'], called['type'], called['seq']), (f'office_{office2.id}', 'TICKET_CALLED', 1))
+        self.assertEqual((created['group'], created['data']), (f'region_{self.region.id}', {'ticket_id': 3}))
+        self.assertTrue(nothing)
+    
+    def test_multiplex_rejects_invalid_groups(self):
+        async def scenario():
+            communicator, _ = await connect('/ws/multiplex/?subscribe=office_1')
+            await communicator.send_json_to({'action': 'subscribe', 'request_id': 's1', 'groups': ['users_1']})
+            reply = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return reply
+        
+        reply = async_to_sync(scenario)()
+        self.assertEqual(reply['error'], 'Invalid group: users_1')
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_LAYERS, CACHES=LOCMEM_CACHES, QUEUE_WS_SEND_BUFFER=4)
+class SlowConsumerTestCase(TestCase):
+    """Simulate hung displays next to healthy ones on the same office group"""
+    
+    EVENTS = 30
+    
+    def setUp(self):
+        cache.clear()
+        stats.reset()
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+    
+    def make_consumer(self, base_send):
+        consumer = OfficeConsumer()
+        consumer.scope = {'type': 'websocket'}
+        consumer.base_send = base_send
+        consumer.group_id = self.office.id
+        consumer.group_name = f'office_{self.office.id}'
+        consumer.min_seq = 0
+        consumer.start_outbound()
+        return consumer
+    
+    def run_readers(self):
+        """Deliver events to one fast and one hung reader, return fast latencies and what the hung one saw"""
+        async def scenario():
+            fast_latencies, slow_messages = [], []
+            sent_at = {}
+            
+            async def fast_send(message):
+                frame = json.loads(message['text'])
+                if frame['type'] == 'TICKET_CREATED':
+                    fast_latencies.append(time.perf_counter() - sent_at[frame['seq']])
+            
+            async def slow_send(message):
+                slow_messages.append(message)
+                if message['type'] == 'websocket.send':
+                    await asyncio.sleep(60)
+            
+            fast = self.make_consumer(fast_send)
+            slow = self.make_consumer(slow_send)
+            for seq in range(1, self.EVENTS + 1):
+                message = build_message('TICKET_CREATED', {'ticket_id': seq}, seq=seq)
+                sent_at[seq] = time.perf_counter()
+                await fast.queue_event(message)
+                await slow.queue_event(message)
+                await asyncio.sleep(0)
+            await asyncio.sleep(0.05)
+            backlog = len(slow.outbound) if slow.outbound else 0
+            fast.stop_outbound()
+            slow.stop_outbound()
+            return fast_latencies, slow_messages, backlog
+        
+        return async_to_sync(scenario)()
+    
+    def test_slow_reader_is_coalesced(self):
+        fast_latencies, slow_messages, backlog = self.run_readers()
+        
+        self.assertEqual(len(fast_latencies), self.EVENTS)
+        self.assertLess(max(fast_latencies), 0.05)
+        self.assertLessEqual(backlog, 4)
+        self.assertGreater(stats.coalesced, 0)
+        self.assertGreater(stats.dropped_frames, 0)
+        self.assertEqual(stats.connections, 0)
+        self.assertEqual(stats.lagging, 0)
+    
+    @override_settings(QUEUE_WS_SLOW_CLIENT_POLICY='disconnect')
+    def test_slow_reader_is_disconnected(self):
+        with self.assertLogs('apps.queue.consumers.backpressure', 'WARNING'):
+            fast_latencies, slow_messages, backlog = self.run_readers()
+        
+        self.assertEqual(len(fast_latencies), self.EVENTS)
+        self.assertEqual(stats.disconnected, 1)
+        self.assertEqual(slow_messages[-1], {'type': 'websocket.close', 'code': CLOSE_TOO_SLOW})
+        self.assertEqual(backlog, 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, QUEUE_EVENT_LOG_SIZE=3)
+class EventLogTestCase(TestCase):
+    """Test batch sequencing of queue events"""
+    
+    EVENTS = [
+        (('office_1', 'region_1'), 'TICKET_CREATED', {'ticket_id': 1}),
+        (('office_1',), 'TICKET_CALLED', {'ticket_id': 1}),
+        (('office_1', 'region_1'), 'TICKET_CREATED', {'ticket_id': 2}),
+        (('office_1', 'region_1'), 'TICKET_CREATED', {'ticket_id': 3})
+    ]
+    
+    def setUp(self):
+        cache.clear()
+    
+    def assert_sequenced(self, deliveries):
+        seqs = [[(group_name, message['seq']) for group_name, message in messages] for messages in deliveries]
+        self.assertEqual(seqs, [
+            [('office_1', 1), ('region_1', 1)],
+            [('office_1', 2)],
+            [('office_1', 3), ('region_1', 2)],
+            [('office_1', 4), ('region_1', 3)]
+        ])
+        last_seq, frames = event_log.replay('office_1', 1)
+        self.assertEqual(last_seq, 4)
+        self.assertEqual([json.loads(frame)['seq'] for frame in frames], [2, 3, 4])
+        # Frames older than QUEUE_EVENT_LOG_SIZE are trimmed
+        self.assertIsNone(event_log.replay('office_1', 0))
+        self.assertEqual(event_log.replay('region_1', 0)[0], 3)
+    
+    def test_batch_reserves_once_per_group(self):
+        with mock.patch.object(event_log, '_incr', wraps=event_log._incr) as incr:
+            deliveries = sequence_events(self.EVENTS)
+        
+        self.assertEqual(incr.call_count, 2)
+        self.assert_sequenced(deliveries)
+        self.assertEqual([message['seq'] for _, message in sequence_events(self.EVENTS[:1])[0]], [5, 4])
+    
+    @skipIf(fakeredis is None, 'fakeredis not installed')
+    def test_redis_pipeline(self):
+        redis_caches = {'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://localhost:6379/1',
+            'OPTIONS': {'connection_class': fakeredis.FakeConnection}
+        }}
+        with override_settings(CACHES=redis_caches):
+            cache.clear()
+            with mock.patch.object(event_log, '_incr') as incr:
+                deliveries = sequence_events(self.EVENTS)
+            
+            incr.assert_not_called()
+            self.assert_sequenced(deliveries)
+            cache.clear()
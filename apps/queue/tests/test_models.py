@@ -1,5 +1,7 @@
+from unittest import mock
 from django.test import TestCase
-from apps.queue.models import Region, Office, Counter, Officer, QueueTicket
+from django.utils import timezone
+from apps.queue.models import Region, Office, Counter, Officer, QueueTicket, TicketSequence
 from apps.users.models import User
 
 
@@ -66,3 +68,37 @@ class QueueTicketModelTestCase(TestCase):
         )
         self.assertNotEqual(ticket1.ticket_number, ticket2.ticket_number)
         self.assertIn(str(self.office.id).zfill(3), ticket1.ticket_number)
+    
+    def test_ticket_number_sequence(self):
+        ticket1 = QueueTicket.objects.create(region=self.region, office=self.office)
+        ticket2 = QueueTicket.objects.create(region=self.region, office=self.office)
+        self.assertTrue(ticket1.ticket_number.endswith('-0001'))
+        self.assertTrue(ticket2.ticket_number.endswith('-0002'))
+
+
+class TicketSequenceModelTestCase(TestCase):
+    """Test TicketSequence allocator"""
+    
+    def setUp(self):
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+        self.other_office = Office.objects.create(name='Branch Office', region=self.region)
+        self.today = timezone.localdate()
+    
+    def test_allocate_increments(self):
+        self.assertEqual(TicketSequence.allocate(self.office.id, self.today), 1)
+        self.assertEqual(TicketSequence.allocate(self.office.id, self.today), 2)
+    
+    def test_allocate_block(self):
+        self.assertEqual(TicketSequence.allocate(self.office.id, self.today, count=10), 10)
+        self.assertEqual(TicketSequence.allocate(self.office.id, self.today), 11)
+    
+    def test_allocate_per_office(self):
+        TicketSequence.allocate(self.office.id, self.today, count=5)
+        self.assertEqual(TicketSequence.allocate(self.other_office.id, self.today), 1)
+        self.assertEqual(TicketSequence.objects.count(), 2)
+    
+    def test_allocate_without_upsert_returning(self):
+        with mock.patch('apps.queue.models.upsert.supports_upsert_returning', return_value=False):
+            self.assertEqual(TicketSequence.allocate(self.office.id, self.today), 1)
+            self.assertEqual(TicketSequence.allocate(self.office.id, self.today, count=3), 4)
@@ -1,14 +1,46 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import mock, skipIf
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from django.db import transaction
-from apps.queue.models import Region, Office, Counter, QueueTicket
+from apps.queue.models import Region, Office, Counter, QueueTicket, OfficeDailyStats, OfficeHourlyRollup, TicketHistory
+from apps.queue.services import live_index, metrics, wait_estimates
+from apps.queue.selectors import (
+    calculate_average_service_time,
+    get_office_service_stats,
+    get_recent_office_activity
+)
+from apps.queue.selectors.analytics import estimate_percentile
 from apps.queue.services import (
     create_ticket,
+    create_tickets_bulk,
     call_next_ticket,
+    claim_next_ticket,
     start_service,
-    complete_service
+    complete_service,
+    complete_and_call_next,
+    get_supervisor_dashboard_data,
+    estimate_office,
+    get_ticket_eta,
+    archive_cutoff,
+    archive_served_tickets,
+    rollup_range,
+    rollup_pending,
+    InvalidTransition
 )
+from apps.queue.tests.utils import LOCMEM_CACHES
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
 
 
+@override_settings(CACHES=LOCMEM_CACHES)
 class TicketServiceTestCase(TestCase):
     """Test ticket service functions"""
     
@@ -33,6 +65,27 @@ class TicketServiceTestCase(TestCase):
         self.assertEqual(called_ticket.counter_id, self.counter.id)
         self.assertIsNotNone(called_ticket.called_at)
     
+    def test_call_next_ticket_distinct_counters(self):
+        counter2 = Counter.objects.create(name='Counter 2', office=self.office)
+        ticket1 = create_ticket(self.region.id, self.office.id)
+        ticket2 = create_ticket(self.region.id, self.office.id)
+        
+        called1 = call_next_ticket(self.counter.id)
+        called2 = call_next_ticket(counter2.id)
+        self.assertEqual(called1.id, ticket1.id)
+        self.assertEqual(called2.id, ticket2.id)
+        self.assertEqual(called2.counter_id, counter2.id)
+    
+    def test_claim_next_ticket_skips_claimed(self):
+        ticket1 = create_ticket(self.region.id, self.office.id)
+        ticket2 = create_ticket(self.region.id, self.office.id)
+        QueueTicket.objects.filter(id=ticket1.id).update(status='CALLED')
+        
+        with transaction.atomic():
+            claimed = claim_next_ticket(self.office.id, self.counter.id)
+        self.assertEqual(claimed.id, ticket2.id)
+        self.assertIsNone(claim_next_ticket(self.office.id, self.counter.id))
+    
     def test_call_next_ticket_no_waiting(self):
         result = call_next_ticket(self.counter.id)
         self.assertIsNone(result)
@@ -53,6 +106,13 @@ class TicketServiceTestCase(TestCase):
         self.assertEqual(ticket.status, 'SERVED')
         self.assertIsNotNone(ticket.served_at)
     
+    def test_start_service_requires_called(self):
+        ticket = create_ticket(self.region.id, self.office.id)
+        
+        with self.assertRaises(InvalidTransition) as context:
+            start_service(ticket.id)
+        self.assertEqual(context.exception.current_status, 'WAITING')
+    
     def test_status_flow(self):
         ticket = create_ticket(self.region.id, self.office.id)
         self.assertEqual(ticket.status, 'WAITING')
@@ -65,3 +125,618 @@ class TicketServiceTestCase(TestCase):
         
         ticket = complete_service(ticket.id)
         self.assertEqual(ticket.status, 'SERVED')
+
+    
+    def test_service_stats_recorded(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket = create_ticket(self.region.id, self.office.id)
+            ticket = call_next_ticket(self.counter.id)
+            ticket = start_service(ticket.id)
+            ticket = complete_service(ticket.id)
+        
+        stats = OfficeDailyStats.objects.get(office=self.office)
+        self.assertEqual(stats.called_count, 1)
+        self.assertEqual(stats.served_count, 1)
+        expected = (ticket.served_at - ticket.called_at).total_seconds()
+        self.assertAlmostEqual(calculate_average_service_time(self.office.id).total_seconds(), expected, places=3)
+    
+    def test_service_stats_window(self):
+        today = timezone.localdate()
+        OfficeDailyStats.record_service(self.office.id, today - timedelta(days=1), 100)
+        OfficeDailyStats.record_service(self.office.id, today, 60)
+        OfficeDailyStats.record_service(self.office.id, today, 20)
+        
+        self.assertAlmostEqual(get_office_service_stats(self.office.id)['average_service_seconds'], 60)
+        stats = get_office_service_stats(self.office.id, start_date=today)
+        self.assertEqual(stats['served_count'], 2)
+        self.assertAlmostEqual(stats['average_service_seconds'], 40)
+        self.assertAlmostEqual(stats['service_stddev_seconds'], 20)
+        self.assertIsNone(calculate_average_service_time(self.office.id, end_date=today - timedelta(days=2)))
+    
+    def test_activity_feed_most_recent_first(self):
+        ticket1 = create_ticket(self.region.id, self.office.id)
+        ticket2 = create_ticket(self.region.id, self.office.id)
+        call_next_ticket(self.counter.id)
+        
+        with self.assertNumQueries(1):
+            recent = list(get_recent_office_activity(self.office.id))
+            counter_names = [t.counter.name if t.counter else None for t in recent]
+        self.assertEqual([t.id for t in recent], [ticket1.id, ticket2.id])
+        self.assertEqual(counter_names, ['Counter 1', None])
+        
+        feed = get_supervisor_dashboard_data(self.office.id)['activity_feed']
+        self.assertEqual(feed[0]['ticket_number'], ticket1.ticket_number)
+        self.assertEqual(feed[0]['status'], 'CALLED')
+        self.assertEqual(feed[0]['counter_name'], 'Counter 1')
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BulkCreateTestCase(TestCase):
+    """Test batch ticket creation"""
+    
+    def setUp(self):
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+    
+    def test_contiguous_numbers_after_single_create(self):
+        first = create_ticket(self.region.id, self.office.id)
+        tickets = create_tickets_bulk([
+            {'region_id': self.region.id, 'office_id': self.office.id}
+            for _ in range(3)
+        ])
+        
+        numbers = [int(t.ticket_number.rsplit('-', 1)[1]) for t in [first] + tickets]
+        self.assertEqual(numbers, [1, 2, 3, 4])
+        self.assertTrue(all(t.id for t in tickets))
+        self.assertEqual(QueueTicket.objects.filter(status='WAITING').count(), 4)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class EventOutboxTestCase(TestCase):
+    """Test that broadcasts are only sent for committed transactions"""
+    
+    def setUp(self):
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+        self.counter = Counter.objects.create(name='Counter 1', office=self.office)
+    
+    def test_events_sent_on_commit(self):
+        with mock.patch('apps.queue.services.events._deliver') as deliver:
+            with self.captureOnCommitCallbacks(execute=True):
+                ticket = create_ticket(self.region.id, self.office.id)
+                deliver.assert_not_called()
+        
+        deliver.assert_called_once()
+        groups, event_type, data = deliver.call_args.args[0][0]
+        self.assertEqual(groups, (f'office_{self.office.id}', f'region_{self.region.id}'))
+        self.assertEqual(event_type, 'TICKET_CREATED')
+        self.assertEqual(data['ticket_id'], ticket.id)
+    
+    def test_call_next_single_publish(self):
+        create_ticket(self.region.id, self.office.id)
+        with mock.patch('apps.queue.services.events._deliver') as deliver:
+            with self.captureOnCommitCallbacks(execute=True):
+                call_next_ticket(self.counter.id)
+        
+        deliver.assert_called_once()
+        groups, event_type, data = deliver.call_args.args[0][0]
+        self.assertEqual(len(groups), 3)
+        self.assertIn(f'counter_{self.counter.id}', groups)
+        self.assertEqual(event_type, 'TICKET_CALLED')
+    
+    def test_complete_and_call_next_single_publish(self):
+        create_ticket(self.region.id, self.office.id)
+        create_ticket(self.region.id, self.office.id)
+        serving = start_service(call_next_ticket(self.counter.id).id)
+        with mock.patch('apps.queue.services.events._deliver') as deliver:
+            with self.captureOnCommitCallbacks(execute=True):
+                completed, called = complete_and_call_next(self.counter.id, serving.id)
+        
+        deliver.assert_called_once()
+        groups, event_type, data = deliver.call_args.args[0][0]
+        self.assertEqual(len(groups), 3)
+        self.assertEqual(event_type, 'SERVICE_COMPLETED_AND_CALLED')
+        self.assertEqual(data['completed']['ticket_id'], completed.id)
+        self.assertEqual(data['called']['ticket_id'], called.id)
+        self.assertEqual(OfficeDailyStats.objects.get(office=self.office).served_count, 1)
+    
+    def test_bulk_create_one_publish_per_office(self):
+        office2 = Office.objects.create(name='Branch Office', region=self.region)
+        items = [
+            {'region_id': self.region.id, 'office_id': self.office.id},
+            {'region_id': self.region.id, 'office_id': office2.id},
+            {'region_id': self.region.id, 'office_id': self.office.id},
+        ]
+        with mock.patch('apps.queue.services.events._deliver') as deliver:
+            with self.captureOnCommitCallbacks(execute=True):
+                tickets = create_tickets_bulk(items)
+        
+        self.assertEqual(len(tickets), 3)
+        self.assertEqual(deliver.call_count, 2)
+        groups, event_type, data = deliver.call_args_list[0].args[0][0]
+        self.assertEqual(groups, (f'office_{self.office.id}', f'region_{self.region.id}'))
+        self.assertEqual(event_type, 'TICKETS_CREATED')
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([t['ticket_id'] for t in data['tickets']], [tickets[0].id, tickets[2].id])
+    
+    def test_events_dropped_on_rollback(self):
+        with mock.patch('apps.queue.services.events._deliver') as deliver:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                try:
+                    with transaction.atomic():
+                        create_ticket(self.region.id, self.office.id)
+                        raise RuntimeError('rollback')
+                except RuntimeError:
+                    pass
+        
+        self.assertEqual(callbacks, [])
+        deliver.assert_not_called()
+    
+    def test_stats_failure_after_commit(self):
+        create_ticket(self.region.id, self.office.id)
+        with mock.patch.object(OfficeDailyStats, 'record_wait', side_effect=RuntimeError('database is locked')):
+            with mock.patch('apps.queue.services.events._deliver') as deliver:
+                with self.assertLogs(level='ERROR'):
+                    with self.captureOnCommitCallbacks(execute=True):
+                        ticket = call_next_ticket(self.counter.id)
+        
+        self.assertEqual(ticket.status, 'CALLED')
+        self.assertEqual(deliver.call_args.args[0][0][1], 'TICKET_CALLED')
+    
+    @override_settings(QUEUE_OUTBOX_ASYNC=False)
+    def test_inline_send_failure_after_commit(self):
+        with mock.patch('apps.queue.services.events.send_batch', new_callable=mock.AsyncMock, side_effect=ConnectionError):
+            with self.assertLogs('apps.queue.services.events', level='ERROR'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    ticket = create_ticket(self.region.id, self.office.id)
+        
+        self.assertTrue(QueueTicket.objects.filter(id=ticket.id).exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ServiceMetricsTestCase(TestCase):
+    """Test service and broadcast instrumentation"""
+    
+    def setUp(self):
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+        self.counter = Counter.objects.create(name='Counter 1', office=self.office)
+    
+    def _counter(self, name, **labels):
+        return metrics.snapshot()['counters'].get(metrics._encode_key(metrics._key(name, labels)), 0)
+    
+    def _histogram_count(self, name, **labels):
+        buckets = metrics.snapshot()['histograms'].get(metrics._encode_key(metrics._key(name, labels)))
+        return sum(buckets[:-1]) if buckets else 0
+    
+    def test_service_calls_and_queries_recorded(self):
+        calls = self._counter('queue_service_calls_total', service='create_ticket', outcome='ok')
+        queries = self._counter('queue_service_queries_total', service='create_ticket')
+        durations = self._histogram_count('queue_service_duration_seconds', service='create_ticket')
+        
+        create_ticket(self.region.id, self.office.id)
+        
+        self.assertEqual(self._counter('queue_service_calls_total', service='create_ticket', outcome='ok'), calls + 1)
+        self.assertGreater(self._counter('queue_service_queries_total', service='create_ticket'), queries)
+        self.assertEqual(self._histogram_count('queue_service_duration_seconds', service='create_ticket'), durations + 1)
+    
+    def test_failed_service_call_recorded(self):
+        errors = self._counter('queue_service_calls_total', service='start_service', outcome='error')
+        ticket = create_ticket(self.region.id, self.office.id)
+        
+        with self.assertRaises(InvalidTransition):
+            start_service(ticket.id)
+        
+        self.assertEqual(self._counter('queue_service_calls_total', service='start_service', outcome='error'), errors + 1)
+    
+    @override_settings(
+        QUEUE_OUTBOX_ASYNC=False,
+        CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+    )
+    def test_broadcast_recorded(self):
+        sent = self._counter('queue_events_sent_total', event_type='TICKET_CREATED')
+        broadcasts = self._histogram_count('queue_broadcast_seconds')
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            create_ticket(self.region.id, self.office.id)
+        
+        self.assertEqual(self._counter('queue_events_sent_total', event_type='TICKET_CREATED'), sent + 1)
+        self.assertEqual(self._histogram_count('queue_broadcast_seconds'), broadcasts + 1)
+    
+    @skipIf(fakeredis is None, 'fakeredis not installed')
+    @override_settings(QUEUE_METRICS_URL='redis://metrics', QUEUE_METRICS_FLUSH_INTERVAL=5)
+    def test_collect_sums_live_processes(self):
+        redis = fakeredis.FakeRedis()
+        for patcher in (
+            mock.patch.object(metrics, '_client', return_value=redis),
+            mock.patch.object(metrics, '_ensure_publisher')
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        key = metrics._encode_key(metrics._key('queue_service_calls_total', {'service': 'other', 'outcome': 'ok'}))
+        worker = {'counters': {key: 3}, 'histograms': {}, 'gauges': {}}
+        redis.hset(metrics.METRICS_KEY, 'worker-1', json.dumps({'time': time.time(), 'metrics': worker}))
+        redis.hset(metrics.METRICS_KEY, 'worker-2', json.dumps({'time': time.time(), 'metrics': worker}))
+        redis.hset(metrics.METRICS_KEY, 'dead', json.dumps({'time': time.time() - 60, 'metrics': worker}))
+        
+        collected = metrics.collect()
+        
+        self.assertEqual(collected['counters'][key], 6)
+        self.assertIn(metrics._process_id().encode(), redis.hkeys(metrics.METRICS_KEY))
+        self.assertNotIn(b'dead', redis.hkeys(metrics.METRICS_KEY))
+    
+    def test_exited_thread_counts_retired(self):
+        def record():
+            metrics.inc('queue_service_calls_total', 5, service='worker', outcome='ok')
+            metrics.observe('queue_service_duration_seconds', 0.01, service='worker')
+        
+        before = self._counter('queue_service_calls_total', service='worker', outcome='ok')
+        durations = self._histogram_count('queue_service_duration_seconds', service='worker')
+        worker = threading.Thread(target=record)
+        worker.start()
+        worker.join()
+        
+        self.assertEqual(self._counter('queue_service_calls_total', service='worker', outcome='ok'), before + 5)
+        self.assertNotIn(worker, [thread for thread, _ in metrics._registries])
+        self.assertEqual(self._counter('queue_service_calls_total', service='worker', outcome='ok'), before + 5)
+        self.assertEqual(self._histogram_count('queue_service_duration_seconds', service='worker'), durations + 1)
+    
+    def test_render_exact_values(self):
+        key = metrics._encode_key(metrics._key('queue_events_sent_total', {'event_type': 'TICKET_CREATED'}))
+        text = metrics.render({'counters': {key: 1234567.0}, 'histograms': {}, 'gauges': {}}, [
+            ('queue_ws_open_connections', {}, 12345678901),
+            ('queue_ws_lagging_connections', {}, 0.125)
+        ])
+        
+        self.assertIn('queue_events_sent_total{event_type="TICKET_CREATED"} 1234567\n', text)
+        self.assertIn('queue_ws_open_connections 12345678901\n', text)
+        self.assertIn('queue_ws_lagging_connections 0.125\n', text)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ArchiveTestCase(TestCase):
+    """Test archival of old SERVED tickets into ticket history"""
+    
+    def setUp(self):
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+        self.counter = Counter.objects.create(name='Counter 1', office=self.office)
+    
+    def _ticket(self, status, days_ago=0):
+        served_at = timezone.now() - timedelta(days=days_ago)
+        return QueueTicket.objects.create(
+            region=self.region,
+            office=self.office,
+            counter=self.counter if status != 'WAITING' else None,
+            status=status,
+            called_at=served_at - timedelta(minutes=5) if status != 'WAITING' else None,
+            served_at=served_at if status == 'SERVED' else None
+        )
+    
+    def test_moves_only_old_served_tickets(self):
+        old = [self._ticket('SERVED', days_ago=40) for _ in range(5)]
+        recent = self._ticket('SERVED', days_ago=1)
+        waiting = self._ticket('WAITING')
+        
+        archived = archive_served_tickets(archive_cutoff(30), batch_size=2)
+        
+        self.assertEqual(archived, 5)
+        self.assertEqual(
+            set(QueueTicket.objects.values_list('id', flat=True)),
+            {recent.id, waiting.id}
+        )
+        history = TicketHistory.objects.get(ticket_id=old[0].id)
+        self.assertEqual(history.ticket_number, old[0].ticket_number)
+        self.assertEqual(history.counter_id, self.counter.id)
+        self.assertEqual(history.served_at, old[0].served_at)
+        self.assertEqual(archive_served_tickets(archive_cutoff(30)), 0)
+    
+    def test_reports_progress_per_batch(self):
+        for _ in range(5):
+            self._ticket('SERVED', days_ago=40)
+        totals = []
+        
+        with mock.patch('apps.queue.services.archive.time.sleep') as sleep:
+            archive_served_tickets(archive_cutoff(30), batch_size=2, sleep=0.5, progress=totals.append)
+        
+        self.assertEqual(totals, [2, 4, 5])
+        self.assertEqual(sleep.call_count, 2)
+    
+    def test_failed_batch_rolls_back(self):
+        ticket = self._ticket('SERVED', days_ago=40)
+        
+        with mock.patch('django.db.models.query.QuerySet.delete', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                archive_served_tickets(archive_cutoff(30))
+        
+        self.assertTrue(QueueTicket.objects.filter(id=ticket.id).exists())
+        self.assertFalse(TicketHistory.objects.exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class WaitEstimateTestCase(TestCase):
+    """Test live wait estimates"""
+    
+    def setUp(self):
+        cache.clear()
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+        self.counter = Counter.objects.create(name='Counter 1', office=self.office)
+        Counter.objects.create(name='Counter 2', office=self.office)
+    
+    def create(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_ticket(self.region.id, self.office.id)
+    
+    def test_created_event_carries_estimate(self):
+        self.create()
+        with mock.patch('apps.queue.services.events._deliver') as deliver:
+            self.create()
+        
+        _, event_type, data = deliver.call_args.args[0][0]
+        self.assertEqual(event_type, 'TICKET_CREATED')
+        estimate = data['wait_estimate']
+        self.assertEqual(estimate['position'], 1)
+        self.assertEqual(estimate['waiting_count'], 2)
+        self.assertEqual(estimate['active_counters'], 2)
+        # Two tickets at 300s each over two counters
+        self.assertEqual(estimate['estimated_wait_seconds'], 300.0)
+    
+    def test_positions_advance_on_call(self):
+        tickets = [self.create() for _ in range(3)]
+        self.assertEqual(get_ticket_eta(tickets[2].id)['position'], 2)
+        
+        with mock.patch('apps.queue.services.events._deliver') as deliver:
+            with self.captureOnCommitCallbacks(execute=True):
+                call_next_ticket(self.counter.id)
+        
+        _, event_type, data = deliver.call_args.args[0][0]
+        self.assertEqual(event_type, 'TICKET_CALLED')
+        self.assertEqual(data['wait_estimate']['waiting_count'], 2)
+        eta = get_ticket_eta(tickets[2].id)
+        self.assertEqual(eta['position'], 1)
+        self.assertEqual(eta['waiting_count'], 2)
+        self.assertIsNone(get_ticket_eta(tickets[0].id)['position'])
+    
+    def test_service_time_moving_average(self):
+        ticket = self.create()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_next_ticket(self.counter.id)
+        start_service(ticket.id)
+        QueueTicket.objects.filter(id=ticket.id).update(called_at=timezone.now() - timedelta(seconds=100))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_service(ticket.id)
+        
+        # Default 300s moved a fifth of the way towards the 100s sample
+        self.assertAlmostEqual(estimate_office(self.office.id)['average_service_seconds'], 260.0, places=0)
+    
+    def test_reseeds_from_database(self):
+        tickets = [self.create() for _ in range(2)]
+        cache.clear()
+        
+        eta = get_ticket_eta(tickets[1].id)
+        self.assertEqual(eta['status'], 'WAITING')
+        self.assertEqual(eta['position'], 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_ticket_eta(tickets[1].id)['position'], 1)
+    
+    def test_no_active_counters(self):
+        Counter.objects.filter(office=self.office).update(is_active=False)
+        self.assertIsNone(estimate_office(self.office.id)['estimated_wait_seconds'])
+    
+    def test_cache_failure_leaves_estimate_empty(self):
+        # Estimates are read after commit, so the ticket is still created and announced
+        with mock.patch.object(wait_estimates, '_load', side_effect=ConnectionError('cache down')), \
+                mock.patch('apps.queue.services.events._deliver') as deliver, \
+                self.assertLogs(level='ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                ticket = create_ticket(self.region.id, self.office.id)
+        
+        _, event_type, data = deliver.call_args.args[0][0]
+        self.assertEqual(event_type, 'TICKET_CREATED')
+        self.assertEqual(data['ticket_id'], ticket.id)
+        self.assertIsNone(data['wait_estimate'])
+
+
+def make_ticket(region, office, created_at, called_at=None, served_at=None):
+    """Create a ticket with explicit lifecycle timestamps"""
+    ticket = QueueTicket.objects.create(region=region, office=office)
+    status = 'SERVED' if served_at else 'SERVING' if called_at else 'WAITING'
+    QueueTicket.objects.filter(id=ticket.id).update(
+        status=status,
+        created_at=created_at,
+        called_at=called_at,
+        served_at=served_at,
+        updated_at=served_at or called_at or created_at
+    )
+    return ticket
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class HourlyRollupTestCase(TestCase):
+    """Test hourly office rollups"""
+    
+    def setUp(self):
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+        self.day = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=2)
+        at = lambda hour, minute: self.day + timedelta(hours=hour, minutes=minute)
+        self.at = at
+        # Queue grows to 3 at 10:12, then calls at 10:15 and 11:05 bring it down
+        make_ticket(self.region, self.office, at(10, 5), at(10, 15), at(10, 20))
+        make_ticket(self.region, self.office, at(10, 10), at(11, 5))
+        make_ticket(self.region, self.office, at(10, 12))
+    
+    def _rows(self):
+        return {row.hour: row for row in OfficeHourlyRollup.objects.filter(office=self.office)}
+    
+    def test_counts_histograms_and_peak(self):
+        rollup_range(self.day, self.day + timedelta(days=1))
+        
+        rows = self._rows()
+        ten, eleven = rows[self.at(10, 0)], rows[self.at(11, 0)]
+        self.assertEqual((ten.created_count, ten.called_count, ten.served_count), (3, 1, 1))
+        self.assertEqual((ten.wait_time_sum, ten.wait_le_600), (600, 1))
+        self.assertEqual((ten.service_time_sum, ten.service_le_300), (300, 1))
+        self.assertEqual(ten.max_waiting, 3)
+        self.assertEqual((eleven.created_count, eleven.called_count, eleven.wait_le_3600), (0, 1, 1))
+        self.assertEqual(eleven.max_waiting, 2)
+        self.assertEqual(len(rows), 2)
+    
+    def test_incremental_runs_match_full_rebuild(self):
+        rollup_range(self.day, self.at(11, 0))
+        self.assertEqual(list(self._rows()), [self.at(10, 0)])
+        
+        start, _, _ = rollup_pending(now=self.at(11, 30))
+        self.assertEqual(start, self.at(10, 0))
+        incremental = {hour: row.max_waiting for hour, row in self._rows().items()}
+        
+        rollup_range(self.day, self.day + timedelta(days=1))
+        self.assertEqual({hour: row.max_waiting for hour, row in self._rows().items()}, incremental)
+    
+    def test_range_bounded_on_both_ends(self):
+        # Waiting since before the range and called the day after it
+        make_ticket(self.region, self.office, self.at(9, 50), self.at(34, 0))
+        # Created and called before the range, served inside it
+        make_ticket(self.region, self.office, self.at(9, 0), self.at(9, 30), self.at(10, 40))
+        make_ticket(self.region, self.office, self.at(12, 0))
+        rollup_range(self.at(10, 0), self.at(11, 0))
+        
+        rows = self._rows()
+        ten = rows[self.at(10, 0)]
+        self.assertEqual(list(rows), [self.at(10, 0)])
+        self.assertEqual((ten.created_count, ten.called_count, ten.served_count), (3, 1, 2))
+        self.assertEqual(ten.max_waiting, 4)
+    
+    def test_archived_tickets_included(self):
+        archive_served_tickets(self.at(12, 0))
+        rollup_range(self.day, self.day + timedelta(days=1))
+        
+        self.assertEqual(TicketHistory.objects.count(), 1)
+        self.assertEqual(self._rows()[self.at(10, 0)].served_count, 1)
+    
+    def test_estimate_percentile(self):
+        self.assertEqual(estimate_percentile((60, 120, None), [2, 2, 0], 50), 60)
+        self.assertEqual(estimate_percentile((60, 120, None), [0, 2, 2], 90), 120)
+        self.assertIsNone(estimate_percentile((60, None), [0, 0], 50))
+
+
+@skipIf(fakeredis is None, 'fakeredis not installed')
+@override_settings(CACHES=LOCMEM_CACHES, QUEUE_LIVE_INDEX_ENABLED=True)
+class LiveIndexTestCase(TestCase):
+    """Test Redis live queue index maintenance"""
+    
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patcher = mock.patch.object(live_index, 'get_client', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+        self.counter = Counter.objects.create(name='Counter 1', office=self.office)
+    
+    def _create(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_ticket(self.region.id, self.office.id)
+    
+    def test_lifecycle_maintains_index(self):
+        ticket1 = self._create()
+        self._create()
+        self.assertEqual(live_index.get_live_counts(self.office.id), (2, 0))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            called = call_next_ticket(self.counter.id)
+        self.assertEqual(called.id, ticket1.id)
+        self.assertEqual(live_index.get_live_counts(self.office.id), (1, 1))
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            start_service(called.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_service(called.id)
+        self.assertEqual(live_index.get_live_counts(self.office.id), (1, 0))
+        
+        dashboard = get_supervisor_dashboard_data(self.office.id)
+        self.assertEqual(dashboard['waiting_count'], 1)
+        self.assertEqual(dashboard['served_count'], 1)
+    
+    def test_dashboard_counts_from_index(self):
+        Counter.objects.create(name='Counter 2', office=self.office)
+        Counter.objects.create(name='Closed', office=self.office, is_active=False)
+        for _ in range(3):
+            self._create()
+        with self.captureOnCommitCallbacks(execute=True):
+            called = call_next_ticket(self.counter.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            start_service(called.id)
+        
+        with mock.patch('apps.queue.services.services.get_office_queue_stats') as queue_stats, \
+                mock.patch('apps.queue.services.services.get_idle_counters') as idle_counters:
+            dashboard = get_supervisor_dashboard_data(self.office.id)
+        
+        queue_stats.assert_not_called()
+        idle_counters.assert_not_called()
+        self.assertEqual(
+            {key: dashboard[key] for key in (
+                'waiting_count', 'called_count', 'serving_count', 'served_count', 'active_counters', 'idle_counters'
+            )},
+            {
+                'waiting_count': 2, 'called_count': 0, 'serving_count': 1, 'served_count': 0,
+                'active_counters': 1, 'idle_counters': 1
+            }
+        )
+        
+        live_index.rebuild()
+        self.assertEqual(live_index.get_office_counts(self.office.id), ({
+            'waiting_count': 2, 'called_count': 0, 'serving_count': 1, 'served_count': 0
+        }, {self.counter.id}))
+    
+    def test_rollback_restores_popped_ticket(self):
+        ticket1 = self._create()
+        self._create()
+        
+        with mock.patch(
+            'apps.queue.services.services.schedule_claim_bookkeeping', side_effect=RuntimeError('boom')
+        ):
+            with self.assertRaises(RuntimeError):
+                call_next_ticket(self.counter.id)
+        
+        self.assertEqual(QueueTicket.objects.get(id=ticket1.id).status, 'WAITING')
+        self.assertEqual(live_index.waiting_position(self.office.id, ticket1.id), 0)
+        self.assertEqual(call_next_ticket(self.counter.id).id, ticket1.id)
+    
+    def test_archive_updates_served_count(self):
+        ticket = self._create()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_next_ticket(self.counter.id)
+        start_service(ticket.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_service(ticket.id)
+        self.assertEqual(live_index.get_office_counts(self.office.id)[0]['served_count'], 1)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            archive_served_tickets(timezone.now() + timedelta(minutes=1))
+        self.assertEqual(live_index.get_office_counts(self.office.id)[0]['served_count'], 0)
+    
+    def test_stale_entry_skipped(self):
+        ticket1 = self._create()
+        ticket2 = self._create()
+        QueueTicket.objects.filter(id=ticket1.id).update(status='SERVED')
+        
+        called = call_next_ticket(self.counter.id)
+        self.assertEqual(called.id, ticket2.id)
+        self.assertEqual(live_index.get_live_counts(self.office.id)[0], 0)
+    
+    def test_empty_index_falls_back_to_database(self):
+        ticket = create_ticket(self.region.id, self.office.id)
+        self.assertEqual(call_next_ticket(self.counter.id).id, ticket.id)
+    
+    def test_rebuild(self):
+        ticket1 = create_ticket(self.region.id, self.office.id)
+        ticket2 = create_ticket(self.region.id, self.office.id)
+        QueueTicket.objects.filter(id=ticket1.id).update(status='SERVING', counter=self.counter)
+        self.redis.zadd(f'queue:live:office:{self.office.id}:waiting', {999: 1.0})
+        
+        live_index.rebuild()
+        self.assertEqual(live_index.get_live_counts(self.office.id), (1, 1))
+        self.assertEqual(live_index.waiting_position(self.office.id, ticket2.id), 0)
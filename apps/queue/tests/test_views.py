@@ -1,13 +1,21 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.utils import timezone
+from django.test import AsyncClient, TestCase, override_settings
 from rest_framework.test import APIClient
 from rest_framework import status
 from apps.queue.models import Region, Office, Counter, QueueTicket
+from apps.queue.services import create_ticket, estimate_office, reserve_idempotency_key, rollup_range
+from apps.queue.tests.utils import LOCMEM_CACHES
 
 
+@override_settings(CACHES=LOCMEM_CACHES)
 class TicketAPITestCase(TestCase):
     """Test ticket API endpoints"""
     
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.region = Region.objects.create(name='Dar es Salaam')
         self.office = Office.objects.create(name='Main Office', region=self.region)
@@ -61,6 +69,114 @@ class TicketAPITestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['status'], 'SERVED')
     
+    def test_complete_and_call_next(self):
+        serving = QueueTicket.objects.create(
+            region=self.region,
+            office=self.office,
+            counter=self.counter,
+            status='SERVING'
+        )
+        waiting = create_ticket(self.region.id, self.office.id)
+        
+        response = self.client.post(
+            f'/api/counters/{self.counter.id}/complete-and-call-next/',
+            {'ticket_id': serving.id},
+            format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['completed']['status'], 'SERVED')
+        self.assertEqual(response.data['ticket']['id'], waiting.id)
+        self.assertEqual(response.data['ticket']['status'], 'CALLED')
+    
+    def test_complete_and_call_next_empty_queue(self):
+        serving = QueueTicket.objects.create(
+            region=self.region,
+            office=self.office,
+            counter=self.counter,
+            status='SERVING'
+        )
+        
+        response = self.client.post(
+            f'/api/counters/{self.counter.id}/complete-and-call-next/',
+            {'ticket_id': serving.id},
+            format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['ticket'])
+    
+    def test_complete_and_call_next_other_counter(self):
+        counter2 = Counter.objects.create(name='Counter 2', office=self.office)
+        serving = QueueTicket.objects.create(
+            region=self.region,
+            office=self.office,
+            counter=counter2,
+            status='SERVING'
+        )
+        create_ticket(self.region.id, self.office.id)
+        
+        response = self.client.post(
+            f'/api/counters/{self.counter.id}/complete-and-call-next/',
+            {'ticket_id': serving.id},
+            format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        serving.refresh_from_db()
+        self.assertEqual(serving.status, 'SERVING')
+        self.assertEqual(QueueTicket.objects.filter(status='WAITING').count(), 1)
+    
+    def test_start_service_query_count(self):
+        ticket = QueueTicket.objects.create(
+            region=self.region,
+            office=self.office,
+            counter=self.counter,
+            status='CALLED'
+        )
+        
+        # Guarded UPDATE + one select_related read for the response; the
+        # after-commit bookkeeping (live index, dashboard cache) runs no queries
+        with self.assertNumQueries(2), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/tickets/{ticket.id}/start-service/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['counter_name'], 'Counter 1')
+    
+    def test_complete_service_query_count(self):
+        ticket = QueueTicket.objects.create(
+            region=self.region,
+            office=self.office,
+            counter=self.counter,
+            status='SERVING',
+            called_at=timezone.now()
+        )
+        # Wait estimates are seeded once per office, not per request
+        estimate_office(self.office.id)
+        
+        # Guarded UPDATE + one select_related read, then the after-commit
+        # service time upsert into the office's daily stats
+        with self.assertNumQueries(3), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/tickets/{ticket.id}/complete-service/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(response.data['served_at'])
+    
+    def test_illegal_transition(self):
+        ticket = QueueTicket.objects.create(
+            region=self.region,
+            office=self.office,
+            status='WAITING'
+        )
+        
+        response = self.client.post(f'/api/tickets/{ticket.id}/complete-service/')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['error'], 'Ticket must be SERVING status, current status: WAITING')
+        ticket.refresh_from_db()
+        self.assertEqual(ticket.status, 'WAITING')
+    
+    def test_transition_missing_ticket(self):
+        response = self.client.post('/api/tickets/999999/start-service/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
     def test_supervisor_status(self):
         QueueTicket.objects.create(
             region=self.region,
@@ -73,3 +189,459 @@ class TicketAPITestCase(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('waiting_count', response.data)
         self.assertIn('active_counters', response.data)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class IdempotentTicketCreateTestCase(TestCase):
+    """Test kiosk retries with an Idempotency-Key"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+    
+    def post(self, key, office_id=None):
+        return self.client.post('/api/tickets/', {
+            'region_id': self.region.id,
+            'office_id': office_id or self.office.id
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+    
+    def test_retry_returns_original_ticket(self):
+        first = self.post('kiosk-1-0001')
+        with self.assertNumQueries(1):
+            retry = self.post('kiosk-1-0001')
+        
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(QueueTicket.objects.count(), 1)
+    
+    def test_distinct_keys_create_tickets(self):
+        self.post('kiosk-1-0001')
+        self.post('kiosk-1-0002')
+        self.assertEqual(QueueTicket.objects.count(), 2)
+    
+    def test_key_reused_for_other_office(self):
+        other = Office.objects.create(name='Branch Office', region=self.region)
+        self.post('kiosk-1-0001')
+        response = self.post('kiosk-1-0001', office_id=other.id)
+        
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(QueueTicket.objects.count(), 1)
+    
+    def test_key_in_progress(self):
+        reserve_idempotency_key('kiosk-1-0001', (self.region.id, self.office.id))
+        response = self.post('kiosk-1-0001')
+        
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(QueueTicket.objects.count(), 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TicketBulkCreateAPITestCase(TestCase):
+    """Test the batch ticket creation endpoint"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+    
+    def post(self, count, region_id=None):
+        return self.client.post('/api/tickets/bulk/', {
+            'tickets': [
+                {'region_id': region_id or self.region.id, 'office_id': self.office.id}
+                for _ in range(count)
+            ]
+        }, format='json')
+    
+    def test_bulk_create(self):
+        response = self.post(3)
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 3)
+        self.assertEqual({t['status'] for t in response.data}, {'WAITING'})
+        self.assertEqual(QueueTicket.objects.count(), 3)
+    
+    def test_bulk_create_region_mismatch(self):
+        other = Region.objects.create(name='Arusha')
+        response = self.post(2, region_id=other.id)
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(QueueTicket.objects.count(), 0)
+    
+    def test_bulk_create_query_count_constant(self):
+        self.post(1)
+        with self.assertNumQueries(6):
+            self.post(2)
+        with self.assertNumQueries(6):
+            self.post(50)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SupervisorDashboardCacheTestCase(TestCase):
+    """Test cached supervisor dashboard and conditional requests"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+        self.url = f'/api/supervisor/office/{self.office.id}/status/'
+    
+    def test_unchanged_poll_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+    
+    def test_cached_poll_without_db(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_state_change_invalidates(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            create_ticket(self.region.id, self.office.id)
+        
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['waiting_count'], 1)
+    
+    def test_cache_failure_after_commit(self):
+        def cache_unavailable(office_id):
+            raise ConnectionError('cache unavailable')
+        
+        with mock.patch('apps.queue.services.bookkeeping.invalidate_dashboard', cache_unavailable):
+            with mock.patch('apps.queue.services.events._deliver') as deliver:
+                with self.assertLogs(level='ERROR'):
+                    with self.captureOnCommitCallbacks(execute=True):
+                        ticket = create_ticket(self.region.id, self.office.id)
+        
+        self.assertTrue(QueueTicket.objects.filter(id=ticket.id).exists())
+        self.assertEqual(deliver.call_args.args[0][0][1], 'TICKET_CREATED')
+    
+    def test_invalid_window(self):
+        response = self.client.get(self.url, {'start_date': '2026-02-02', 'end_date': '2026-02-01'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TicketEtaAPITestCase(TestCase):
+    """Test the per-ticket wait estimate endpoint"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+        self.counter = Counter.objects.create(name='Counter 1', office=self.office)
+    
+    def create(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_ticket(self.region.id, self.office.id)
+    
+    def test_waiting_ticket_from_cache(self):
+        self.create()
+        ticket = self.create()
+        
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/tickets/{ticket.id}/eta/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'WAITING')
+        self.assertEqual(response.data['position'], 1)
+        self.assertEqual(response.data['estimated_wait_seconds'], 600.0)
+    
+    def test_called_ticket(self):
+        ticket = QueueTicket.objects.create(
+            region=self.region,
+            office=self.office,
+            counter=self.counter,
+            status='CALLED'
+        )
+        
+        response = self.client.get(f'/api/tickets/{ticket.id}/eta/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'CALLED')
+        self.assertIsNone(response.data['estimated_wait_seconds'])
+    
+    def test_unknown_ticket(self):
+        response = self.client.get('/api/tickets/999999/eta/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RegionDashboardAPITestCase(TestCase):
+    """Test the region-wide supervisor dashboard"""
+    
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+        self.branch = Office.objects.create(name='Branch Office', region=self.region)
+        self.counter = Counter.objects.create(name='Counter 1', office=self.office)
+        Counter.objects.create(name='Counter 2', office=self.office)
+        Counter.objects.create(name='Counter 1', office=self.branch)
+        self.url = f'/api/supervisor/region/{self.region.id}/status/'
+    
+    def add_offices(self, count):
+        for i in range(count):
+            office = Office.objects.create(name=f'Office {i}', region=self.region)
+            Counter.objects.create(name='Counter 1', office=office)
+            QueueTicket.objects.create(ticket_number=f'X{i}', region=self.region, office=office, status='WAITING')
+    
+    def test_per_office_counts(self):
+        for i in range(2):
+            QueueTicket.objects.create(ticket_number=f'A{i}', region=self.region, office=self.office, status='WAITING')
+        QueueTicket.objects.create(
+            ticket_number='A9', region=self.region, office=self.office, counter=self.counter, status='SERVING'
+        )
+        QueueTicket.objects.create(ticket_number='B1', region=self.region, office=self.branch, status='WAITING')
+        
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['waiting_count'], 3)
+        self.assertEqual(response.data['active_counters'], 1)
+        self.assertEqual(response.data['idle_counters'], 2)
+        offices = {office['office_id']: office for office in response.data['offices']}
+        self.assertEqual(offices[self.office.id]['waiting_count'], 2)
+        self.assertEqual(offices[self.office.id]['serving_count'], 1)
+        self.assertEqual(offices[self.office.id]['active_counters'], 1)
+        self.assertEqual(offices[self.office.id]['idle_counters'], 1)
+        self.assertEqual(offices[self.branch.id]['waiting_count'], 1)
+        self.assertEqual(offices[self.branch.id]['idle_counters'], 1)
+    
+    def test_constant_queries_per_region(self):
+        # One office id lookup plus four grouped queries, however many offices
+        with self.assertNumQueries(5):
+            self.client.get(self.url)
+        
+        self.add_offices(5)
+        cache.clear()
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['offices']), 7)
+        self.assertEqual(response.data['waiting_count'], 5)
+    
+    def test_unchanged_poll_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_office_change_invalidates(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            create_ticket(self.region.id, self.branch.id)
+        
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data['waiting_count'], 1)
+    
+    def test_unknown_region(self):
+        response = self.client.get('/api/supervisor/region/999999/status/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+)
+class AsyncTicketAPITestCase(TestCase):
+    """Test the async ticket/counter endpoints"""
+    
+    def setUp(self):
+        cache.clear()
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+        self.counter = Counter.objects.create(name='Counter 1', office=self.office)
+    
+    async def test_ticket_lifecycle(self):
+        client = AsyncClient()
+        created = await client.post('/api/async/tickets/', {
+            'region_id': self.region.id,
+            'office_id': self.office.id
+        }, content_type='application/json')
+        called = await client.post(f'/api/async/counters/{self.counter.id}/call-next/')
+        ticket_id = called.json()['ticket']['id']
+        started = await client.post(f'/api/async/tickets/{ticket_id}/start-service/')
+        completed = await client.post(f'/api/async/tickets/{ticket_id}/complete-service/')
+        
+        self.assertEqual(created.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(created.json()['office_name'], 'Main Office')
+        self.assertEqual(ticket_id, created.json()['id'])
+        self.assertEqual(called.json()['ticket']['status'], 'CALLED')
+        self.assertEqual(started.json()['status'], 'SERVING')
+        self.assertEqual(completed.json()['status'], 'SERVED')
+    
+    async def test_invalid_requests(self):
+        client = AsyncClient()
+        other = await Region.objects.acreate(name='Arusha')
+        mismatch = await client.post('/api/async/tickets/', {
+            'region_id': other.id,
+            'office_id': self.office.id
+        }, content_type='application/json')
+        empty = await client.post(f'/api/async/counters/{self.counter.id}/call-next/')
+        missing = await client.post('/api/async/tickets/999999/start-service/')
+        
+        unknown_counter = await client.post('/api/async/counters/999999/call-next/')
+        
+        self.assertEqual(mismatch.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(mismatch.json(), {'non_field_errors': ['Office does not belong to the specified region']})
+        self.assertEqual(empty.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(missing.json(), {'detail': 'Not found.'})
+        self.assertEqual(unknown_counter.json(), {'detail': 'No Counter matches the given query.'})
+    
+    async def test_idempotent_create(self):
+        client = AsyncClient()
+        other = await Office.objects.acreate(name='Branch Office', region=self.region)
+        
+        async def post(office_id):
+            return await client.post('/api/async/tickets/', {
+                'region_id': self.region.id,
+                'office_id': office_id
+            }, content_type='application/json', headers={'Idempotency-Key': 'kiosk-1-0001'})
+        
+        first = await post(self.office.id)
+        retry = await post(self.office.id)
+        conflict = await post(other.id)
+        
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(conflict.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(await QueueTicket.objects.acount(), 1)
+    
+    async def test_broadcast_failure_after_create(self):
+        client = AsyncClient()
+        
+        async def post():
+            return await client.post('/api/async/tickets/', {
+                'region_id': self.region.id,
+                'office_id': self.office.id
+            }, content_type='application/json', headers={'Idempotency-Key': 'kiosk-1-0001'})
+        
+        with mock.patch(
+            'apps.queue.services.events.send_batch', new_callable=mock.AsyncMock, side_effect=ConnectionError
+        ), self.assertLogs('apps.queue.services.events', 'ERROR'):
+            created = await post()
+        retry = await post()
+        
+        self.assertEqual(created.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json()['id'], created.json()['id'])
+        self.assertEqual(await QueueTicket.objects.acount(), 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AnalyticsAPITestCase(TestCase):
+    """Test office/region analytics read from hourly rollups"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+        self.branch = Office.objects.create(name='Branch Office', region=self.region)
+        self.day = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        for office, wait in ((self.office, 90), (self.office, 400), (self.branch, 30)):
+            ticket = QueueTicket.objects.create(region=self.region, office=office)
+            created_at = self.day + timedelta(hours=9)
+            QueueTicket.objects.filter(id=ticket.id).update(
+                status='SERVED',
+                created_at=created_at,
+                called_at=created_at + timedelta(seconds=wait),
+                served_at=created_at + timedelta(seconds=wait + 200),
+                updated_at=created_at + timedelta(seconds=wait + 200)
+            )
+        rollup_range(self.day, self.day + timedelta(days=1))
+        date = self.day.date().isoformat()
+        self.query = {'start_date': date, 'end_date': date}
+    
+    def test_office_analytics(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/analytics/office/{self.office.id}/', self.query)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['served_count'], 2)
+        self.assertEqual(response.data['peak_waiting'], 2)
+        self.assertEqual(response.data['wait']['average_seconds'], 245)
+        self.assertEqual(response.data['wait']['p50_seconds'], 120)
+        self.assertEqual(len(response.data['series']), 1)
+        self.assertEqual(response.data['served_per_hour'], 2 / 24)
+    
+    def test_served_per_hour_counts_elapsed_hours(self):
+        today = (self.day + timedelta(days=1)).date().isoformat()
+        with mock.patch('apps.queue.selectors.analytics.timezone.now', return_value=self.day + timedelta(hours=30)):
+            response = self.client.get(f'/api/analytics/office/{self.office.id}/', {**self.query, 'end_date': today})
+        
+        self.assertEqual(response.data['served_per_hour'], 2 / 30)
+    
+    def test_region_analytics(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                f'/api/analytics/region/{self.region.id}/',
+                {**self.query, 'interval': 'hour'}
+            )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['served_count'], 3)
+        self.assertEqual(response.data['peak_waiting'], 3)
+        self.assertEqual(response.data['series'][0]['served_count'], 3)
+        self.assertEqual(
+            [(office['office_id'], office['served_count']) for office in response.data['offices']],
+            [(self.office.id, 2), (self.branch.id, 1)]
+        )
+    
+    def test_invalid_queries(self):
+        reversed_range = self.client.get(f'/api/analytics/office/{self.office.id}/', {
+            'start_date': '2026-02-01', 'end_date': '2026-01-01'
+        })
+        too_long = self.client.get(f'/api/analytics/office/{self.office.id}/', {
+            'start_date': '2024-01-01', 'end_date': '2026-01-01'
+        })
+        missing = self.client.get('/api/analytics/region/999999/', self.query)
+        
+        self.assertEqual(reversed_range.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(too_long.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(missing.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MetricsEndpointTestCase(TestCase):
+    """Test the Prometheus metrics endpoint"""
+    
+    def setUp(self):
+        cache.clear()
+        self.region = Region.objects.create(name='Dar es Salaam')
+        self.office = Office.objects.create(name='Main Office', region=self.region)
+    
+    def test_metrics_exposition(self):
+        create_ticket(self.region.id, self.office.id)
+        create_ticket(self.region.id, self.office.id)
+        
+        response = self.client.get('/metrics')
+        body = response.content.decode()
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('# TYPE queue_service_duration_seconds histogram', body)
+        self.assertIn('queue_service_duration_seconds_bucket{service="create_ticket",le="+Inf"}', body)
+        self.assertIn(f'queue_tickets{{office_id="{self.office.id}",status="WAITING"}} 2', body)
+    
+    def test_metrics_get_only(self):
+        response = self.client.post('/metrics')
+        
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
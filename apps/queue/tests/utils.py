@@ -0,0 +1,10 @@
+"""
+Shared settings overrides for the queue tests.
+
+The dashboard cache, wait estimates, idempotency keys and event log all go
+through the default cache, which is Redis outside the tests. Test classes
+that touch them run on a per-process locmem cache instead, so they need no
+Redis and start from an empty cache.
+"""
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
@@ -2,14 +2,24 @@
 URL configuration for queue app.
 """
 from django.urls import path
-from apps.queue.views import views
+from apps.queue.views import views, async_views
 
 app_name = 'queue'
 
 urlpatterns = [
     path('tickets/', views.ticket_create_view, name='ticket-create'),
+    path('tickets/bulk/', views.ticket_bulk_create_view, name='ticket-bulk-create'),
     path('tickets/<int:ticket_id>/start-service/', views.ticket_start_service_view, name='ticket-start-service'),
     path('tickets/<int:ticket_id>/complete-service/', views.ticket_complete_service_view, name='ticket-complete-service'),
+    path('tickets/<int:ticket_id>/eta/', views.ticket_eta_view, name='ticket-eta'),
     path('counters/<int:counter_id>/call-next/', views.counter_call_next_view, name='counter-call-next'),
+    path('counters/<int:counter_id>/complete-and-call-next/', views.counter_complete_and_call_next_view, name='counter-complete-and-call-next'),
+    path('async/tickets/', async_views.ticket_create_view, name='async-ticket-create'),
+    path('async/tickets/<int:ticket_id>/start-service/', async_views.ticket_start_service_view, name='async-ticket-start-service'),
+    path('async/tickets/<int:ticket_id>/complete-service/', async_views.ticket_complete_service_view, name='async-ticket-complete-service'),
+    path('async/counters/<int:counter_id>/call-next/', async_views.counter_call_next_view, name='async-counter-call-next'),
     path('supervisor/office/<int:office_id>/status/', views.supervisor_office_status_view, name='supervisor-office-status'),
+    path('supervisor/region/<int:region_id>/status/', views.supervisor_region_status_view, name='supervisor-region-status'),
+    path('analytics/office/<int:office_id>/', views.office_analytics_view, name='office-analytics'),
+    path('analytics/region/<int:region_id>/', views.region_analytics_view, name='region-analytics'),
 ]
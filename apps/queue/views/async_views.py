@@ -0,0 +1,138 @@
+"""
+Async ticket and counter endpoints for ASGI deployments (/api/async/...).
+
+DRF views are synchronous, so under ASGI each one runs in a worker thread
+and its broadcasts hop back to the event loop through async_to_sync. These
+views run on the event loop itself, use the async services, and return the
+same payloads and status codes as their DRF counterparts.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from apps.queue.models import Counter, QueueTicket
+from apps.queue.serializers import QueueTicketSerializer, QueueTicketCreateSerializer
+from apps.queue.services import (
+    acreate_ticket,
+    acall_next_ticket,
+    astart_service,
+    acomplete_service,
+    InvalidTransition,
+    IdempotencyConflict,
+    MAX_IDEMPOTENCY_KEY_LENGTH,
+    reserve_idempotency_key,
+    store_idempotent_response,
+    release_idempotency_key
+)
+
+
+def _error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def _not_found(detail='Not found.'):
+    """404 body in DRF's shape (Http404 -> {'detail': ...})"""
+    return JsonResponse({'detail': detail}, status=404)
+
+
+async def _validate_ticket_request(request):
+    """Validate the body with QueueTicketCreateSerializer, returning (office, error_response)"""
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError as exc:
+        return None, JsonResponse({'detail': f'JSON parse error - {exc}'}, status=400)
+    
+    serializer = QueueTicketCreateSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return None, JsonResponse(serializer.errors, status=400)
+    return serializer.validated_data['office'], None
+
+
+def _ticket_create_response(ticket, office):
+    # Serializer reads region/office names: reuse the rows loaded by validation
+    ticket.office, ticket.region = office, office.region
+    return QueueTicketSerializer(ticket).data
+
+
+@csrf_exempt
+@require_POST
+async def ticket_create_view(request):
+    """Create ticket from kiosk (POST /api/async/tickets/), honouring Idempotency-Key like the DRF view"""
+    office, error = await _validate_ticket_request(request)
+    if error:
+        return error
+    
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if not idempotency_key:
+        ticket = await acreate_ticket(office.region_id, office.id)
+        return JsonResponse(_ticket_create_response(ticket, office), status=201)
+    
+    if len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        return _error(f'Idempotency-Key must be at most {MAX_IDEMPOTENCY_KEY_LENGTH} characters', 400)
+    
+    fingerprint = (office.region_id, office.id)
+    try:
+        original = await sync_to_async(reserve_idempotency_key)(idempotency_key, fingerprint)
+    except IdempotencyConflict as exc:
+        return _error(str(exc), 409)
+    if original is not None:
+        return JsonResponse(original, status=201, headers={'Idempotent-Replayed': 'true'})
+    
+    # Only a failed create frees the key: once the ticket exists a retry must replay it
+    try:
+        ticket = await acreate_ticket(office.region_id, office.id)
+    except Exception:
+        await sync_to_async(release_idempotency_key)(idempotency_key)
+        raise
+    
+    data = _ticket_create_response(ticket, office)
+    await sync_to_async(store_idempotent_response)(idempotency_key, fingerprint, data)
+    return JsonResponse(data, status=201)
+
+
+@csrf_exempt
+@require_POST
+async def counter_call_next_view(request, counter_id):
+    """Officer calls next ticket (POST /api/async/counters/{id}/call-next/)"""
+    counter = await Counter.objects.filter(id=counter_id).only('name', 'is_active').afirst()
+    if counter is None:
+        return _not_found('No Counter matches the given query.')
+    if not counter.is_active:
+        return _error('Counter is not active', 400)
+    
+    ticket = await acall_next_ticket(counter_id)
+    
+    if not ticket:
+        return JsonResponse({'message': 'No waiting tickets available'}, status=404)
+    
+    return JsonResponse({
+        'ticket': QueueTicketSerializer(ticket).data,
+        'message': f'Ticket {ticket.ticket_number} called to counter {counter.name}'
+    })
+
+
+async def _transition_response(transition, ticket_id):
+    """Run an async ticket transition and map its failures to HTTP errors"""
+    try:
+        ticket = await transition(ticket_id)
+    except QueueTicket.DoesNotExist:
+        return _not_found()
+    except InvalidTransition as exc:
+        return _error(str(exc), 400)
+    return JsonResponse(QueueTicketSerializer(ticket).data)
+
+
+@csrf_exempt
+@require_POST
+async def ticket_start_service_view(request, ticket_id):
+    """Start serving ticket (POST /api/async/tickets/{id}/start-service/)"""
+    return await _transition_response(astart_service, ticket_id)
+
+
+@csrf_exempt
+@require_POST
+async def ticket_complete_service_view(request, ticket_id):
+    """Complete service (POST /api/async/tickets/{id}/complete-service/)"""
+    return await _transition_response(acomplete_service, ticket_id)
@@ -1,36 +1,107 @@
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from django.http import Http404, HttpResponse
 from django.shortcuts import get_object_or_404
-from apps.queue.models import Counter, QueueTicket
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
+from apps.queue.models import Counter, Office, QueueTicket, Region
+from apps.queue.selectors import get_queue_depths, get_office_analytics, get_region_analytics
 from apps.queue.services import (
     create_ticket,
+    create_tickets_bulk,
     call_next_ticket,
     start_service,
     complete_service,
-    get_supervisor_dashboard_data
+    complete_and_call_next,
+    get_supervisor_dashboard_data,
+    get_region_dashboard_data,
+    get_dashboard_version,
+    dashboard_etag,
+    get_cached_dashboard,
+    get_dashboard_versions,
+    region_dashboard_digest,
+    region_dashboard_etag,
+    get_cached_region_dashboard,
+    get_ticket_eta,
+    InvalidTransition,
+    TicketNotAtCounter,
+    IdempotencyConflict,
+    MAX_IDEMPOTENCY_KEY_LENGTH,
+    reserve_idempotency_key,
+    store_idempotent_response,
+    release_idempotency_key,
+    metrics
 )
 from apps.queue.serializers import (
     QueueTicketSerializer,
     QueueTicketCreateSerializer,
+    QueueTicketBulkCreateSerializer,
     CounterCallNextSerializer,
-    SupervisorDashboardSerializer
+    CounterCompleteAndCallNextSerializer,
+    SupervisorDashboardSerializer,
+    RegionDashboardSerializer,
+    TicketEtaSerializer,
+    SupervisorDashboardQuerySerializer,
+    AnalyticsQuerySerializer
 )
 
 
 @api_view(['POST'])
 def ticket_create_view(request):
-    """Create ticket from kiosk (POST /api/tickets/)"""
+    """Create ticket from kiosk (POST /api/tickets/).
+    
+    Kiosks may send an Idempotency-Key header; repeats of a key within
+    QUEUE_IDEMPOTENCY_WINDOW return the original ticket instead of a new one.
+    """
     serializer = QueueTicketCreateSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
+    region_id = serializer.validated_data['region_id']
+    office_id = serializer.validated_data['office_id']
     
-    ticket = create_ticket(
-        region_id=serializer.validated_data['region_id'],
-        office_id=serializer.validated_data['office_id']
-    )
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if not idempotency_key:
+        ticket = create_ticket(region_id=region_id, office_id=office_id)
+        return Response(QueueTicketSerializer(ticket).data, status=status.HTTP_201_CREATED)
+    
+    if len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        return Response(
+            {'error': f'Idempotency-Key must be at most {MAX_IDEMPOTENCY_KEY_LENGTH} characters'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    fingerprint = (region_id, office_id)
+    try:
+        original = reserve_idempotency_key(idempotency_key, fingerprint)
+    except IdempotencyConflict as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
+    if original is not None:
+        return Response(original, status=status.HTTP_201_CREATED, headers={'Idempotent-Replayed': 'true'})
+    
+    try:
+        ticket = create_ticket(region_id=region_id, office_id=office_id)
+    except Exception:
+        release_idempotency_key(idempotency_key)
+        raise
+    
+    data = QueueTicketSerializer(ticket).data
+    store_idempotent_response(idempotency_key, fingerprint, data)
+    return Response(data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+def ticket_bulk_create_view(request):
+    """Create a batch of tickets (POST /api/tickets/bulk/)"""
+    serializer = QueueTicketBulkCreateSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    
+    tickets = create_tickets_bulk(serializer.validated_data['tickets'])
+    tickets = QueueTicket.objects.select_related(
+        'region', 'office', 'counter'
+    ).filter(id__in=[ticket.id for ticket in tickets]).order_by('id')
     
     return Response(
-        QueueTicketSerializer(ticket).data,
+        QueueTicketSerializer(tickets, many=True).data,
         status=status.HTTP_201_CREATED
     )
 
@@ -61,38 +132,140 @@ def counter_call_next_view(request, counter_id):
 
 
 @api_view(['POST'])
-def ticket_start_service_view(request, ticket_id):
-    """Start serving ticket (POST /api/tickets/{id}/start-service/)"""
-    ticket = get_object_or_404(QueueTicket, id=ticket_id)
+def counter_complete_and_call_next_view(request, counter_id):
+    """Complete the counter's SERVING ticket and call the next one (POST /api/counters/{id}/complete-and-call-next/)"""
+    serializer = CounterCompleteAndCallNextSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    counter = get_object_or_404(Counter, id=counter_id)
     
-    if ticket.status != 'CALLED':
+    if not counter.is_active:
         return Response(
-            {'error': f'Ticket must be CALLED status, current status: {ticket.status}'},
+            {'error': 'Counter is not active'},
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    ticket = start_service(ticket_id)
-    return Response(QueueTicketSerializer(ticket).data)
+    try:
+        completed, ticket = complete_and_call_next(counter_id, serializer.validated_data['ticket_id'])
+    except QueueTicket.DoesNotExist:
+        raise Http404
+    except (InvalidTransition, TicketNotAtCounter) as exc:
+        return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not ticket:
+        message = f'Ticket {completed.ticket_number} completed, no waiting tickets available'
+    else:
+        message = f'Ticket {completed.ticket_number} completed, ticket {ticket.ticket_number} called to counter {counter.name}'
+    
+    return Response({
+        'completed': QueueTicketSerializer(completed).data,
+        'ticket': QueueTicketSerializer(ticket).data if ticket else None,
+        'message': message
+    })
 
 
-@api_view(['POST'])
-def ticket_complete_service_view(request, ticket_id):
-    """Complete service (POST /api/tickets/{id}/complete-service/)"""
-    ticket = get_object_or_404(QueueTicket, id=ticket_id)
-    
-    if ticket.status != 'SERVING':
+def _transition_response(transition, ticket_id):
+    """Run a ticket transition service and map its failures to HTTP errors"""
+    try:
+        ticket = transition(ticket_id)
+    except QueueTicket.DoesNotExist:
+        raise Http404
+    except InvalidTransition as exc:
         return Response(
-            {'error': f'Ticket must be SERVING status, current status: {ticket.status}'},
+            {'error': str(exc)},
             status=status.HTTP_400_BAD_REQUEST
         )
-    
-    ticket = complete_service(ticket_id)
     return Response(QueueTicketSerializer(ticket).data)
 
 
+@api_view(['POST'])
+def ticket_start_service_view(request, ticket_id):
+    """Start serving ticket (POST /api/tickets/{id}/start-service/)"""
+    return _transition_response(start_service, ticket_id)
+
+
+@api_view(['POST'])
+def ticket_complete_service_view(request, ticket_id):
+    """Complete service (POST /api/tickets/{id}/complete-service/)"""
+    return _transition_response(complete_service, ticket_id)
+
+
+@api_view(['GET'])
+def ticket_eta_view(request, ticket_id):
+    """Get ticket's place in the queue and projected wait (GET /api/tickets/{ticket_id}/eta/)"""
+    eta = get_ticket_eta(ticket_id)
+    if eta is None:
+        raise Http404
+    return Response(TicketEtaSerializer(eta).data)
+
+
 @api_view(['GET'])
 def supervisor_office_status_view(request, office_id):
-    """Get office stats (GET /api/supervisor/office/{office_id}/status/)"""
-    dashboard_data = get_supervisor_dashboard_data(office_id)
+    """Get office stats (GET /api/supervisor/office/{office_id}/status/?start_date=&end_date=)"""
+    query = SupervisorDashboardQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+    window = query.validated_data
+    
+    version = get_dashboard_version(office_id)
+    etag = dashboard_etag(office_id, version, **window)
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    
+    dashboard_data = get_cached_dashboard(office_id, version, get_supervisor_dashboard_data, **window)
     serializer = SupervisorDashboardSerializer(dashboard_data)
-    return Response(serializer.data)
+    return Response(serializer.data, headers={'ETag': etag})
+
+
+@api_view(['GET'])
+def supervisor_region_status_view(request, region_id):
+    """Get stats for every office in region (GET /api/supervisor/region/{region_id}/status/?start_date=&end_date=)"""
+    query = SupervisorDashboardQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+    window = query.validated_data
+    
+    office_ids = list(Office.objects.filter(region_id=region_id).values_list('id', flat=True))
+    if not office_ids:
+        get_object_or_404(Region, id=region_id)
+    
+    digest = region_dashboard_digest(get_dashboard_versions(office_ids))
+    etag = region_dashboard_etag(region_id, digest, **window)
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    
+    dashboard_data = get_cached_region_dashboard(region_id, digest, get_region_dashboard_data, **window)
+    serializer = RegionDashboardSerializer(dashboard_data)
+    return Response(serializer.data, headers={'ETag': etag})
+
+
+def _analytics_response(request, get_analytics, owner_id):
+    query = AnalyticsQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+    return Response(get_analytics(owner_id, **query.validated_data))
+
+
+@api_view(['GET'])
+def office_analytics_view(request, office_id):
+    """Office analytics from hourly rollups (GET /api/analytics/office/{office_id}/?start_date=&end_date=&interval=)"""
+    get_object_or_404(Office, id=office_id)
+    return _analytics_response(request, get_office_analytics, office_id)
+
+
+@api_view(['GET'])
+def region_analytics_view(request, region_id):
+    """Region analytics from hourly rollups (GET /api/analytics/region/{region_id}/?start_date=&end_date=&interval=)"""
+    get_object_or_404(Region, id=region_id)
+    return _analytics_response(request, get_region_analytics, region_id)
+
+
+@require_GET
+def metrics_view(request):
+    """Prometheus metrics (GET /metrics), with queue depth per office read at scrape time"""
+    depths = [
+        ('queue_tickets', {'office_id': row['office_id'], 'status': row['status']}, row['count'])
+        for row in get_queue_depths()
+    ]
+    return HttpResponse(
+        metrics.render(metrics.collect(), depths),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -88,6 +88,12 @@ if db_engine == 'django.db.backends.sqlite3':
         'default': {
             'ENGINE': db_engine,
             'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            # SQLite has no row locks: take the write lock at BEGIN so concurrent
+            # call-next transactions queue on the busy timeout instead of failing
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': config('DB_TIMEOUT', default=20, cast=int),
+            },
         }
     }
 else:
@@ -159,16 +165,67 @@ REST_FRAMEWORK = {
     ],
 }
 
+REDIS_HOST = config('REDIS_HOST', default='127.0.0.1')
+REDIS_PORT = config('REDIS_PORT', default=6379, cast=int)
+
 # Channels Configuration
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [(config('REDIS_HOST', default='127.0.0.1'), config('REDIS_PORT', default=6379, cast=int))],
+            "hosts": [(REDIS_HOST, REDIS_PORT)],
         },
     },
 }
 
+# Cache Configuration
+# Shared across worker processes: dashboard invalidation relies on it
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': config('CACHE_LOCATION', default=f'redis://{REDIS_HOST}:{REDIS_PORT}/1'),
+    },
+}
+
+# Queue event outbox: committed events are sent by a background dispatcher
+# thread; set to False to send them inline right after commit instead
+QUEUE_OUTBOX_ASYNC = config('QUEUE_OUTBOX_ASYNC', default=True, cast=bool)
+
+# Optional Redis index of live queue state (WAITING tickets, counter -> ticket).
+# Rebuild it from the database with: python manage.py rebuild_live_index
+QUEUE_LIVE_INDEX_ENABLED = config('QUEUE_LIVE_INDEX_ENABLED', default=False, cast=bool)
+QUEUE_LIVE_INDEX_URL = config('QUEUE_LIVE_INDEX_URL', default=f'redis://{REDIS_HOST}:{REDIS_PORT}/2')
+
+# Per-group replay log for reconnecting displays (?resume_from=<seq>)
+QUEUE_EVENT_LOG_SIZE = config('QUEUE_EVENT_LOG_SIZE', default=500, cast=int)
+QUEUE_EVENT_LOG_TIMEOUT = config('QUEUE_EVENT_LOG_TIMEOUT', default=3600, cast=int)
+
+# Default flush interval of the coalesced region stream (ws/region/<id>/summary/)
+QUEUE_REGION_SUMMARY_INTERVAL_MS = config('QUEUE_REGION_SUMMARY_INTERVAL_MS', default=250, cast=int)
+# Display socket send buffer (frames); a client that falls this far behind is
+# resynced from a snapshot ('coalesce') or closed ('disconnect')
+QUEUE_WS_SEND_BUFFER = config('QUEUE_WS_SEND_BUFFER', default=256, cast=int)
+QUEUE_WS_SLOW_CLIENT_POLICY = config('QUEUE_WS_SLOW_CLIENT_POLICY', default='coalesce')
+
+# How long a kiosk Idempotency-Key returns the original ticket (seconds)
+QUEUE_IDEMPOTENCY_WINDOW = config('QUEUE_IDEMPOTENCY_WINDOW', default=600, cast=int)
+
+# /metrics aggregation across ASGI worker processes: each process publishes its
+# metrics to this Redis every flush interval (seconds); empty = this process only
+QUEUE_METRICS_URL = config('QUEUE_METRICS_URL', default='')
+QUEUE_METRICS_FLUSH_INTERVAL = config('QUEUE_METRICS_FLUSH_INTERVAL', default=5, cast=int)
+
+# Days of SERVED tickets kept in queue_ticket; older ones are moved to
+# queue_ticket_history by: python manage.py archive_served_tickets
+QUEUE_HISTORY_RETENTION_DAYS = config('QUEUE_HISTORY_RETENTION_DAYS', default=30, cast=int)
+
+# Live wait estimates: weight of the newest service time in each office's
+# moving average, the average used before an office has any, and how often
+# (seconds) the cached queue counters are rebuilt from the database
+QUEUE_ETA_ALPHA = config('QUEUE_ETA_ALPHA', default=0.2, cast=float)
+QUEUE_ETA_DEFAULT_SERVICE_SECONDS = config('QUEUE_ETA_DEFAULT_SERVICE_SECONDS', default=300, cast=int)
+QUEUE_ETA_RESYNC_SECONDS = config('QUEUE_ETA_RESYNC_SECONDS', default=900, cast=int)
+
 # Logging Configuration
 LOGGING = {
     'version': 1,
@@ -18,11 +18,13 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from apps.queue.views.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include('apps.users.urls')),
     path('api/', include('apps.queue.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve media files in development